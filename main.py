@@ -1,14 +1,26 @@
 # File: main.py
 
-from src.gui.main_window import App
+import os
+import sys
+
+from src.utils.startup import StartupProfiler
+
+# `python main.py --profile-startup` (or OCR_PROFILE_STARTUP=1) prints where start-up time goes.
+profiler = StartupProfiler(enabled="--profile-startup" in sys.argv or bool(os.environ.get("OCR_PROFILE_STARTUP")))
+
+with profiler.phase("Import GUI"):
+    from src.gui.main_window import App
 
 if __name__ == "__main__":
     # This is the official entry point of our application.
     # It creates an instance of our main window class and starts the GUI event loop.
-    app = App()
+    with profiler.phase("Build window"):
+        app = App()
+    # Runs once the window has been drawn and the event loop is idle
+    app.after_idle(profiler.report)
     app.mainloop()
 
- 
+
                                     #### PySide6 version ####
 
 # import sys
@@ -18,8 +30,8 @@ if __name__ == "__main__":
 # if __name__ == "__main__":
 #     # This is the standard entry point for a PySide6 application.
 #     app = QApplication(sys.argv)
-    
+
 #     window = MainWindow()
 #     window.show()
-    
+
 #     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,171 @@
+# File: src/benchmarks/fixtures.py
+
+import io
+import os
+import random
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageDraw, ImageFont
+
+FONT_PATH = os.path.join(os.path.dirname(__file__), "..", "assets", "fonts", "DejaVuSans.ttf")
+
+# Word list for the generated text. Fixtures are seeded, so every run sees the same pages.
+WORDS = (
+    "the of and to in is that for it as was with be by on not he this are or his from at which but have an "
+    "they you were her she there been one all we their has would when if so no what up out who them some "
+    "document scanner invoice contract report summary section page table figure appendix revision total "
+    "amount payment account service customer delivery order number date address telephone reference "
+    "analysis result method sample measurement temperature pressure volume average standard deviation"
+).split()
+
+# A4 at 200 DPI (an office scan) and at 600 DPI (an archival scan, large enough to be tiled).
+PAGE_SIZE_PX = (1654, 2339)
+LARGE_SCAN_SIZE_PX = (4960, 7016)
+QUICK_LARGE_SCAN_SIZE_PX = (3000, 4300)
+LONG_DOCUMENT_PAGES = 60
+QUICK_LONG_DOCUMENT_PAGES = 12
+
+
+def _font(size: int):
+    try:
+        return ImageFont.truetype(FONT_PATH, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _fill_line(rng: random.Random, draw: ImageDraw.ImageDraw, font, width: float) -> str:
+    """Returns random words that fit in `width` pixels when drawn in `font`."""
+    words = [rng.choice(WORDS)]
+    while True:
+        word = rng.choice(WORDS)
+        if draw.textlength(" ".join(words + [word]), font=font) > width:
+            return " ".join(words)
+        words.append(word)
+
+
+def render_text_page(size: tuple, columns: int, font_size: int, rng: random.Random, heading: bool = False,
+                     margin: int = None) -> Image.Image:
+    """
+    Draws a grayscale page of text lines, filled column by column.
+
+    Args:
+        size (tuple): (width, height) in pixels.
+        columns (int): Number of text columns.
+        font_size (int): Font size in pixels; line spacing follows from it.
+        rng (random.Random): Source of the text.
+        heading (bool): Whether to draw a heading across all columns first.
+        margin (int): Page margin in pixels; defaults to 6% of the width.
+    """
+    width, height = size
+    margin = margin if margin is not None else int(width * 0.06)
+    page = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(page)
+    font = _font(font_size)
+    line_height = int(font_size * 1.45)
+    top = margin
+    if heading:
+        draw.text((margin, top), _sentence(rng, 5).title(), font=_font(font_size * 2), fill=0)
+        top += font_size * 4
+    gutter = int(font_size * 2.5)
+    column_width = (width - 2 * margin - (columns - 1) * gutter) // columns
+    for column in range(columns):
+        x = margin + column * (column_width + gutter)
+        y = top
+        while y + line_height < height - margin:
+            # A short line now and then ends a paragraph, followed by a blank line
+            paragraph_end = rng.random() < 0.12
+            line_width = column_width * rng.uniform(0.2, 0.6) if paragraph_end else column_width
+            draw.text((x, y), _fill_line(rng, draw, font, line_width), font=font, fill=0)
+            y += line_height * (2 if paragraph_end else 1)
+    return page
+
+
+def _image_bytes(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_dense_page(path: str):
+    """One column of small, tightly set text, as on a contract or a data sheet."""
+    render_text_page(PAGE_SIZE_PX, columns=1, font_size=22, rng=random.Random(1)).save(path)
+
+
+def make_multi_column_page(path: str):
+    """A heading over three columns, as in a newspaper or journal article."""
+    render_text_page(PAGE_SIZE_PX, columns=3, font_size=26, rng=random.Random(2), heading=True).save(path)
+
+
+def make_large_scan(path: str, size: tuple = LARGE_SCAN_SIZE_PX):
+    """A two-column page scanned at 600 DPI; large enough to be OCR'd in tiles."""
+    font_size = int(size[0] / PAGE_SIZE_PX[0] * 26)
+    render_text_page(size, columns=2, font_size=font_size, rng=random.Random(3), heading=True).save(path)
+
+
+def make_long_document(path: str, pages: int = LONG_DOCUMENT_PAGES):
+    """
+    A multi-page PDF mixing the three kinds of page the PDF pipeline routes differently.
+
+    Pages cycle through: a text-layer page (no OCR), a scanned page (OCR'd whole) and a
+    text-layer page with an embedded scanned figure (only the figure is OCR'd).
+    """
+    rng = random.Random(4)
+    scan = _image_bytes(render_text_page((1240, 1754), columns=1, font_size=20, rng=rng))
+    figure = _image_bytes(render_text_page((1000, 600), columns=2, font_size=20, rng=rng, margin=30))
+    scan_xref = figure_xref = 0
+    with fitz.open() as doc:
+        for index in range(pages):
+            page = doc.new_page(width=595, height=842)  # A4 in points
+            kind = index % 3
+            if kind == 1:
+                # Later pages reuse the embedded image instead of storing it again
+                scan_xref = page.insert_image(page.rect, stream=scan if not scan_xref else None, xref=scan_xref)
+                continue
+            body = fitz.Rect(50, 50, 545, 792)
+            if kind == 2:
+                figure_rect = fitz.Rect(50, 50, 545, 347)
+                figure_xref = page.insert_image(figure_rect, stream=figure if not figure_xref else None,
+                                                xref=figure_xref)
+                body.y0 = figure_rect.y1 + 20
+            text = "\n\n".join(_sentence(rng, rng.randint(30, 70)) for _ in range(8))
+            page.insert_textbox(body, text, fontsize=9, fontname="helv")
+        doc.save(path, garbage=3, deflate=True)
+
+
+def generate_fixtures(directory: str, quick: bool = False) -> dict:
+    """
+    Writes the benchmark inputs to a directory, skipping files that already exist.
+
+    Fixtures are deterministic, so a directory can be reused across runs.
+
+    Args:
+        directory (str): Where to write the files; created if missing.
+        quick (bool): Smaller large scan and fewer PDF pages, for a fast smoke run.
+
+    Returns:
+        dict: Fixture name -> file path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    scan_size = QUICK_LARGE_SCAN_SIZE_PX if quick else LARGE_SCAN_SIZE_PX
+    pages = QUICK_LONG_DOCUMENT_PAGES if quick else LONG_DOCUMENT_PAGES
+    builders = {
+        "dense_page": ("dense_page.png", make_dense_page),
+        "multi_column": ("multi_column.png", make_multi_column_page),
+        "large_scan": (f"large_scan_{scan_size[0]}x{scan_size[1]}.png", lambda p: make_large_scan(p, scan_size)),
+        "long_document": (f"long_document_{pages}p.pdf", lambda p: make_long_document(p, pages)),
+    }
+    fixtures = {}
+    for name, (file_name, build) in builders.items():
+        path = os.path.join(directory, file_name)
+        if not os.path.exists(path):
+            print(f"Generating fixture {file_name}...")
+            # Written under another name first, so an interrupted run leaves no half-written fixture
+            partial = os.path.join(directory, "partial-" + file_name)
+            build(partial)
+            os.replace(partial, path)
+        fixtures[name] = path
+    return fixtures
@@ -0,0 +1,431 @@
+# File: src/benchmarks/run.py
+
+"""
+End-to-end performance benchmarks for the OCR, layout, translation, history and export stages.
+
+Usage:
+    python -m src.benchmarks.run                              # stub engines, all stages
+    python -m src.benchmarks.run --quick -o baseline.json     # fast run, save the results
+    python -m src.benchmarks.run --baseline baseline.json     # compare; exit code 1 on a regression
+    python -m src.benchmarks.run --real --lang latin          # PaddleOCR and Argos models
+
+Run it from the repository root. Synthetic fixtures (a dense page, a three-column
+page, a 600-DPI scan that gets tiled and a long PDF mixing text-layer, scanned and
+figure pages) are generated once into a temporary directory and reused.
+
+By default OCR and translation use the stubs in `src.benchmarks.stubs`, so the
+numbers measure this application's own code: rendering, routing, caching, layout
+parsing, storage and export. `--real` uses the installed models instead.
+
+All databases are created in a temporary directory; the real history, OCR cache
+and translation memory are not touched.
+
+Each stage reports latency percentiles over its samples, throughput in the
+stage's own unit (pages, boxes, lines, records) and the peak resident memory
+while the stage ran: this process plus its worker processes (the OCR pool),
+where the platform exposes it (Linux).
+"""
+
+import argparse
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from src.benchmarks.fixtures import generate_fixtures
+from src.benchmarks.stubs import STUB_ENGINE_FACTORY, install_stub_translation
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ("process_file", "parse_layout", "translate_text", "database", "export_to_pdf")
+DEFAULT_FIXTURES_DIR = os.path.join(tempfile.gettempdir(), "ocr-benchmark-fixtures")
+# A stage whose median latency grows by more than this fraction counts as a regression...
+DEFAULT_THRESHOLD = 0.2
+# ...unless it grew by less than this, which is within timer noise for sub-millisecond stages.
+NOISE_FLOOR_MS = 0.1
+RSS_SAMPLE_SECONDS = 0.005
+SEARCH_QUERIES = ("invoice", "payment total", "standard dev", "temperature pressure volume")
+
+
+def _rss_mb(pid: str = "self"):
+    """Returns the resident set size of a process in MB, or None if unknown."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def current_rss_mb():
+    """Returns the resident set size of this process and its child processes in MB, or None if unknown."""
+    total = _rss_mb()
+    if total is None:
+        return None
+    for path in glob.glob("/proc/self/task/*/children"):
+        try:
+            with open(path) as f:
+                children = f.read().split()
+        except OSError:
+            continue
+        for pid in children:
+            total += _rss_mb(pid) or 0.0
+    return total
+
+
+def _max_rss_mb() -> float:
+    """Peak RSS of this process from getrusage in MB (reported in KB on Linux, bytes on macOS), or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+class RssSampler:
+    """Polls the RSS of this process and its workers on a background thread, keeping the peak since the last reset."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self._peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss_mb()
+            if rss is not None and (self._peak is None or rss > self._peak):
+                self._peak = rss
+
+    def reset(self):
+        self._peak = current_rss_mb()
+
+    def peak(self):
+        rss = current_rss_mb()
+        if rss is not None and (self._peak is None or rss > self._peak):
+            self._peak = rss
+        return self._peak
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class Recorder:
+    """Collects the latency, work done and peak memory of each timed sample, grouped by stage."""
+
+    def __init__(self):
+        self.samples = {}  # stage -> list of seconds
+        self.units = {}  # stage -> total units of work
+        self.unit_names = {}
+        self.peak_rss = {}
+        self.sampler = RssSampler()
+
+    @contextmanager
+    def measure(self, stage: str, unit: str = "calls"):
+        """
+        Times one sample of a stage. The block may set `sample["units"]` to the work it did (default 1).
+        """
+        sample = {"units": 1}
+        self.sampler.reset()
+        start = time.perf_counter()
+        yield sample
+        elapsed = time.perf_counter() - start
+        self.samples.setdefault(stage, []).append(elapsed)
+        self.units[stage] = self.units.get(stage, 0) + sample["units"]
+        self.unit_names[stage] = unit
+        peak = self.sampler.peak()
+        if peak is not None:
+            self.peak_rss[stage] = max(self.peak_rss.get(stage, 0.0), peak)
+
+    def summary(self) -> dict:
+        stages = {}
+        for stage, seconds in self.samples.items():
+            ms = np.asarray(seconds) * 1000
+            total = float(np.sum(seconds))
+            stages[stage] = {
+                "samples": len(seconds),
+                "unit": self.unit_names[stage],
+                "units": self.units[stage],
+                "mean_ms": round(float(ms.mean()), 3),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p90_ms": round(float(np.percentile(ms, 90)), 3),
+                "p99_ms": round(float(np.percentile(ms, 99)), 3),
+                "max_ms": round(float(ms.max()), 3),
+                "throughput_per_s": round(self.units[stage] / total, 3) if total > 0 else 0.0,
+                "peak_rss_mb": round(self.peak_rss[stage], 1) if stage in self.peak_rss else None,
+            }
+        return stages
+
+
+def _use_scratch_databases(directory: str):
+    """Points the history database, OCR cache and translation memory at a scratch directory."""
+    from src.database import manager
+    from src.ocr import cache as ocr_cache
+    from src.translator import memory as translation_memory
+    manager.DB_PATH = os.path.join(directory, "history.db")
+    ocr_cache.CACHE_DB_PATH = os.path.join(directory, "ocr_cache.db")
+    translation_memory.MEMORY_DB_PATH = os.path.join(directory, "translation_memory.db")
+
+
+def bench_process_file(recorder: Recorder, fixtures: dict, args) -> dict:
+    """Times OCR of each fixture, without and then with the OCR cache. Returns the documents."""
+    from src.file_processor import process_file
+    documents = {}
+    for name, path in fixtures.items():
+        # Untimed first run: starts the worker pool and loads the engines
+        documents[name] = process_file(path, args.lang, use_cache=False, workers=args.workers)
+        for _ in range(args.repeat):
+            with recorder.measure(f"process_file/{name}", unit="pages") as sample:
+                document = process_file(path, args.lang, use_cache=False, workers=args.workers)
+                sample["units"] = max(len(document.page_numbers()), 1)
+        process_file(path, args.lang, use_cache=True, workers=args.workers)  # Fills the cache
+        for _ in range(args.repeat):
+            with recorder.measure(f"process_file_cached/{name}", unit="pages") as sample:
+                document = process_file(path, args.lang, use_cache=True, workers=args.workers)
+                sample["units"] = max(len(document.page_numbers()), 1)
+    return documents
+
+
+def bench_parse_layout(recorder: Recorder, documents: dict, args):
+    from src.layout_parser.parser import parse_layout
+    for mode in ("general", "document"):
+        for _ in range(args.repeat):
+            for document in documents.values():
+                with recorder.measure(f"parse_layout/{mode}", unit="boxes") as sample:
+                    parse_layout(document, mode=mode)
+                    sample["units"] = len(document)
+
+
+def bench_translate_text(recorder: Recorder, texts: dict, args):
+    """Times translation by the model, then the same texts again from the translation memory."""
+    from src.translator.engine import translate_text
+    # The stub lives in this process only, so stub runs stay out of the translation worker pool.
+    workers = None if args.real else 1
+    for name, text in texts.items():
+        lines = sum(1 for line in text.split("\n") if line.strip())
+        for _ in range(args.repeat):
+            with recorder.measure("translate_text", unit="lines") as sample:
+                translate_text(text, args.translate_from, args.translate_to, workers=workers, use_memory=False)
+                sample["units"] = lines
+        translate_text(text, args.translate_from, args.translate_to, workers=workers)  # Fills the memory
+        for _ in range(args.repeat):
+            with recorder.measure("translate_text_memory", unit="lines") as sample:
+                translate_text(text, args.translate_from, args.translate_to, workers=workers)
+                sample["units"] = lines
+
+
+def bench_database(recorder: Recorder, documents: dict, texts: dict, args):
+    """Times history writes, paging, search and lookups on a fresh database."""
+    from src.database import manager
+    from src.ocr.results import pack_results
+    manager.setup_database()
+    records = [{"profile_name": "benchmark", "original_text": texts[name], "translated_text": texts[name],
+                "ocr_data": pack_results(documents[name]), "parser_mode": "document"} for name in documents]
+
+    ids = []
+    for i in range(args.records):
+        record = records[i % len(records)]
+        with recorder.measure("db/add_record", unit="records"):
+            ids.append(manager.add_record(**record))
+    for _ in range(args.repeat):
+        batch = [records[i % len(records)] for i in range(manager.PAGE_SIZE)]
+        with recorder.measure("db/add_records", unit="records") as sample:
+            ids.extend(manager.add_records(batch))
+            sample["units"] = len(batch)
+
+    before_id = None
+    while True:
+        with recorder.measure("db/get_records_page", unit="records") as sample:
+            page = manager.get_records_page(before_id)
+            sample["units"] = len(page)
+        if not page:
+            break
+        before_id = page[-1][0]
+    for _ in range(args.repeat):
+        for query in SEARCH_QUERIES:
+            with recorder.measure("db/search_records", unit="records") as sample:
+                sample["units"] = len(manager.search_records(query))
+    for record_id in ids[::max(len(ids) // 50, 1)]:
+        with recorder.measure("db/get_record", unit="records"):
+            manager.get_record(record_id)
+    manager.flush_writes()
+
+
+def bench_export_to_pdf(recorder: Recorder, texts: dict, scratch: str, args):
+    from src.utils.exporter import export_to_pdf
+    for name, text in texts.items():
+        path = os.path.join(scratch, f"{name}.pdf")
+        for _ in range(args.repeat):
+            with recorder.measure(f"export_to_pdf/{name}", unit="documents"):
+                export_to_pdf(text, path)
+
+
+def run_benchmarks(args) -> dict:
+    """Runs the selected stages and returns the results (see `main` for the layout)."""
+    fixtures = generate_fixtures(args.fixtures_dir, quick=args.quick)
+    if not args.real:
+        install_stub_translation(args.translate_from, args.translate_to)
+    recorder = Recorder()
+    started = datetime.now().isoformat(timespec="seconds")
+    with tempfile.TemporaryDirectory(prefix="ocr-benchmark-", ignore_cleanup_errors=True) as scratch:
+        _use_scratch_databases(scratch)
+        if "process_file" in args.stages:
+            print("Benchmarking process_file...", file=sys.stderr)
+            documents = bench_process_file(recorder, fixtures, args)
+        else:
+            # Later stages need OCR output to work on; produce it untimed.
+            from src.file_processor import process_file
+            documents = {name: process_file(path, args.lang, use_cache=False, workers=args.workers)
+                         for name, path in fixtures.items()}
+
+        from src.layout_parser.parser import parse_layout
+        texts = {name: parse_layout(document, mode="document") for name, document in documents.items()}
+        if "parse_layout" in args.stages:
+            print("Benchmarking parse_layout...", file=sys.stderr)
+            bench_parse_layout(recorder, documents, args)
+        if "translate_text" in args.stages:
+            print("Benchmarking translate_text...", file=sys.stderr)
+            bench_translate_text(recorder, texts, args)
+        if "database" in args.stages:
+            print("Benchmarking the history database...", file=sys.stderr)
+            bench_database(recorder, documents, texts, args)
+        if "export_to_pdf" in args.stages:
+            print("Benchmarking export_to_pdf...", file=sys.stderr)
+            try:
+                bench_export_to_pdf(recorder, texts, scratch, args)
+            except (ImportError, FileNotFoundError) as e:
+                print(f"Skipping export_to_pdf: {e}", file=sys.stderr)
+        from src.database.manager import close_connection, flush_writes
+        from src.ocr import cache as ocr_cache
+        from src.translator import memory as translation_memory
+        flush_writes()
+        close_connection()
+        ocr_cache.close_connection()
+        translation_memory.close_connection()
+    recorder.sampler.stop()
+
+    from src.ocr.engine import ENGINE_VERSION
+    return {
+        "meta": {
+            "mode": "real" if args.real else "stub",
+            "quick": args.quick,
+            "repeat": args.repeat,
+            "lang": args.lang,
+            "engine_version": ENGINE_VERSION,
+            "started": started,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "peak_rss_mb": _max_rss_mb(),
+        },
+        "stages": recorder.summary(),
+    }
+
+
+def format_table(results: dict) -> str:
+    lines = ["| Stage | Samples | p50 (ms) | p90 (ms) | p99 (ms) | Max (ms) | Throughput | Peak RSS (MB) |",
+             "| :---- | ------: | -------: | -------: | -------: | -------: | ---------: | ------------: |"]
+    for stage, r in results["stages"].items():
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "n/a"
+        lines.append(f"| {stage} | {r['samples']} | {r['p50_ms']:.2f} | {r['p90_ms']:.2f} | {r['p99_ms']:.2f} | "
+                     f"{r['max_ms']:.2f} | {r['throughput_per_s']:.1f} {r['unit']}/s | {rss} |")
+    return "\n".join(lines)
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> tuple:
+    """
+    Compares median latency and throughput per stage against a saved run.
+
+    Returns:
+        tuple: (Markdown table, list of stages whose median latency regressed by more than `threshold`)
+    """
+    lines = ["| Stage | Baseline p50 (ms) | p50 (ms) | Change | Baseline throughput | Throughput | Change |",
+             "| :---- | ----------------: | -------: | -----: | ------------------: | ---------: | -----: |"]
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous is None:
+            continue
+        latency_change = current["p50_ms"] / previous["p50_ms"] - 1 if previous["p50_ms"] else 0.0
+        throughput_change = (current["throughput_per_s"] / previous["throughput_per_s"] - 1
+                             if previous["throughput_per_s"] else 0.0)
+        flag = ""
+        if latency_change > threshold and current["p50_ms"] - previous["p50_ms"] > NOISE_FLOOR_MS:
+            regressions.append(stage)
+            flag = " (regression)"
+        lines.append(f"| {stage}{flag} | {previous['p50_ms']:.2f} | {current['p50_ms']:.2f} | {latency_change:+.0%} | "
+                     f"{previous['throughput_per_s']:.1f} | {current['throughput_per_s']:.1f} | "
+                     f"{throughput_change:+.0%} |")
+    return "\n".join(lines), regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.benchmarks.run",
+                                     description="Benchmark the OCR, layout, translation, history and export stages.")
+    parser.add_argument("--real", action="store_true",
+                        help="Use the installed PaddleOCR and Argos models instead of the stubs.")
+    parser.add_argument("--quick", action="store_true", help="Smaller fixtures, for a fast smoke run.")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"Comma-separated stages to time (default: all of {', '.join(STAGES)}).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed samples per fixture and stage (default: 3).")
+    parser.add_argument("--records", type=int, default=200, help="Records added one at a time in the database stage.")
+    parser.add_argument("--workers", type=int, default=None, help="OCR worker processes (default: CPU count).")
+    parser.add_argument("--lang", default="latin", help="OCR language (default: latin).")
+    parser.add_argument("--translate-from", default="es", help="Source language for translation (default: es).")
+    parser.add_argument("--translate-to", default="en", help="Target language for translation (default: en).")
+    parser.add_argument("--fixtures-dir", default=DEFAULT_FIXTURES_DIR, help="Where generated fixtures are kept.")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file (e.g. to use as a baseline).")
+    parser.add_argument("--baseline", help="Compare against results saved earlier with --output.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Median latency increase counted as a regression (default: 0.2 = 20%%).")
+    args = parser.parse_args(argv)
+    args.stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in args.stages if stage not in STAGES]
+    if unknown:
+        print(f"Unknown stage(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    args.repeat = max(args.repeat, 1)
+
+    if not args.real:
+        # Set before the OCR engine module is imported, so this process and its
+        # OCR workers (which inherit the environment) all build stub engines.
+        os.environ["OCR_ENGINE_FACTORY"] = STUB_ENGINE_FACTORY
+
+    # The stages report progress (engine loads, translation memory hits) on stdout; keep it for the tables.
+    with redirect_stdout(sys.stderr):
+        results = run_benchmarks(args)
+    print(format_table(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("mode") != results["meta"]["mode"]:
+            print("Warning: the baseline was recorded in a different mode (stub/real); "
+                  "the numbers are not comparable.", file=sys.stderr)
+        table, regressions = compare(results, baseline, args.threshold)
+        print()
+        print(table)
+        if regressions:
+            print(f"Regressions over {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
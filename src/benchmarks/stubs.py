@@ -0,0 +1,105 @@
+# File: src/benchmarks/stubs.py
+
+"""
+Stand-in OCR and translation backends, so the benchmarks run offline and in seconds.
+
+The stub OCR engine finds text the way a very cheap detector would: rows of
+dark pixels make lines, and runs of ink along a line, split at wide gaps, make
+boxes. Its cost grows with the image like a real detector's, and it returns
+boxes with realistic counts and geometry for the layout parser, with made-up
+text. The stub translation reverses the word order of each line.
+
+Neither says anything about PaddleOCR's or Argos' own speed; they isolate the
+time spent in this application's code around them.
+"""
+
+import io
+import random
+
+import numpy as np
+from PIL import Image
+
+from src.benchmarks.fixtures import WORDS
+
+# Must be importable by name: worker processes build their engines from it (see OCR_ENGINE_FACTORY).
+STUB_ENGINE_FACTORY = "src.benchmarks.stubs:build_stub_engine"
+STUB_MODEL_VERSION = "stub"
+
+# Pixels darker than this count as ink.
+INK_THRESHOLD = 128
+
+
+def _runs(mask: np.ndarray, max_gap: int = 0) -> list:
+    """(start, end) of runs of True in a 1-D mask, joining runs separated by at most `max_gap` False values."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = edges[::2], edges[1::2]
+    if max_gap and len(starts) > 1:
+        new_group = np.r_[True, starts[1:] - ends[:-1] > max_gap]
+        group_starts = np.flatnonzero(new_group)
+        ends = np.r_[ends[group_starts[1:] - 1], ends[-1]]
+        starts = starts[group_starts]
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _load_gray(image) -> np.ndarray:
+    if isinstance(image, np.ndarray):
+        return image if image.ndim == 2 else image[:, :, :3].min(axis=2)
+    source = io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image
+    with Image.open(source) as img:
+        return np.asarray(img.convert("L"))
+
+
+class StubOcrEngine:
+    """Implements the part of PaddleOCR's interface that `perform_ocr` uses."""
+
+    def __init__(self, language: str, profile: str):
+        self.language = language
+        self.profile = profile
+
+    def detect(self, gray: np.ndarray) -> list:
+        """Returns (x0, y0, x1, y1) text boxes: ink rows form lines, split where the gap exceeds two line heights."""
+        ink = gray < INK_THRESHOLD
+        boxes = []
+        for y0, y1 in _runs(ink.any(axis=1), max_gap=1):
+            height = y1 - y0
+            if height < 4:
+                continue
+            for x0, x1 in _runs(ink[y0:y1].any(axis=0), max_gap=height * 2):
+                if x1 - x0 >= height // 2:
+                    boxes.append((x0, y0, x1, y1))
+        return boxes
+
+    def ocr(self, image, cls: bool = False) -> list:
+        boxes = self.detect(_load_gray(image))
+        results = []
+        for x0, y0, x1, y1 in boxes:
+            # Text about as long as the box would hold, the same on every run
+            rng = random.Random(x0 * 100003 + y0)
+            chars = max((x1 - x0) // max((y1 - y0) // 2, 1), 1)
+            words = []
+            while sum(len(w) + 1 for w in words) < chars:
+                words.append(rng.choice(WORDS))
+            quad = [[float(x0), float(y0)], [float(x1), float(y0)], [float(x1), float(y1)], [float(x0), float(y1)]]
+            results.append([quad, (" ".join(words), 0.9 + rng.random() * 0.09)])
+        return [results or None]
+
+
+def build_stub_engine(language: str, profile: str) -> StubOcrEngine:
+    """Engine factory for `EngineRegistry` and OCR_ENGINE_FACTORY."""
+    return StubOcrEngine(language, profile)
+
+
+class StubTranslation:
+    """Implements the part of an Argos translation object that the translator uses."""
+
+    def translate(self, text: str) -> str:
+        # Argos translates newline-separated paragraphs independently; keep the line structure.
+        return "\n".join(" ".join(reversed(line.split())) for line in text.split("\n"))
+
+
+def install_stub_translation(source_lang: str, target_lang: str):
+    """Puts the stub into the translator's model cache, so no model is loaded or downloaded for the pair."""
+    from src.translator import engine as translator_engine
+    translator_engine._translations[(source_lang, target_lang)] = StubTranslation()
+    translator_engine._model_versions[(source_lang, target_lang)] = STUB_MODEL_VERSION
@@ -0,0 +1,363 @@
+# File: src/cli.py
+
+"""
+Headless batch processing: OCR, layout parsing and optional translation for many files.
+
+Usage:
+    python -m src.cli scans/ "inbox/**/*.pdf" report.png --lang latin --translate-from es -o out.jsonl
+
+One JSON line is written per document (or per page with --per-page) as soon as it
+finishes. Progress, throughput and ETA are reported on stderr.
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from src.utils import metrics
+
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.pdf')
+IMAGE_EXTENSIONS = SUPPORTED_EXTENSIONS[:-1]
+
+
+def collect_inputs(patterns: list) -> list:
+    """
+    Expands files, directories (searched recursively) and glob patterns into a sorted file list.
+
+    Args:
+        patterns (list): Paths or glob patterns given on the command line.
+
+    Returns:
+        list: Unique paths of supported files.
+    """
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                found.extend(os.path.join(root, name) for name in names)
+        elif os.path.isfile(pattern):
+            found.append(pattern)
+        else:
+            found.extend(glob.glob(pattern, recursive=True))
+    files = {path for path in found if os.path.isfile(path) and path.lower().endswith(SUPPORTED_EXTENSIONS)}
+    return sorted(files)
+
+
+def _init_worker(lang_code: str, profile: str, translate_from: str, target_lang: str):
+    """Warms this worker's OCR engine (and translator) once, before the first document."""
+    # stdout may carry the JSONL output; send engine and translation messages to stderr.
+    sys.stdout = sys.stderr
+    from src.ocr.engine import OCR_ENGINES
+    OCR_ENGINES.get(lang_code, profile) # 'auto' loads the 'latin' engine, the first one probed
+    if translate_from and translate_from != "auto":
+        from src.translator.engine import translate_text
+        translate_text("", translate_from, target_lang)
+
+
+def _process_documents(jobs: list) -> list:
+    """
+    Runs a group of documents in one worker. Executes in a worker process.
+
+    Image files in the group are OCR'd together, so their text lines share
+    recognition batches; each document is then parsed and translated on its own.
+    """
+    documents = {}
+    shared_seconds = 0.0
+    images = [job for job in jobs if job["file"].lower().endswith(IMAGE_EXTENSIONS)]
+    if len(images) > 1:
+        from src.file_processor import process_images
+        start = time.perf_counter()
+        try:
+            found = process_images([job["file"] for job in images], lang_code=images[0]["lang"],
+                                   use_cache=images[0]["use_cache"], profile=images[0]["ocr_profile"])
+            documents = {job["file"]: document for job, document in zip(images, found)}
+            shared_seconds = (time.perf_counter() - start) / len(images)
+        except Exception as e:
+            # Fall back to one document at a time, so one bad file only fails itself.
+            print(f"Batched OCR failed ({type(e).__name__}: {e}); processing files one by one.")
+    results = [_process_document(job, documents.get(job["file"])) for job in jobs]
+    for result in results:
+        if result["file"] in documents:
+            # Each image is charged an equal share of the batch's OCR time.
+            result["seconds"] = round(result["seconds"] + shared_seconds, 3)
+    if metrics.enabled():
+        # This worker's stage timings and counters since its last group, for the parent to add up.
+        results[-1]["metrics"] = metrics.drain()
+    return results
+
+
+def _process_document(job: dict, document=None) -> dict:
+    """Runs OCR (unless `document` already holds it), layout parsing and translation for one file."""
+    from src.file_processor import process_file
+    from src.layout_parser.parser import parse_layout
+
+    start = time.perf_counter()
+    result = {"file": job["file"], "ocr_language": job["lang"], "mode": job["mode"]}
+    try:
+        source_lang = job["translate_from"]
+        if "auto" in (job["lang"], source_lang):
+            from src.ocr.script_detect import choose_language
+            choice = choose_language(job["file"], job["ocr_profile"], job["pages"], use_cache=job["use_cache"])
+            if job["lang"] == "auto":
+                result["ocr_language"] = "+".join(choice.languages)
+            if source_lang == "auto":
+                source_lang = choice.source_lang
+        if document is None:
+            document = process_file(job["file"], lang_code=job["lang"], page_range=job["pages"],
+                                    use_cache=job["use_cache"], workers=1, profile=job["ocr_profile"])
+        pages = list(document.iter_pages())
+        page_texts = [(page.page_number, parse_layout(page, mode=job["mode"])) for page in pages]
+        page_translations = [None] * len(page_texts)
+        if source_lang == job["target"]:
+            page_translations = [text for _, text in page_texts] # Detected as already in the target language
+        elif source_lang:
+            from src.translator.engine import translate_text
+            page_translations = [
+                translate_text(text, source_lang, job["target"], use_memory=job["use_memory"])
+                if text.strip() else ""
+                for _, text in page_texts
+            ]
+        result.update(
+            pages=page_texts,
+            translations=page_translations,
+            ocr_data=document.to_bytes(),
+            box_count=len(document),
+        )
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _records_for(result: dict, per_page: bool) -> list:
+    """Turns a worker result into the JSONL records to emit."""
+    base = {key: result[key] for key in ("file", "ocr_language", "mode", "seconds")}
+    if "error" in result:
+        return [dict(base, error=result["error"])]
+    pages = result["pages"]
+    translations = result["translations"]
+    if per_page:
+        records = []
+        for (page_number, text), translation in zip(pages, translations):
+            record = dict(base, page=page_number or 1, text=text)
+            if translation is not None:
+                record["translation"] = translation
+            records.append(record)
+        return records
+    record = dict(base, pages=len(pages), boxes=result["box_count"],
+                  text="\n\n".join(text for _, text in pages if text))
+    if any(t is not None for t in translations):
+        record["translation"] = "\n\n".join(t for t in translations if t)
+    return [record]
+
+
+class _Progress:
+    """Writes documents done, throughput and ETA to stderr."""
+
+    def __init__(self, total: int, stream=sys.stderr):
+        self.total = total
+        self.done = 0
+        self.pages = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self.stream = stream
+        self.interactive = stream.isatty()
+
+    def update(self, pages: int, failed: bool):
+        self.done += 1
+        self.pages += pages
+        self.failed += int(failed)
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+        line = (f"[{self.done}/{self.total}] {rate:.2f} docs/s, {self.pages / max(elapsed, 1e-9):.2f} pages/s, "
+                f"{self.failed} failed, ETA {eta:.0f}s")
+        self.stream.write(("\r" + line) if self.interactive else (line + "\n"))
+        self.stream.flush()
+
+    def finish(self):
+        if self.interactive:
+            self.stream.write("\n")
+        elapsed = time.perf_counter() - self.start
+        self.stream.write(f"Processed {self.done} documents ({self.pages} pages) in {elapsed:.1f}s.\n")
+        self.stream.flush()
+
+
+def _group_jobs(jobs, batch_size: int):
+    """Yields lists of jobs for one worker task: up to `batch_size` image files together, PDFs alone."""
+    images = []
+    for job in jobs:
+        if not job["file"].lower().endswith(IMAGE_EXTENSIONS):
+            yield [job]
+            continue
+        images.append(job)
+        if len(images) >= max(batch_size, 1):
+            yield images
+            images = []
+    if images:
+        yield images
+
+
+def run_batch(files: list, args, out) -> int:
+    """
+    Processes files in a worker pool, streaming JSONL records to `out` in completion order.
+
+    Returns:
+        int: The number of documents that failed.
+    """
+    from src.database.manager import setup_database, add_records
+
+    if not args.no_history:
+        setup_database()
+
+    progress = _Progress(len(files))
+    pending_history = []
+
+    def flush_history():
+        if pending_history:
+            add_records(pending_history)
+            pending_history.clear()
+
+    def handle(result):
+        metrics.merge(result.pop("metrics", None))
+        for record in _records_for(result, args.per_page):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        progress.update(len(result.get("pages", [])), "error" in result)
+        if args.no_history or "error" in result:
+            return
+        pending_history.append({
+            "profile_name": args.profile,
+            "original_text": "\n\n".join(text for _, text in result["pages"] if text),
+            "translated_text": "\n\n".join(t for t in result["translations"] if t),
+            "ocr_data": result["ocr_data"],
+            "parser_mode": args.mode,
+        })
+        if len(pending_history) >= args.history_batch:
+            flush_history()
+
+    jobs = ({
+        "file": path, "lang": args.lang, "mode": args.mode, "pages": args.page_range,
+        "translate_from": args.translate_from, "target": args.target, "use_cache": not args.no_cache,
+        "use_memory": not args.no_translation_memory, "ocr_profile": args.ocr_profile,
+    } for path in files)
+    groups = _group_jobs(jobs, args.ocr_batch)
+
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(files)))
+    # 'spawn' so workers start clean and build their own engines.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(args.lang, args.ocr_profile, args.translate_from, args.target)) as pool:
+        # Keep a bounded number of groups in flight so huge backlogs don't queue up in memory.
+        in_flight = set()
+        for group in groups:
+            in_flight.add(pool.submit(_process_documents, group))
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for result in future.result():
+                        handle(result)
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                for result in future.result():
+                    handle(result)
+
+    flush_history()
+    progress.finish()
+    return progress.failed
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli",
+        description="Batch OCR (and optional translation) without the GUI. Writes JSON lines.",
+    )
+    parser.add_argument("inputs", nargs="*", help="Files, directories or glob patterns (quote globs).")
+    parser.add_argument("--lang", default="latin",
+                        help="OCR language: en, ch, korean, japan, latin, cyrillic, or auto to detect it "
+                             "per file (default: latin).")
+    parser.add_argument("--mode", choices=("general", "document"), default="general", help="Layout parser mode.")
+    parser.add_argument("--ocr-profile", choices=("fast", "balanced", "accurate"), default=None,
+                        help="OCR speed/accuracy profile (default: balanced, or OCR_PROFILE).")
+    parser.add_argument("--translate-from", metavar="CODE",
+                        help="Translate from this language code (e.g. es, zh, ru), or auto to use the detected "
+                             "language. Omit to skip translation.")
+    parser.add_argument("--target", default="en", help="Translation target language code (default: en).")
+    parser.add_argument("--pages", metavar="RANGE", help="PDF page range, e.g. 10-20.")
+    parser.add_argument("--per-page", action="store_true", help="Emit one record per page instead of per document.")
+    parser.add_argument("-o", "--output", help="Write JSON lines to this file instead of stdout.")
+    parser.add_argument("-j", "--workers", type=int, default=0, help="Worker processes (default: CPU count).")
+    parser.add_argument("--ocr-batch", type=int, default=8,
+                        help="Image files OCR'd together in one worker task, sharing recognition batches (default: 8).")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the OCR result cache.")
+    parser.add_argument("--no-translation-memory", action="store_true",
+                        help="Translate every segment instead of reusing earlier translations.")
+    parser.add_argument("--no-history", action="store_true", help="Do not save results to the history database.")
+    parser.add_argument("--history-batch", type=int, default=50, help="Records per history database transaction.")
+    parser.add_argument("--profile", default="batch", help="Profile name stored with history records.")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Time each pipeline stage and print a summary to stderr at the end.")
+    parser.add_argument("--metrics-log", metavar="PATH",
+                        help="Append one JSON line per timed stage to PATH ('-' for stderr). Implies --metrics.")
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help="Write the metrics in Prometheus text format to PATH when done. Implies --metrics.")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Serve Prometheus metrics at http://127.0.0.1:PORT/metrics while running. "
+                             "Implies --metrics.")
+    parser.add_argument("--compact-history", action="store_true",
+                        help="Compress old history records, reclaim free space in the history database, and exit.")
+    return parser
+
+
+def compact_history() -> int:
+    """Converts old history records to compressed storage and vacuums the database."""
+    from src.database.manager import setup_database, compact_database
+
+    setup_database()
+    before, after = compact_database()
+    print(f"History database: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB.", file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    from src.utils.helpers import parse_page_range
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.compact_history:
+        return compact_history()
+    if not args.inputs:
+        parser.error("the following arguments are required: inputs")
+    args.page_range = parse_page_range(args.pages)
+    files = collect_inputs(args.inputs)
+    if not files:
+        print("No supported input files found.", file=sys.stderr)
+        return 2
+
+    if args.metrics or args.metrics_log or args.metrics_file or args.metrics_port:
+        # Enabled before the worker pool starts, so the workers record too.
+        metrics.enable(log_path=args.metrics_log)
+        if args.metrics_port:
+            metrics.serve_prometheus(args.metrics_port)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        failed = run_batch(files, args, out)
+    finally:
+        if args.output:
+            out.close()
+        if metrics.enabled():
+            print(metrics.format_summary(), file=sys.stderr)
+            if args.metrics_file:
+                metrics.write_prometheus(args.metrics_file)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# File: src/database/compression.py
+
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# First byte of a compressed value names its codec.
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# Texts shorter than this (in UTF-8 bytes) are stored as plain TEXT; compressing
+# them saves little and keeps short records readable with any SQLite tool.
+COMPRESS_MIN_BYTES = 512
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# New values use zstd when the `zstandard` package is installed, zlib otherwise.
+DEFAULT_CODEC = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+def encode_text(text, codec: int = DEFAULT_CODEC):
+    """
+    Prepares a text for storage.
+
+    Returns:
+        str | bytes | None: The text itself when it is short (or does not shrink),
+        otherwise a BLOB of one codec byte followed by the compressed UTF-8.
+    """
+    if text is None:
+        return None
+    raw = text.encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return text
+    if codec == CODEC_ZSTD:
+        packed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        codec = CODEC_ZLIB
+        packed = zlib.compress(raw, ZLIB_LEVEL)
+    if len(packed) + 1 >= len(raw):
+        return text
+    return bytes([codec]) + packed
+
+
+def decode_text(value):
+    """
+    Restores a text stored with `encode_text`. Plain TEXT values pass through.
+
+    Raises:
+        ValueError: If the value uses an unknown codec, or zstd without `zstandard` installed.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    codec, packed = value[0], bytes(value[1:])
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(packed).decode("utf-8")
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("This record is zstd-compressed; install the 'zstandard' package to read it.")
+        return zstandard.ZstdDecompressor().decompress(packed).decode("utf-8")
+    raise ValueError(f"Unknown text codec {codec}")
@@ -0,0 +1,75 @@
+# File: src/database/connections.py
+
+import sqlite3
+import threading
+
+from src.utils import metrics
+
+
+class ThreadConnections:
+    """
+    One long-lived SQLite connection per thread, opened on first use with WAL journaling.
+
+    WAL lets readers in other threads and processes go on while one of them writes.
+    The database path is passed on every call, so a module can point its path
+    elsewhere (e.g. benchmarks use a temporary directory) and the next call in each
+    thread reconnects.
+
+    Args:
+        setup (callable): Called with each new connection, e.g. to set pragmas or
+            create tables; it is committed afterwards.
+    """
+
+    def __init__(self, setup=None):
+        self._setup = setup
+        self._local = threading.local()
+
+    def get(self, path: str) -> sqlite3.Connection:
+        """Returns this thread's connection to `path`, replacing one it has to another database."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.path == path:
+            return conn
+        if conn is not None:
+            conn.close()
+        # Several threads or worker processes may write at once; wait for the lock instead of failing.
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")  # Durable across app crashes; WAL keeps it consistent
+        if self._setup is not None:
+            self._setup(conn)
+            conn.commit()
+        self._local.conn = conn
+        self._local.path = path
+        return conn
+
+    def close(self):
+        """Closes this thread's connection, if it has one."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class StatCounters:
+    """
+    Process-wide counters of a store, also reported to `src.utils.metrics` as `<prefix>.<key>`.
+
+    Args:
+        prefix (str): Metric name prefix, e.g. 'ocr_cache'.
+        keys (iterable): Counter names; each starts at 0.
+    """
+
+    def __init__(self, prefix: str, keys):
+        self._prefix = prefix
+        self._values = dict.fromkeys(keys, 0)
+        self._lock = threading.Lock()
+
+    def count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._values[key] += amount
+        metrics.count(f"{self._prefix}.{key}", amount)
+
+    def snapshot(self) -> dict:
+        """Returns a copy of the current totals."""
+        with self._lock:
+            return dict(self._values)
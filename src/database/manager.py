@@ -1,15 +1,62 @@
 # File: src/database/manager.py
 
+import atexit
+import os
+import queue
 import sqlite3
+import threading
+from concurrent.futures import Future
 from datetime import datetime
 
+from src.database.compression import decode_text, encode_text
+from src.database.connections import ThreadConnections
+from src.utils import metrics
+
 DB_PATH = "history.db"
 
-def setup_database():
-    """Creates the database and the history table if they don't exist."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
+# Writes queued for the background writer are committed together, up to this many per transaction.
+MAX_WRITE_BATCH = 200
+
+# Layout of a row's stored values, recorded per row in `storage_format`:
+#   0: texts are plain TEXT (rows saved before compression was added)
+#   1: texts are plain TEXT or compressed BLOBs (see src.database.compression)
+# `ocr_data` is packed and zlib-compressed by OcrDocument.to_bytes in both, and stored as is.
+STORAGE_FORMAT = 1
+# Old rows converted per transaction by `compress_stored_records`.
+COMPRESS_BATCH = 100
+
+def _tune(conn: sqlite3.Connection):
+    """Sets up every new connection to the history database."""
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -16000")  # 16 MB page cache
+    conn.execute("PRAGMA busy_timeout = 30000")
+    # Lets SQL (the full-text index, previews) read compressed texts. Every connection
+    # that writes to `history` needs it, since the index triggers call it.
+    conn.create_function("history_text", 1, decode_text, deterministic=True)
+
+
+_connections = ThreadConnections(_tune)
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Returns this thread's long-lived connection to the history database.
+
+    Each thread gets its own connection, opened on first use with WAL journaling
+    (readers never wait for the writer) and tuned pragmas.
+    """
+    return _connections.get(DB_PATH)
+
+
+def close_connection():
+    """Closes this thread's connection, if it has one."""
+    _connections.close()
+
+
+# --- Schema migrations, applied in order and tracked with PRAGMA user_version ---
+
+def _migration_1_base_schema(conn):
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS history (
         id INTEGER PRIMARY KEY,
         timestamp TEXT NOT NULL,
@@ -18,39 +65,458 @@ def setup_database():
         translated_text TEXT
     )
     """)
-    conn.commit()
-    conn.close()
+    # Columns added after the first release
+    existing_columns = {row[1] for row in conn.execute("PRAGMA table_info(history)")}
+    if "ocr_data" not in existing_columns:
+        conn.execute("ALTER TABLE history ADD COLUMN ocr_data BLOB")
+    if "parser_mode" not in existing_columns:
+        conn.execute("ALTER TABLE history ADD COLUMN parser_mode TEXT")
 
-def add_record(profile_name: str, original_text: str, translated_text: str = "") -> int:
-    """Adds a new record and returns the new record's ID."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute(
-        "INSERT INTO history (timestamp, profile_name, original_text, translated_text) VALUES (?, ?, ?, ?)",
-        (timestamp, profile_name, original_text, translated_text)
+def _migration_2_indexes(conn):
+    # Listing newest-first per profile and filtering by date
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_profile_id ON history (profile_name, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history (timestamp)")
+
+def _migration_3_full_text_search(conn):
+    # An external-content index: the text is stored once, in `history`, and kept in sync by triggers.
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS history_fts "
+            "USING fts5(original_text, translated_text, content='history', content_rowid='id')"
+        )
+    except sqlite3.OperationalError as e:
+        print(f"Full-text search is not available ({e}); history search will scan records instead.")
+        return
+    conn.executescript("""
+    CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+        INSERT INTO history_fts (rowid, original_text, translated_text)
+        VALUES (new.id, new.original_text, new.translated_text);
+    END;
+    CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+        INSERT INTO history_fts (history_fts, rowid, original_text, translated_text)
+        VALUES ('delete', old.id, old.original_text, old.translated_text);
+    END;
+    CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE OF original_text, translated_text ON history BEGIN
+        INSERT INTO history_fts (history_fts, rowid, original_text, translated_text)
+        VALUES ('delete', old.id, old.original_text, old.translated_text);
+        INSERT INTO history_fts (rowid, original_text, translated_text)
+        VALUES (new.id, new.original_text, new.translated_text);
+    END;
+    """)
+    conn.execute("INSERT INTO history_fts (history_fts) VALUES ('rebuild')")
+
+def _migration_4_compressed_storage(conn):
+    conn.execute("ALTER TABLE history ADD COLUMN storage_format INTEGER NOT NULL DEFAULT 0")
+    # Finds the rows `compress_stored_records` has yet to convert, without scanning the table
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_uncompressed ON history (id) WHERE storage_format = 0")
+    if not _has_fts(conn):
+        return
+    # Index the decompressed text: the index now reads its content through a view.
+    conn.executescript("""
+    DROP TRIGGER IF EXISTS history_fts_insert;
+    DROP TRIGGER IF EXISTS history_fts_delete;
+    DROP TRIGGER IF EXISTS history_fts_update;
+    DROP TABLE history_fts;
+    CREATE VIEW IF NOT EXISTS history_plain AS
+        SELECT id, history_text(original_text) AS original_text, history_text(translated_text) AS translated_text
+        FROM history;
+    CREATE VIRTUAL TABLE history_fts
+        USING fts5(original_text, translated_text, content='history_plain', content_rowid='id');
+    CREATE TRIGGER history_fts_insert AFTER INSERT ON history BEGIN
+        INSERT INTO history_fts (rowid, original_text, translated_text)
+        VALUES (new.id, history_text(new.original_text), history_text(new.translated_text));
+    END;
+    CREATE TRIGGER history_fts_delete AFTER DELETE ON history BEGIN
+        INSERT INTO history_fts (history_fts, rowid, original_text, translated_text)
+        VALUES ('delete', old.id, history_text(old.original_text), history_text(old.translated_text));
+    END;
+    -- Converting a row to a new storage format leaves its text unchanged; skip the reindex.
+    CREATE TRIGGER history_fts_update AFTER UPDATE OF original_text, translated_text ON history
+    WHEN old.storage_format = new.storage_format BEGIN
+        INSERT INTO history_fts (history_fts, rowid, original_text, translated_text)
+        VALUES ('delete', old.id, history_text(old.original_text), history_text(old.translated_text));
+        INSERT INTO history_fts (rowid, original_text, translated_text)
+        VALUES (new.id, history_text(new.original_text), history_text(new.translated_text));
+    END;
+    """)
+    conn.execute("INSERT INTO history_fts (history_fts) VALUES ('rebuild')")
+
+def _migration_5_fts_update_on_text_change(conn):
+    if not _has_fts(conn):
+        return
+    # Edits also convert a row to the current storage format, so reindex whenever the
+    # decoded text changes rather than whenever the storage format stays the same.
+    conn.executescript("""
+    DROP TRIGGER IF EXISTS history_fts_update;
+    CREATE TRIGGER history_fts_update AFTER UPDATE OF original_text, translated_text ON history
+    WHEN history_text(old.original_text) IS NOT history_text(new.original_text)
+        OR history_text(old.translated_text) IS NOT history_text(new.translated_text) BEGIN
+        INSERT INTO history_fts (history_fts, rowid, original_text, translated_text)
+        VALUES ('delete', old.id, history_text(old.original_text), history_text(old.translated_text));
+        INSERT INTO history_fts (rowid, original_text, translated_text)
+        VALUES (new.id, history_text(new.original_text), history_text(new.translated_text));
+    END;
+    """)
+
+MIGRATIONS = [
+    _migration_1_base_schema,
+    _migration_2_indexes,
+    _migration_3_full_text_search,
+    _migration_4_compressed_storage,
+    _migration_5_fts_update_on_text_change,
+]
+
+def setup_database():
+    """
+    Creates the database and brings its schema up to date.
+
+    Rows saved before compression was added are converted in the background,
+    a batch at a time (see `compress_stored_records`).
+    """
+    conn = get_connection()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+    if conn.execute("SELECT 1 FROM history WHERE storage_format = 0 LIMIT 1").fetchone():
+        threading.Thread(target=compress_stored_records, name="history-compress", daemon=True).start()
+
+def _has_fts(conn) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'history_fts'").fetchone() is not None
+
+
+# Characters of each text loaded for list rows; the full text is fetched with `get_record`.
+PREVIEW_CHARS = 200
+# Rows per page returned by `get_records_page` and `search_records`.
+PAGE_SIZE = 50
+# Upper bound for keyset queries that start from the newest record (SQLite's largest rowid).
+_MAX_ID = 2 ** 63 - 1
+
+
+# --- Background writer ---
+
+class _Writer:
+    """
+    Applies writes on one background thread, committing whatever is queued in a single transaction.
+
+    Each write is a function taking the connection; its return value (or
+    exception) is delivered through the Future returned by `submit` once the
+    transaction has committed.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, write) -> Future:
+        future = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((write, future))
+        return future
+
+    def flush(self):
+        """Waits until every write queued so far has been committed."""
+        if self._thread is not None and self._thread.is_alive():
+            self.submit(lambda conn: None).result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            conn = get_connection()
+            outcomes = []
+            try:
+                with metrics.span("db.write_batch", writes=len(batch)), conn:
+                    for write, future in batch:
+                        try:
+                            outcomes.append((future, write(conn), None))
+                        except Exception as e:
+                            outcomes.append((future, None, e))
+                metrics.count("db.writes", len(batch))
+            except sqlite3.Error as e:
+                print(f"Error committing history writes: {e}")
+                outcomes = [(future, None, e) for _, future in batch]
+            for future, result, error in outcomes:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+_writer = _Writer()
+atexit.register(_writer.flush)
+
+def flush_writes():
+    """Waits until every queued history write has been committed."""
+    _writer.flush()
+
+
+# --- Records ---
+
+def _insert(conn, timestamp, profile_name, original_text, translated_text, ocr_data, parser_mode) -> int:
+    cursor = conn.execute(
+        "INSERT INTO history (timestamp, profile_name, original_text, translated_text, ocr_data, parser_mode, "
+        "storage_format) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (timestamp, profile_name, encode_text(original_text), encode_text(translated_text), ocr_data, parser_mode,
+         STORAGE_FORMAT)
     )
-    new_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return new_id
-
-def update_record_translation(record_id: int, translated_text: str):
-    """Updates the translated_text for a specific record."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE history SET translated_text = ? WHERE id = ?",
-        (translated_text, record_id)
+    return cursor.lastrowid
+
+def add_record_async(profile_name: str, original_text: str, translated_text: str = "",
+                     ocr_data: bytes = None, parser_mode: str = None) -> Future:
+    """Queues a new record for the background writer; the Future resolves to the record's ID."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return _writer.submit(
+        lambda conn: _insert(conn, timestamp, profile_name, original_text, translated_text, ocr_data, parser_mode)
     )
-    conn.commit()
-    conn.close()
 
+@metrics.timed("db.add_record")
+def add_record(profile_name: str, original_text: str, translated_text: str = "",
+               ocr_data: bytes = None, parser_mode: str = None) -> int:
+    """
+    Adds a new record and returns the new record's ID.
+
+    `ocr_data` holds the raw OCR boxes packed with `src.ocr.results.pack_results`,
+    so the record can be re-parsed later without the source file.
+    """
+    return add_record_async(profile_name, original_text, translated_text, ocr_data, parser_mode).result()
+
+@metrics.timed("db.add_records")
+def add_records(records: list) -> list:
+    """
+    Adds many records in a single transaction and returns their IDs.
+
+    Args:
+        records (list): Dicts with 'profile_name', 'original_text' and optionally
+                        'translated_text', 'ocr_data' and 'parser_mode'.
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def write(conn):
+        return [
+            _insert(conn, timestamp, record["profile_name"], record["original_text"],
+                    record.get("translated_text", ""), record.get("ocr_data"), record.get("parser_mode"))
+            for record in records
+        ]
+    return _writer.submit(write).result()
+
+def update_record_translation(record_id: int, translated_text: str) -> Future:
+    """
+    Updates the translated_text for a specific record. The write happens in the background.
+
+    An old row is converted to the current storage format along the way.
+    """
+    return _writer.submit(lambda conn: conn.execute(
+        "UPDATE history SET original_text = ?, translated_text = ?, storage_format = ? WHERE id = ?",
+        _converted_row(conn, record_id, translated_text=encode_text(translated_text))
+    ).rowcount)
+
+def update_record_text(record_id: int, original_text: str, parser_mode: str) -> Future:
+    """Replaces the formatted text of a record after it was re-parsed with another mode. Runs in the background."""
+    return _writer.submit(lambda conn: conn.execute(
+        "UPDATE history SET original_text = ?, translated_text = ?, storage_format = ?, parser_mode = ? WHERE id = ?",
+        _converted_row(conn, record_id, original_text=encode_text(original_text))[:3] + (parser_mode, record_id)
+    ).rowcount)
+
+def _converted_row(conn, record_id: int, **new_texts) -> tuple:
+    """
+    Returns (original_text, translated_text, storage_format, id) for an update that sets `new_texts`.
+
+    Both texts must be written in the current format together with `storage_format`:
+    a row still marked 0 would otherwise be picked up again by `compress_stored_records`.
+    """
+    row = conn.execute("SELECT original_text, translated_text, storage_format FROM history WHERE id = ?",
+                       (record_id,)).fetchone()
+    original_text, translated_text, storage_format = row if row else (None, None, STORAGE_FORMAT)
+    if storage_format == 0:
+        original_text, translated_text = encode_text(original_text), encode_text(translated_text)
+    return (new_texts.get("original_text", original_text), new_texts.get("translated_text", translated_text),
+            STORAGE_FORMAT, record_id)
+
+@metrics.timed("db.get_record_ocr_data")
+def get_record_ocr_data(record_id: int):
+    """Returns the packed raw OCR boxes of a record, or None if it has none."""
+    _writer.flush()
+    row = get_connection().execute("SELECT ocr_data FROM history WHERE id = ?", (record_id,)).fetchone()
+    return row[0] if row else None
+
+@metrics.timed("db.get_all_records")
 def get_all_records() -> list:
-    """Retrieves all records from the history table."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT timestamp, profile_name, original_text, translated_text FROM history ORDER BY id DESC")
-    records = cursor.fetchall()
-    conn.close()
-    return records
\ No newline at end of file
+    """
+    Retrieves all records from the history table, newest first.
+
+    Each record is (id, timestamp, profile_name, original_text, translated_text,
+    parser_mode, has_ocr_data).
+    """
+    _writer.flush()
+    rows = get_connection().execute(
+        "SELECT id, timestamp, profile_name, original_text, translated_text, parser_mode, ocr_data IS NOT NULL "
+        "FROM history ORDER BY id DESC"
+    ).fetchall()
+    return [_decoded(row) for row in rows]
+
+def _decoded(row: tuple) -> tuple:
+    return row[:3] + (decode_text(row[3]), decode_text(row[4])) + row[5:]
+
+@metrics.timed("db.get_record")
+def get_record(record_id: int):
+    """
+    Returns one full record, or None if it does not exist.
+
+    The record is (id, timestamp, profile_name, original_text, translated_text,
+    parser_mode, has_ocr_data), as in `get_all_records`.
+    """
+    _writer.flush()
+    row = get_connection().execute(
+        "SELECT id, timestamp, profile_name, original_text, translated_text, parser_mode, ocr_data IS NOT NULL "
+        "FROM history WHERE id = ?", (record_id,)
+    ).fetchone()
+    return _decoded(row) if row else None
+
+@metrics.timed("db.get_records_page")
+def get_records_page(before_id: int = None, limit: int = PAGE_SIZE) -> list:
+    """
+    Returns one page of records, newest first, with the texts cut to PREVIEW_CHARS.
+
+    Pages are keyed on the record ID rather than an offset, so each page costs
+    the same however deep the user has scrolled.
+
+    Args:
+        before_id (int): Only records older than this ID; None starts from the newest.
+        limit (int): Maximum number of records.
+
+    Returns:
+        list: Records shaped like those of `get_all_records`, with preview texts.
+    """
+    _writer.flush()
+    return get_connection().execute(
+        "SELECT id, timestamp, profile_name, substr(history_text(original_text), 1, ?), "
+            "substr(history_text(translated_text), 1, ?), "
+        "parser_mode, ocr_data IS NOT NULL FROM history WHERE id < ? ORDER BY id DESC LIMIT ?",
+        (PREVIEW_CHARS, PREVIEW_CHARS, before_id if before_id is not None else _MAX_ID, limit)
+    ).fetchall()
+
+def _match_expression(query: str) -> str:
+    """Turns what the user typed into an FTS5 query: every word must match, the last one as a prefix."""
+    words = ['"' + word.replace('"', '""') + '"' for word in query.split()]
+    if words:
+        words[-1] += "*"
+    return " ".join(words)
+
+@metrics.timed("db.search_records")
+def search_records(query: str, before_id: int = None, limit: int = PAGE_SIZE) -> list:
+    """
+    Finds records whose original or translated text contains every word of `query`.
+
+    Results are paged like `get_records_page`, newest first. Instead of previews,
+    the texts are snippets around the matches, with matched words in [brackets].
+
+    Args:
+        query (str): Words to search for; the last word also matches as a prefix.
+        before_id (int): Only records older than this ID; None starts from the newest.
+        limit (int): Maximum number of records.
+    """
+    if not query.strip():
+        return get_records_page(before_id, limit)
+    _writer.flush()
+    conn = get_connection()
+    before_id = before_id if before_id is not None else _MAX_ID
+    if not _has_fts(conn):
+        pattern = "%" + query.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return conn.execute(
+            "SELECT id, timestamp, profile_name, substr(history_text(original_text), 1, ?), "
+            "substr(history_text(translated_text), 1, ?), "
+            "parser_mode, ocr_data IS NOT NULL FROM history "
+            "WHERE id < ? AND (history_text(original_text) LIKE ? ESCAPE '\\' "
+            "OR history_text(translated_text) LIKE ? ESCAPE '\\') "
+            "ORDER BY id DESC LIMIT ?",
+            (PREVIEW_CHARS, PREVIEW_CHARS, before_id, pattern, pattern, limit)
+        ).fetchall()
+    return conn.execute(
+        "SELECT h.id, h.timestamp, h.profile_name, "
+        "snippet(history_fts, 0, '[', ']', '...', 16), snippet(history_fts, 1, '[', ']', '...', 16), "
+        "h.parser_mode, h.ocr_data IS NOT NULL "
+        "FROM history_fts JOIN history h ON h.id = history_fts.rowid "
+        "WHERE history_fts MATCH ? AND history_fts.rowid < ? ORDER BY history_fts.rowid DESC LIMIT ?",
+        (_match_expression(query), before_id, limit)
+    ).fetchall()
+
+
+# --- Storage maintenance ---
+
+def compress_stored_records(batch_size: int = COMPRESS_BATCH, max_rows: int = None) -> int:
+    """
+    Rewrites rows saved before compression was added in the current storage format.
+
+    Each batch is its own transaction, queued behind other writes, and marks its
+    rows as converted; if the app exits midway, the next run picks up where this
+    one stopped.
+
+    Args:
+        batch_size (int): Rows per transaction.
+        max_rows (int): Stop after about this many rows; None converts them all.
+
+    Returns:
+        int: The number of rows converted.
+    """
+    def encode_plain(value):
+        # Values already written in the current format are kept as they are
+        return encode_text(value) if isinstance(value, str) else value
+
+    def convert_batch(conn):
+        rows = conn.execute(
+            "SELECT id, original_text, translated_text FROM history WHERE storage_format = 0 ORDER BY id LIMIT ?",
+            (batch_size,)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE history SET original_text = ?, translated_text = ?, storage_format = ? WHERE id = ?",
+            [(encode_plain(original_text), encode_plain(translated_text), STORAGE_FORMAT, record_id)
+             for record_id, original_text, translated_text in rows]
+        )
+        return len(rows)
+
+    converted = 0
+    try:
+        while max_rows is None or converted < max_rows:
+            count = _writer.submit(convert_batch).result()
+            converted += count
+            if count < batch_size:
+                break
+    except sqlite3.Error as e:
+        print(f"Error compressing history records: {e}")
+    return converted
+
+@metrics.timed("db.compact_database")
+def compact_database() -> tuple:
+    """
+    Converts any remaining old rows, then rebuilds the database file to return freed space to the disk.
+
+    This rewrites the whole file and blocks other writes while it runs.
+
+    Returns:
+        tuple: (size before, size after) of the database file in bytes.
+    """
+    def file_size():
+        return sum(os.path.getsize(path) for path in (DB_PATH, DB_PATH + "-wal") if os.path.exists(path))
+
+    compress_stored_records()
+    before = file_size()
+
+    def vacuum(conn):
+        conn.commit()  # VACUUM cannot run inside a transaction
+        if _has_fts(conn):
+            conn.execute("INSERT INTO history_fts (history_fts) VALUES ('optimize')")
+            conn.commit()
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    _writer.submit(vacuum).result()
+    return before, file_size()
@@ -1,47 +1,465 @@
 # File: src/file_processor.py
 
 import fitz  # PyMuPDF
-from src.ocr.engine import perform_ocr
-import io
+from src.ocr.engine import perform_ocr, perform_ocr_batch, engine_version, DEFAULT_LANGUAGE
+from src.ocr.pool import get_pool, release_pool
+from src.ocr.raster import PageRasterizer
+from src.ocr import cache as ocr_cache
+from src.ocr.results import OcrDocument, OcrPage
+from src.ocr.script_detect import AUTO_LANGUAGE, choose_language, route_image
+from src.utils import metrics
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+import os
+import queue
+import threading
 
-def process_file(file_path: str, lang_code: str) -> list: # UPDATED: Accepts lang_code
+# A page whose text layer is shorter than this is treated as scanned and OCR'd whole.
+MIN_TEXT_LAYER_CHARS = 20
+# Embedded images smaller than this on either side (in points) are ignored, e.g. logos.
+MIN_IMAGE_REGION_SIDE = 36
+# An image region is OCR'd when text-layer words cover less than this fraction of it.
+MAX_REGION_TEXT_COVERAGE = 0.05
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+# Pages in flight per worker process: enough to keep workers busy while the
+# caller handles earlier pages, few enough to keep memory flat.
+PIPELINE_DEPTH = 2
+# Cache lookups and writes are done this many pages at a time.
+CACHE_READ_WINDOW = 32
+CACHE_WRITE_BATCH = 16
+
+# A pool worker keeps the document it renders open between pages, keyed by path and
+# file stamp (so a file saved again at the same path is reopened), and closes it
+# once it has been idle this many seconds, so the file is not held open after use.
+DOC_IDLE_SECONDS = 1.0
+
+_worker_doc = None
+_worker_doc_key = None # (path, (st_mtime_ns, st_size))
+_worker_doc_timer = None
+_worker_doc_lock = threading.Lock()
+# The rasterizer whose buffer is reused for every page rendered, one per thread, so
+# threads that OCR in-process (the GUI's, the service's) never share a render buffer.
+_local = threading.local()
+
+
+def process_file(file_path: str, lang_code: str, page_range: tuple = None, dpi: int = None,
+                 use_cache: bool = True, workers: int = None, profile: str = None) -> OcrDocument: # UPDATED: Accepts lang_code
     """
     Processes a file (image or PDF) and returns structured OCR data.
+
+    The returned OcrDocument iterates like the older nested-list results. To
+    handle pages as soon as each one is ready, use `iter_pages` instead.
+
+    Results are cached per page, keyed by the file's content hash, so reopening
+    a file does not run OCR again.
+
+    Args:
+        file_path (str): Path to an image or PDF file.
+        lang_code (str): OCR language code, or AUTO_LANGUAGE ('auto') to detect it from the file.
+        page_range (tuple): Optional (first, last) 1-based inclusive page numbers for PDFs.
+        dpi (int): Fixed render DPI for scanned PDF pages; chosen per page when omitted.
+        use_cache (bool): Whether to read and write the OCR result cache.
+        workers (int): Processes used to OCR PDF pages; defaults to the CPU count.
+        profile (str): OCR profile name ('fast', 'balanced', 'accurate'); defaults to DEFAULT_PROFILE.
+    """
+    if not file_path.lower().endswith(IMAGE_EXTENSIONS + ('.pdf',)):
+        print(f"Unsupported file type: {file_path}")
+        return OcrDocument.from_pages([])
+    with metrics.span("process_file", file=os.path.basename(file_path)) as span:
+        # UPDATED: Pass the lang_code to the page pipeline
+        document = OcrDocument.from_pages(list(iter_pages(file_path, lang_code=lang_code, page_range=page_range,
+                                                          dpi=dpi, use_cache=use_cache, workers=workers,
+                                                          profile=profile)))
+        span.set(pages=len(document.page_numbers()), boxes=len(document))
+    return document
+
+
+def process_images(file_paths: list, lang_code: str, use_cache: bool = True, profile: str = None) -> list:
+    """
+    OCRs many image files at once, sharing recognition batches between them.
+
+    Cached images are served from the cache; the rest go through
+    `perform_ocr_batch` together, which is faster than one `process_file` call
+    per image when there are many small files.
+
+    Args:
+        file_paths (list): Paths to image files.
+        lang_code (str): OCR language code, or AUTO_LANGUAGE to detect it per file.
+        use_cache (bool): Whether to read and write the OCR result cache.
+        profile (str): OCR profile name; defaults to DEFAULT_PROFILE.
+
+    Returns:
+        list: One OcrDocument per file, in input order.
+    """
+    if lang_code == AUTO_LANGUAGE:
+        # Each detected language is OCR'd as its own batch
+        languages = [choose_language(path, profile, use_cache=use_cache).lang_code if os.path.exists(path)
+                     else DEFAULT_LANGUAGE for path in file_paths]
+        documents = [None] * len(file_paths)
+        for language in dict.fromkeys(languages):
+            indices = [i for i, other in enumerate(languages) if other == language]
+            for i, document in zip(indices, process_images([file_paths[i] for i in indices], language,
+                                                           use_cache, profile)):
+                documents[i] = document
+        return documents
+    version = engine_version(profile)
+    pages = [None] * len(file_paths)
+    digests = [None] * len(file_paths)
+    if use_cache:
+        for i, path in enumerate(file_paths):
+            if os.path.exists(path):
+                digests[i] = ocr_cache.file_hash(path)
+                cached = ocr_cache.get_pages(digests[i], [0], lang_code, 0, version)
+                if 0 in cached:
+                    pages[i] = cached[0].page(0)
+    missing = [i for i, page in enumerate(pages) if page is None]
+    for i, page in zip(missing, perform_ocr_batch([file_paths[i] for i in missing], language=lang_code,
+                                                        profile=profile)):
+        pages[i] = page
+        if digests[i] is not None:
+            ocr_cache.put_pages(digests[i], {0: page}, lang_code, 0, version)
+    return [OcrDocument.from_pages([page]) for page in pages]
+
+
+def iter_pages(file_path: str, lang_code: str, page_range: tuple = None, dpi: int = None,
+               use_cache: bool = True, workers: int = None, profile: str = None, script_choice=None):
     """
-    if file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
+    Yields the OCR results of a file page by page, in page order, as soon as each page is ready.
+
+    The stages overlap: while the caller works on one page (parsing, display),
+    later pages are being rendered and OCR'd in the worker pool, and finished
+    pages are written to the cache by a background thread. Only PIPELINE_DEPTH
+    pages per worker are in flight at a time and the cache is read in windows,
+    so memory stays flat however long the document is. A consumer that stops
+    pulling pages stops new ones from being submitted.
+
+    Pages with (almost) no text layer are OCR'd whole. Other pages use their text
+    layer, and only embedded image regions that carry no text of their own are
+    rendered and OCR'd. Coordinates are PDF points.
+
+    With AUTO_LANGUAGE, the engine is chosen by `choose_language` before any page
+    is OCR'd. Image regions are then probed and routed to the engine that reads
+    them, and so are scanned pages when the document mixes scripts.
+
+    Args:
+        Same as `process_file`, and:
+        script_choice (ScriptChoice): The language decided beforehand for AUTO_LANGUAGE, e.g. once for
+            all parts of a job split across workers; detected here when omitted.
+
+    Yields:
+        OcrPage: One page's boxes, with its 1-based page number (0 for an image file).
+    """
+    if file_path.lower().endswith(IMAGE_EXTENSIONS):
+        yield from _iter_image(file_path, lang_code, use_cache, profile, script_choice)
+        return
+
+    version = engine_version(profile)
+    workers = workers or os.cpu_count() or 1
+    digest = ocr_cache.file_hash(file_path) if use_cache else None
+    cache_language = lang_code
+    choice = None
+    if lang_code == AUTO_LANGUAGE:
+        choice = script_choice or choose_language(file_path, profile, page_range, digest, use_cache)
+        lang_code = choice.lang_code
+    stat = os.stat(file_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with fitz.open(file_path) as doc:
+        page_indices = _resolve_page_range(len(doc), page_range)
+        if len(page_indices) <= 1:
+            workers = 1 # Not worth paying for a second engine in a worker process.
+        pool = None
+
+        def submit(task):
+            # The pool is only started once a page actually needs OCR
+            nonlocal pool
+            if pool is None:
+                pool = get_pool(lang_code, workers, profile)
+            return pool.submit(_ocr_pdf_page, task)
+
+        writer = _CacheWriter(digest, cache_language, dpi or 0, version) if use_cache else None
+        in_flight = deque()
+        cached = {}
+        try:
+            for position, page_index in enumerate(page_indices):
+                if use_cache and position % CACHE_READ_WINDOW == 0:
+                    window = page_indices[position:position + CACHE_READ_WINDOW]
+                    cached = ocr_cache.get_pages(digest, window, cache_language, dpi or 0, version)
+                if page_index in cached:
+                    in_flight.append((page_index, cached.pop(page_index).page(page_index + 1), None))
+                else:
+                    in_flight.append(_start_page(doc, file_path, page_index, lang_code, dpi, profile,
+                                                 submit if workers > 1 else None, choice, stamp))
+                # Backpressure: wait for the oldest page before starting more
+                while len(in_flight) > workers * PIPELINE_DEPTH or (in_flight and _is_ready(in_flight[0])):
+                    yield _finish_page(in_flight.popleft(), writer, doc)
+            while in_flight:
+                yield _finish_page(in_flight.popleft(), writer, doc)
+        finally:
+            # The caller stopped early; drop OCR work nobody will collect
+            for _, _, tasks in in_flight:
+                for task in tasks or ():
+                    if isinstance(task, Future):
+                        task.cancel()
+            if writer is not None:
+                writer.close()
+            if pool is not None:
+                release_pool(pool)
+
+
+def _iter_image(file_path: str, lang_code: str, use_cache: bool, profile: str = None, script_choice=None):
+    """Yields the single page of an image file, from the cache when possible."""
+    if lang_code == AUTO_LANGUAGE and os.path.exists(file_path):
+        # One engine reads the whole image, so its results are cached under that engine's language
+        lang_code = (script_choice or choose_language(file_path, profile, use_cache=use_cache)).lang_code
+    if not use_cache or not os.path.exists(file_path):
         # UPDATED: Pass the lang_code to the OCR engine
-        return perform_ocr(file_path, language=lang_code)
-    elif file_path.lower().endswith('.pdf'):
-        # UPDATED: Pass the lang_code to the PDF processor
-        return _process_pdf(file_path, lang_code=lang_code)
+        results = perform_ocr(file_path, language=lang_code, profile=profile)
+        metrics.observe("boxes_per_page", len(results))
+        yield results
+        return
+    version = engine_version(profile)
+    digest = ocr_cache.file_hash(file_path)
+    cached = ocr_cache.get_pages(digest, [0], lang_code, 0, version)
+    if 0 in cached:
+        yield cached[0].page(0)
+        return
+    results = perform_ocr(file_path, language=lang_code, profile=profile)
+    metrics.observe("boxes_per_page", len(results))
+    ocr_cache.put_pages(digest, {0: results}, lang_code, 0, version)
+    yield results
+
+
+def _start_page(doc, file_path: str, page_index: int, lang_code: str, dpi: int, profile: str = None,
+                submit=None, choice=None, stamp: tuple = None) -> tuple:
+    """
+    Routes a page and submits its OCR work.
+
+    Args:
+        submit (callable): Sends a task to the worker pool and returns its future; without
+            one, the tasks run in-process when the page is finished.
+        choice (ScriptChoice): The detected script when the language is automatic. When it is
+            mixed, tasks carry its tuple of engines instead of one language code.
+        stamp (tuple): The file's (st_mtime_ns, st_size), so workers never render a stale copy.
+
+    Returns:
+        tuple: (page index, boxes known so far, list of futures or task tuples)
+    """
+    page = doc[page_index]
+    page_language = lang_code
+    if choice is not None and choice.mixed:
+        page_language = choice.languages # Each scanned page and image region goes to the engine that reads it
+    with metrics.span("pdf.route", page=page_index + 1) as span:
+        if len(page.get_text().strip()) < MIN_TEXT_LAYER_CHARS:
+            known = OcrPage.empty(page_index + 1)
+            tasks = [(file_path, stamp, page_index, None, page_language, dpi, profile)]
+            metrics.count("pdf.pages", route="scanned")
+        else:
+            known = _extract_text_blocks(page, page_index + 1)
+            tasks = [(file_path, stamp, page_index, tuple(clip), page_language, dpi, profile)
+                     for clip in _find_untexted_image_regions(page)]
+            metrics.count("pdf.pages", route="image_regions" if tasks else "text_layer")
+        span.set(ocr_regions=len(tasks))
+    if submit is not None:
+        tasks = [submit(task) for task in tasks]
+    return page_index, known, tasks
+
+
+def _is_ready(entry: tuple) -> bool:
+    """True when a page can be finished without waiting on the pool (in-process tasks count as ready)."""
+    tasks = entry[2]
+    return tasks is None or all(not isinstance(task, Future) or task.done() for task in tasks)
+
+
+def _finish_page(entry: tuple, writer, doc=None) -> OcrPage:
+    """Waits for a page's OCR work, merges it with the text layer and queues it for the cache.
+
+    In-process tasks render from `doc`, the caller's open document.
+    """
+    page_index, known, tasks = entry
+    if tasks is None:
+        return known # Served from the cache
+    for task in tasks:
+        region_boxes = task.result() if isinstance(task, Future) else _ocr_pdf_page(task, doc)
+        known = OcrPage.concat([known, _drop_duplicated_boxes(region_boxes, known)], page_index + 1)
+    metrics.observe("boxes_per_page", len(known))
+    if writer is not None:
+        writer.put(page_index, known)
+    return known
+
+
+class _CacheWriter:
+    """
+    Writes finished pages to the OCR cache on a background thread, a batch per transaction.
+
+    The queue is bounded, so a slow disk holds up the pipeline instead of piling
+    pages up in memory.
+    """
+
+    def __init__(self, digest: str, lang_code: str, dpi: int, version: str):
+        self._key = (lang_code, dpi, version)
+        self._digest = digest
+        self._queue = queue.Queue(maxsize=CACHE_WRITE_BATCH * 2)
+        self._thread = threading.Thread(target=self._run, name="ocr-cache-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, page_index: int, page: OcrPage):
+        self._queue.put((page_index, page))
+
+    def close(self):
+        """Flushes the remaining pages and stops the thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        finished = False
+        while not finished:
+            batch = {}
+            item = self._queue.get()
+            while item is not None:
+                batch[item[0]] = item[1]
+                if len(batch) >= CACHE_WRITE_BATCH:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            finished = item is None
+            if batch:
+                try:
+                    ocr_cache.put_pages(self._digest, batch, *self._key)
+                except Exception as e:
+                    print(f"Error writing OCR cache: {e}")
+
+
+def _resolve_page_range(page_count: int, page_range: tuple) -> range:
+    """Converts an optional 1-based inclusive (first, last) range into 0-based page indices."""
+    if page_range is None:
+        return range(page_count)
+    first, last = page_range
+    first = max(int(first or 1), 1)
+    last = min(int(last or page_count), page_count)
+    return range(first - 1, last)
+
+
+def _extract_text_blocks(page, page_number: int) -> OcrPage:
+    """Converts a page's text layer into OCR-like results."""
+    ocr_like_results = []
+    for b in page.get_text("blocks"):
+        if b[6] != 0: # Skip image blocks
+            continue
+        box = [[b[0], b[1]], [b[2], b[1]], [b[2], b[3]], [b[0], b[3]]]
+        text_tuple = (b[4].strip(), 0.99)
+        if text_tuple[0]:
+            ocr_like_results.append([box, text_tuple])
+    return OcrPage.from_results(ocr_like_results, page_number)
+
+
+def _find_untexted_image_regions(page) -> list:
+    """
+    Finds embedded images on a page that have no text layer over them.
+
+    Overlapping images are merged so no area is OCR'd twice. An image counts as
+    untexted when the words of the text layer inside it cover less than
+    MAX_REGION_TEXT_COVERAGE of its area (e.g. a scanned table or figure).
+
+    Returns:
+        list: fitz.Rect regions to render and OCR.
+    """
+    regions = []
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & page.rect
+        if rect.is_empty or rect.width < MIN_IMAGE_REGION_SIDE or rect.height < MIN_IMAGE_REGION_SIDE:
+            continue
+        for i, other in enumerate(regions):
+            if rect.intersects(other):
+                regions[i] = other | rect
+                break
+        else:
+            regions.append(rect)
+
+    untexted = []
+    for rect in regions:
+        covered = 0.0
+        for w in page.get_text("words", clip=rect):
+            covered += (fitz.Rect(w[:4]) & rect).get_area()
+        if covered < rect.get_area() * MAX_REGION_TEXT_COVERAGE:
+            untexted.append(rect)
+    return untexted
+
+
+def _drop_duplicated_boxes(ocr_boxes: OcrPage, text_boxes: OcrPage) -> OcrPage:
+    """Drops OCR boxes whose centre falls inside a text-layer block already on the page."""
+    if not len(text_boxes) or not len(ocr_boxes):
+        return ocr_boxes
+    centres = ocr_boxes.quads.mean(axis=1)
+    low = text_boxes.quads.min(axis=1)
+    high = text_boxes.quads.max(axis=1)
+    inside = (centres[:, None, :] >= low[None, :, :]) & (centres[:, None, :] <= high[None, :, :])
+    keep = np.flatnonzero(~inside.all(axis=2).any(axis=1))
+    if len(keep) == len(ocr_boxes):
+        return ocr_boxes
+    texts = ocr_boxes.texts()
+    return OcrPage.from_results(
+        [[ocr_boxes.quads[i], (texts[i], ocr_boxes.scores[i])] for i in keep], ocr_boxes.page_number
+    )
+
+
+def _render_task(doc, page_index: int, clip, dpi: int) -> tuple:
+    """Renders a page, or one region of it, with this thread's rasterizer. Returns (image, dpi, clip)."""
+    rasterizer = getattr(_local, "rasterizer", None)
+    if rasterizer is None:
+        rasterizer = _local.rasterizer = PageRasterizer()
+    page = doc[page_index]
+    clip = fitz.Rect(clip) if clip is not None else page.rect
+    with metrics.span("pdf.render", page=page_index + 1) as span:
+        image, dpi = rasterizer.render(page, clip=clip, dpi=dpi)
+        span.set(dpi=dpi, pixels=image.shape[0] * image.shape[1])
+    return image, dpi, clip
+
+
+def _close_idle_doc(timer):
+    """Closes the worker's document, unless it was used again after `timer` was started."""
+    global _worker_doc, _worker_doc_key
+    with _worker_doc_lock:
+        if _worker_doc_timer is timer and _worker_doc is not None:
+            _worker_doc.close()
+            _worker_doc = _worker_doc_key = None
+
+
+def _ocr_pdf_page(task: tuple, doc=None) -> OcrPage:
+    """
+    Renders and OCRs a PDF page, or one region of it.
+
+    Runs inside a worker process, which opens the document itself; in-process
+    callers pass their open `doc`. Returned boxes are in PDF points so they line
+    up with the page's text layer. A tuple of languages routes the image to
+    whichever of those engines reads it.
+    """
+    global _worker_doc, _worker_doc_key, _worker_doc_timer
+    file_path, stamp, page_index, clip, lang_code, dpi, profile = task
+    if doc is not None:
+        image, dpi, clip = _render_task(doc, page_index, clip, dpi)
     else:
-        print(f"Unsupported file type: {file_path}")
-        return []
-
-def _process_pdf(file_path: str, lang_code: str) -> list: # UPDATED: Accepts lang_code
-    """
-    Handles PDF processing. Tries direct text extraction first, falls back to OCR.
-    """
-    doc = fitz.open(file_path)
-    if len(doc) == 0:
-        return []
-    
-    page = doc[0]
-    text = page.get_text().strip()
-    
-    if len(text) > 100:
-        blocks = page.get_text("blocks")
-        ocr_like_results = []
-        for b in blocks:
-            box = [[b[0], b[1]], [b[2], b[1]], [b[2], b[3]], [b[0], b[3]]]
-            text_tuple = (b[4].strip(), 0.99)
-            if text_tuple[0]:
-                 ocr_like_results.append([box, text_tuple])
-        return ocr_like_results
-
-    pix = page.get_pixmap(dpi=200)
-    img_bytes = pix.tobytes("png")
-    temp_image_path = io.BytesIO(img_bytes)
-    
-    # UPDATED: Pass the lang_code when falling back to OCR
-    return perform_ocr(temp_image_path, language=lang_code)
\ No newline at end of file
+        with _worker_doc_lock:
+            if _worker_doc_timer is not None:
+                _worker_doc_timer.cancel()
+            if _worker_doc_key != (file_path, stamp):
+                if _worker_doc is not None:
+                    _worker_doc.close()
+                _worker_doc = fitz.open(file_path)
+                _worker_doc_key = (file_path, stamp)
+            image, dpi, clip = _render_task(_worker_doc, page_index, clip, dpi)
+            timer = _worker_doc_timer = threading.Timer(DOC_IDLE_SECONDS, _close_idle_doc)
+            timer.args = (timer,)
+            timer.daemon = True
+            timer.start()
+
+    # Map pixel coordinates back to PDF points on the page
+    scale = 72 / dpi
+    if isinstance(lang_code, tuple):
+        boxes = route_image(image, lang_code, profile=profile)
+    else:
+        boxes = perform_ocr(image, language=lang_code, profile=profile)
+    return boxes.transformed(scale, clip.x0, clip.y0, page_number=page_index + 1)
@@ -1,46 +1,236 @@
 # File: src/gui/history_window.py
 
 import customtkinter as ctk
-from src.database.manager import get_all_records
+from src.database.manager import get_record, get_record_ocr_data, get_records_page, search_records, update_record_text
+from src.database.manager import PAGE_SIZE, PREVIEW_CHARS
+from src.layout_parser.parser import parse_layout
+from src.ocr.results import unpack_results
+
+PARSER_MODES = {"General Text": "general", "Structured Document": "document"}
+
+# Height of one row in the record list, in pixels.
+ROW_HEIGHT = 56
+# Characters of each text shown in a list row.
+ROW_PREVIEW_CHARS = 110
+# Delay after the last keystroke before a search runs, in milliseconds.
+SEARCH_DELAY_MS = 250
 
 class HistoryWindow(ctk.CTkToplevel):
+    """
+    Lists saved records with search, showing the selected record in full below the list.
+
+    The list is virtual: only as many row widgets as fit on screen exist, and they
+    are refilled as the user scrolls. Records are fetched a page at a time, with
+    short previews, as the user scrolls towards the end of what is loaded.
+    """
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.title("History")
-        self.geometry("800x600")
+        self.geometry("800x700")
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        self.records = []  # Loaded list rows (previews or search snippets), newest first
+        self.exhausted = False  # True once the last page has been loaded
+        self.query = ""
+        self.first_index = 0  # Index in `records` of the top visible row
+        self.row_widgets = []  # (frame, title label, preview label), reused while scrolling
+        self.selected_id = None
+        self.search_job = None
+
+        self.search_entry = ctk.CTkEntry(self, placeholder_text="Search original and translated text...")
+        self.search_entry.grid(row=0, column=0, padx=20, pady=(20, 5), sticky="ew")
+        self.search_entry.bind("<KeyRelease>", self.schedule_search)
+
+        self.list_frame = ctk.CTkFrame(self)
+        self.list_frame.grid(row=1, column=0, padx=20, pady=5, sticky="nsew")
+        self.list_frame.grid_columnconfigure(0, weight=1)
+        self.list_frame.bind("<Configure>", self._on_list_resize)
+        self.scrollbar = ctk.CTkScrollbar(self.list_frame, command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, rowspan=100, sticky="ns")
+        self.empty_label = ctk.CTkLabel(self.list_frame, text="No history found.")
+        self._bind_wheel(self.list_frame)
+
+        # --- Selected record ---
+        self.detail_frame = ctk.CTkFrame(self, fg_color="gray20")
+        self.detail_frame.grid(row=2, column=0, padx=20, pady=(5, 20), sticky="ew")
+        self.detail_frame.grid_columnconfigure(0, weight=1)
+
+        self.detail_label = ctk.CTkLabel(self.detail_frame, text="Select a record to see it in full.",
+                                         font=ctk.CTkFont(weight="bold"))
+        self.detail_label.grid(row=0, column=0, sticky="w", padx=10, pady=(5, 0))
+        original_label = ctk.CTkLabel(self.detail_frame, text="Original:", font=ctk.CTkFont(slant="italic"))
+        original_label.grid(row=1, column=0, sticky="w", padx=10, pady=(5, 0))
+        self.original_text_box = ctk.CTkTextbox(self.detail_frame, height=110, wrap="word", state="disabled")
+        self.original_text_box.grid(row=2, column=0, sticky="ew", padx=10, pady=5)
 
-        self.scrollable_frame = ctk.CTkScrollableFrame(self, label_text="Saved Records")
-        self.scrollable_frame.pack(expand=True, fill="both", padx=20, pady=20)
+        # Records that kept their raw OCR boxes can be re-formatted with another parser mode
+        self.mode_names = list(PARSER_MODES)
+        self.mode_button = ctk.CTkSegmentedButton(
+            self.detail_frame, values=self.mode_names,
+            command=lambda name: self.reparse_record(self.selected_id, PARSER_MODES[name], self.original_text_box)
+        )
+
+        translated_label = ctk.CTkLabel(self.detail_frame, text="Translation:", font=ctk.CTkFont(slant="italic"))
+        translated_label.grid(row=4, column=0, sticky="w", padx=10, pady=(5, 0))
+        self.translated_text_box = ctk.CTkTextbox(self.detail_frame, height=110, wrap="word", state="disabled")
+        self.translated_text_box.grid(row=5, column=0, sticky="ew", padx=10, pady=5)
 
         self.display_records()
 
     def display_records(self):
-        records = get_all_records()
+        """(Re)loads the list from the newest record, filtered by the current search."""
+        self.records = []
+        self.exhausted = False
+        self.first_index = 0
+        self._load_more()
+        self._render()
+
+    # --- Loading ---
+
+    def _load_more(self):
+        """Fetches the next page of rows after the last one loaded."""
+        if self.exhausted:
+            return
+        before_id = self.records[-1][0] if self.records else None
+        if self.query:
+            page = search_records(self.query, before_id=before_id, limit=PAGE_SIZE)
+        else:
+            page = get_records_page(before_id=before_id, limit=PAGE_SIZE)
+        self.records.extend(page)
+        self.exhausted = len(page) < PAGE_SIZE
 
-        if not records:
-            label = ctk.CTkLabel(self.scrollable_frame, text="No history found.")
-            label.pack(pady=10, padx=10)
+    def schedule_search(self, event=None):
+        """Runs the search shortly after the user stops typing."""
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DELAY_MS, self._run_search)
+
+    def _run_search(self):
+        self.search_job = None
+        query = self.search_entry.get().strip()
+        if query == self.query:
             return
+        self.query = query
+        self.display_records()
+
+    # --- Virtual list ---
+
+    def _visible_rows(self) -> int:
+        return max(1, self.list_frame.winfo_height() // ROW_HEIGHT)
 
-        for record in records:
-            timestamp, _, original_text, translated_text = record
-            
-            entry_frame = ctk.CTkFrame(self.scrollable_frame, fg_color="gray20")
-            entry_frame.pack(fill="x", padx=10, pady=5)
-            
-            timestamp_label = ctk.CTkLabel(entry_frame, text=f"Saved on: {timestamp}", font=ctk.CTkFont(weight="bold"))
-            timestamp_label.pack(anchor="w", padx=10, pady=(5, 0))
-
-            original_label = ctk.CTkLabel(entry_frame, text="Original:", font=ctk.CTkFont(slant="italic"))
-            original_label.pack(anchor="w", padx=10, pady=(5, 0))
-            original_text_box = ctk.CTkTextbox(entry_frame, height=80, wrap="word")
-            original_text_box.insert("1.0", original_text)
-            original_text_box.configure(state="disabled")
-            original_text_box.pack(fill="x", expand=True, padx=10, pady=5)
-
-            translated_label = ctk.CTkLabel(entry_frame, text="Translation:", font=ctk.CTkFont(slant="italic"))
-            translated_label.pack(anchor="w", padx=10, pady=(5, 0))
-            translated_text_box = ctk.CTkTextbox(entry_frame, height=80, wrap="word")
-            translated_text_box.insert("1.0", translated_text)
-            translated_text_box.configure(state="disabled")
-            translated_text_box.pack(fill="x", expand=True, padx=10, pady=5)
\ No newline at end of file
+    def _on_list_resize(self, event=None):
+        # Create row widgets only up to what fits on screen
+        while len(self.row_widgets) < self._visible_rows():
+            self.row_widgets.append(self._create_row(len(self.row_widgets)))
+        self._render()
+
+    def _create_row(self, position: int) -> tuple:
+        frame = ctk.CTkFrame(self.list_frame, height=ROW_HEIGHT - 6, fg_color="gray20")
+        frame.grid_propagate(False)
+        frame.grid_columnconfigure(0, weight=1)
+        title_label = ctk.CTkLabel(frame, text="", anchor="w", font=ctk.CTkFont(weight="bold"))
+        title_label.grid(row=0, column=0, sticky="ew", padx=10)
+        preview_label = ctk.CTkLabel(frame, text="", anchor="w")
+        preview_label.grid(row=1, column=0, sticky="ew", padx=10)
+        for widget in (frame, title_label, preview_label):
+            widget.bind("<Button-1>", lambda event, p=position: self._on_row_click(p))
+            self._bind_wheel(widget)
+        return frame, title_label, preview_label
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda event: self.scroll_rows(-1 if event.delta > 0 else 1))
+        widget.bind("<Button-4>", lambda event: self.scroll_rows(-1))  # X11
+        widget.bind("<Button-5>", lambda event: self.scroll_rows(1))
+
+    def scroll_rows(self, count: int):
+        """Moves the list by `count` rows, loading more records when nearing the end."""
+        self._scroll_to(self.first_index + count)
+
+    def _scroll_to(self, index: int):
+        visible = self._visible_rows()
+        # Keep a screenful of rows loaded beyond what is shown
+        while not self.exhausted and index + 2 * visible >= len(self.records):
+            self._load_more()
+        self.first_index = max(0, min(index, len(self.records) - visible))
+        self._render()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self._scroll_to(int(float(value) * len(self.records)))
+        elif action == "scroll":
+            step = self._visible_rows() if unit == "pages" else 1
+            self.scroll_rows(int(value) * step)
+
+    def _render(self):
+        """Fills the row widgets with the records currently scrolled into view."""
+        visible = self._visible_rows()
+        if not self.records:
+            self.empty_label.configure(text="No matching records." if self.query else "No history found.")
+            self.empty_label.grid(row=0, column=0, pady=10)
+        else:
+            self.empty_label.grid_remove()
+
+        for position, (frame, title_label, preview_label) in enumerate(self.row_widgets):
+            index = self.first_index + position
+            if position >= visible or index >= len(self.records):
+                frame.grid_remove()
+                continue
+            record_id, timestamp, profile_name, original_text, translated_text, parser_mode, _ = self.records[index]
+            title_label.configure(text=f"{timestamp}  -  {profile_name}")
+            original_preview = " ".join((original_text or "").split())[:ROW_PREVIEW_CHARS]
+            translated_preview = " ".join((translated_text or "").split())[:ROW_PREVIEW_CHARS]
+            preview_label.configure(text=f"{original_preview}  ->  {translated_preview}" if translated_preview
+                                    else original_preview)
+            frame.configure(fg_color="gray30" if record_id == self.selected_id else "gray20")
+            frame.grid(row=position, column=0, sticky="ew", padx=(5, 0), pady=3)
+
+        total = max(len(self.records) + (0 if self.exhausted else visible), 1)
+        self.scrollbar.set(self.first_index / total, min((self.first_index + visible) / total, 1.0))
+
+    # --- Selected record ---
+
+    def _on_row_click(self, position: int):
+        index = self.first_index + position
+        if index < len(self.records):
+            self.show_record(self.records[index][0])
+
+    def show_record(self, record_id: int):
+        """Loads one record in full into the panel below the list."""
+        record = get_record(record_id)
+        if record is None:
+            return
+        self.selected_id = record_id
+        _, timestamp, profile_name, original_text, translated_text, parser_mode, has_ocr_data = record
+        self.detail_label.configure(text=f"Saved on: {timestamp}  -  {profile_name}")
+        self._set_text(self.original_text_box, original_text or "")
+        self._set_text(self.translated_text_box, translated_text or "")
+        if has_ocr_data:
+            self.mode_button.set(self.mode_names[1] if parser_mode == "document" else self.mode_names[0])
+            self.mode_button.grid(row=3, column=0, sticky="w", padx=10, pady=(0, 5))
+        else:
+            self.mode_button.grid_remove()
+        self._render()
+
+    def _set_text(self, text_box, text: str):
+        text_box.configure(state="normal")
+        text_box.delete("1.0", "end")
+        text_box.insert("1.0", text)
+        text_box.configure(state="disabled")
+
+    def reparse_record(self, record_id: int, mode: str, text_box):
+        if record_id is None:
+            return
+        ocr_data = get_record_ocr_data(record_id)
+        if ocr_data is None:
+            return
+        formatted_text = parse_layout(unpack_results(ocr_data), mode=mode)
+        self._set_text(text_box, formatted_text)
+        update_record_text(record_id, formatted_text, mode)
+        # Refresh the list row's preview
+        for index, record in enumerate(self.records):
+            if record[0] == record_id:
+                self.records[index] = (record[0], record[1], record[2], formatted_text[:PREVIEW_CHARS], record[4], mode, record[6])
+                break
+        self._render()
@@ -1,23 +1,29 @@
 # File: src/gui/main_window_pyside.py
 
 import sys
+import threading
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QTextEdit,
     QPushButton, QRadioButton, QComboBox, QHBoxLayout, QVBoxLayout, 
-    QFrame, QFileDialog, QButtonGroup
+    QFrame, QFileDialog, QButtonGroup, QProgressBar, QListWidget, QListWidgetItem
 )
-from PySide6.QtCore import Qt, QRunnable, Slot, QThreadPool, QObject, Signal
+from PySide6.QtCore import Qt, QRunnable, Slot, QThreadPool, QObject, Signal, QTimer
+from PySide6.QtGui import QPixmap
 
 # Import all our backend logic
-from src.file_processor import process_file
+from src.jobs import JobScheduler, RUNNING, DONE, FAILED
 from src.layout_parser.parser import parse_layout
-from src.utils.exporter import export_to_pdf
-from src.translator.engine import translate_text
-from src.database.manager import setup_database, add_record
+from src.ocr.engine import OCR_PROFILES, DEFAULT_PROFILE
+from src.translator.engine import translate_stream
+from src.database.manager import setup_database, add_record_async
+from src.ocr.results import pack_results
+from src.utils.startup import preload_modules
 
 # --- Worker Thread for Translation ---
 class WorkerSignals(QObject):
-    finished = Signal(str)
+    paragraph = Signal(int, int, str) # number, total, translated text
+    finished = Signal(bool) # True when cancelled
+    error = Signal(str)
 
 class TranslatorWorker(QRunnable):
     def __init__(self, text, source_lang, target_lang):
@@ -26,11 +32,27 @@ class TranslatorWorker(QRunnable):
         self.text = text
         self.source_lang = source_lang
         self.target_lang = target_lang
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        # Stops after the paragraph being translated
+        self.cancel_event.set()
 
     @Slot()
     def run(self):
-        result = translate_text(self.text, self.source_lang, self.target_lang)
-        self.signals.finished.emit(result)
+        try:
+            for number, total, text in translate_stream(self.text, self.source_lang, self.target_lang,
+                                                        cancel_event=self.cancel_event):
+                self.signals.paragraph.emit(number, total, text)
+        except Exception as e:
+            print(f"Error during translation: {e}")
+            self.signals.error.emit(f"Error: Could not translate from '{self.source_lang}' to '{self.target_lang}'. Model may not be available.")
+            return
+        self.signals.finished.emit(self.cancel_event.is_set())
+
+# --- OCR job updates, delivered to the UI thread through a queued signal ---
+class JobSignals(QObject):
+    updated = Signal(int) # job id
 
 # --- Main Application Window ---
 class MainWindow(QMainWindow):
@@ -41,6 +63,15 @@ class MainWindow(QMainWindow):
         
         setup_database()
         self.threadpool = QThreadPool()
+        self.current_ocr_results = None # Raw OCR boxes of the current document, kept for re-parsing
+        self.current_source_lang = None # Translator code detected for the current document, in Auto-detect mode
+        self.translation_worker = None
+        # OCR runs as background jobs; the signal carries status changes to the UI thread
+        self.job_signals = JobSignals()
+        self.job_scheduler = JobScheduler(on_update=lambda job: self.job_signals.updated.emit(job.id))
+        self.job_items = {}
+        self.active_job_id = None # The job whose result is shown when it finishes
+        self.active_job_pages_shown = 0 # Pages of the active job already in the textbox
 
         # ---- UI Layout (omitted for brevity, it's the same as before) ----
         main_layout = QHBoxLayout()
@@ -73,14 +104,35 @@ class MainWindow(QMainWindow):
         left_panel_layout.addWidget(self.document_radio)
         translation_label = QLabel("Source Language:")
         self.lang_combo = QComboBox()
-        self.languages = ["English", "Spanish", "French", "German", "Chinese", "Japanese", "Korean", "Russian"]
+        self.languages = ["English", "Spanish", "French", "German", "Chinese", "Japanese", "Korean", "Russian", "Auto-detect"]
         self.lang_combo.addItems(self.languages)
+        self.lang_map = {
+            "English": "latin", "Spanish": "latin", "French": "latin", "German": "latin",
+            "Chinese": "ch", "Japanese": "japan", "Korean": "korean", "Russian": "cyrillic",
+            "Auto-detect": "auto" # Each job detects the script itself (src.ocr.script_detect)
+        }
         self.translate_btn = QPushButton("Translate to English")
         left_panel_layout.addSpacing(20)
         left_panel_layout.addWidget(translation_label)
         left_panel_layout.addWidget(self.lang_combo)
+        profile_label = QLabel("OCR Profile:")
+        self.profile_combo = QComboBox()
+        self.profile_combo.addItems(list(OCR_PROFILES))
+        self.profile_combo.setCurrentText(DEFAULT_PROFILE)
+        left_panel_layout.addWidget(profile_label)
+        left_panel_layout.addWidget(self.profile_combo)
         left_panel_layout.addStretch()
         left_panel_layout.addWidget(self.translate_btn)
+        self.translation_progress = QProgressBar()
+        self.translation_progress.setFormat("%v/%m paragraphs")
+        self.translation_progress.setValue(0)
+        self.cancel_translation_btn = QPushButton("Cancel Translation")
+        self.cancel_translation_btn.setEnabled(False)
+        left_panel_layout.addWidget(self.translation_progress)
+        left_panel_layout.addWidget(self.cancel_translation_btn)
+        self.engine_status_label = QLabel("")
+        left_panel_layout.addWidget(self.engine_status_label)
+        self.engine_futures = []
         right_panel_widget = QWidget()
         right_panel_widget.setLayout(right_panel_layout)
         self.image_label = QLabel("Select a file to begin")
@@ -91,6 +143,17 @@ class MainWindow(QMainWindow):
         right_panel_layout.addWidget(self.image_label, 1)
         right_panel_layout.addWidget(self.output_textbox, 1)
         right_panel_layout.addWidget(self.translated_textbox, 1)
+        self.jobs_list = QListWidget()
+        self.jobs_list.setMaximumHeight(120)
+        self.show_job_btn = QPushButton("Show Result")
+        self.cancel_job_btn = QPushButton("Cancel Job")
+        jobs_buttons_layout = QHBoxLayout()
+        jobs_buttons_layout.addWidget(QLabel("OCR Jobs:"))
+        jobs_buttons_layout.addStretch()
+        jobs_buttons_layout.addWidget(self.show_job_btn)
+        jobs_buttons_layout.addWidget(self.cancel_job_btn)
+        right_panel_layout.addLayout(jobs_buttons_layout)
+        right_panel_layout.addWidget(self.jobs_list)
         main_layout.addWidget(left_panel_widget)
         main_layout.addWidget(right_panel_widget)
         central_widget = QWidget()
@@ -104,7 +167,22 @@ class MainWindow(QMainWindow):
         self.save_txt_btn.clicked.connect(self.save_as_txt)
         self.save_pdf_btn.clicked.connect(self.save_as_pdf)
         self.translate_btn.clicked.connect(self.on_translate_click)
+        self.cancel_translation_btn.clicked.connect(self.cancel_translation)
+        self.parser_button_group.buttonClicked.connect(self.on_parser_mode_change)
         self.output_textbox.textChanged.connect(self.handle_text_change)
+        self.job_signals.updated.connect(self.on_job_updated)
+        self.show_job_btn.clicked.connect(lambda: self._with_selected_job(self.show_job))
+        self.cancel_job_btn.clicked.connect(lambda: self._with_selected_job(self.job_scheduler.cancel))
+        self.jobs_list.itemDoubleClicked.connect(lambda item: self.show_job(item.data(Qt.ItemDataRole.UserRole)))
+        # Keep the elapsed time of running jobs current
+        self.jobs_timer = QTimer(self)
+        self.jobs_timer.timeout.connect(self._refresh_running_jobs)
+        self.jobs_timer.start(1000)
+        self.lang_combo.currentTextChanged.connect(self._warm_engines)
+        self.profile_combo.currentTextChanged.connect(self._warm_engines)
+        # Once the window is up, load the OCR engines in the job workers and the translation/PDF modules here
+        QTimer.singleShot(100, self._warm_engines)
+        QTimer.singleShot(500, lambda: threading.Thread(target=preload_modules, daemon=True).start())
 
     # ---- Backend Methods ----
     def on_translate_click(self):
@@ -118,38 +196,184 @@ class MainWindow(QMainWindow):
             "Chinese": "zh", "Japanese": "ja", "Korean": "ko", "Russian": "ru"
         }
         source_lang_code = translator_map.get(selected_lang_name)
+        if selected_lang_name == "Auto-detect":
+            source_lang_code = self.current_source_lang or "en"
         
-        self.translated_textbox.setText(f"Translating from {selected_lang_name}...")
-        
-        # Run translation in a background thread
+        if self.translation_worker is not None:
+            return # A translation is already running
+
+        self.translated_textbox.clear()
+        self.translation_progress.setRange(0, 0) # Busy until the first paragraph arrives
+        self.translate_btn.setEnabled(False)
+        self.cancel_translation_btn.setEnabled(True)
+
+        # Run translation in a background thread; paragraphs are appended as they arrive
         worker = TranslatorWorker(self.original_text_for_db, source_lang_code, 'en')
+        worker.signals.paragraph.connect(self.on_translation_paragraph)
         worker.signals.finished.connect(self.on_translation_finished)
+        worker.signals.error.connect(self.on_translation_error)
+        self.translation_worker = worker
         self.threadpool.start(worker)
 
-    def on_translation_finished(self, translated_text):
-        self.translated_textbox.setText(translated_text)
-        if "Error:" not in translated_text:
-            add_record(profile_name="default", original_text=self.original_text_for_db, translated_text=translated_text)
+    def on_translation_paragraph(self, number, total, text):
+        if not self._is_current_translation():
+            return # From a translation that was discarded
+        cursor = self.translated_textbox.textCursor()
+        cursor.movePosition(cursor.MoveOperation.End)
+        cursor.insertText(text if number == 1 else "\n\n" + text)
+        self.translation_progress.setRange(0, total)
+        self.translation_progress.setValue(number)
+
+    def on_translation_finished(self, cancelled):
+        if not self._is_current_translation():
+            return
+        self._reset_translation_controls()
+        if not cancelled:
+            # Pack and write the record off the UI thread
+            threading.Thread(target=self._save_record, daemon=True, args=(
+                self.original_text_for_db, self.translated_textbox.toPlainText(),
+                self.current_ocr_results, self._parser_mode())).start()
+
+    def _save_record(self, original_text, translated_text, ocr_results, parser_mode):
+        ocr_data = pack_results(ocr_results) if ocr_results else None
+        future = add_record_async(profile_name="default", original_text=original_text, translated_text=translated_text,
+                                  ocr_data=ocr_data, parser_mode=parser_mode)
+        future.add_done_callback(self._report_save_error)
+
+    def _report_save_error(self, future):
+        if future.exception() is not None:
+            print(f"Error saving record: {future.exception()}")
+
+    def on_translation_error(self, message):
+        if not self._is_current_translation():
+            return
+        self._reset_translation_controls()
+        self.translated_textbox.setText(message)
+
+    def _is_current_translation(self):
+        return self.translation_worker is not None and self.sender() is self.translation_worker.signals
+
+    def cancel_translation(self):
+        # What has been translated so far stays visible
+        if self.translation_worker is not None:
+            self.translation_worker.cancel()
+            self.cancel_translation_btn.setEnabled(False)
+
+    def _discard_translation(self):
+        # Stops a running translation and ignores anything it still sends
+        if self.translation_worker is not None:
+            self.translation_worker.cancel()
+        self._reset_translation_controls()
+
+    def _reset_translation_controls(self):
+        self.translation_worker = None
+        self.translate_btn.setEnabled(True)
+        self.cancel_translation_btn.setEnabled(False)
+        if self.translation_progress.maximum() == 0:
+            self.translation_progress.setRange(0, 1)
+
+    def _parser_mode(self):
+        return "document" if self.document_radio.isChecked() else "general"
+
+    def on_parser_mode_change(self):
+        # Re-format the current document from its raw OCR boxes; no need to run OCR again
+        if self.current_ocr_results:
+            self.output_textbox.setText(parse_layout(self.current_ocr_results, mode=self._parser_mode()))
 
     def select_file(self):
-        # ... select_file logic is the same ...
-        file_path, _ = QFileDialog.getOpenFileName(self, "Select a File", "", "All Files (*);;Image Files (*.png *.jpg *.jpeg);;PDF Files (*.pdf)")
-        if not file_path: return
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Select Files", "", "All Files (*);;Image Files (*.png *.jpg *.jpeg);;PDF Files (*.pdf)")
+        if not file_paths: return
         self.clear_ui()
+        lang_code = self.lang_map.get(self.lang_combo.currentText(), 'latin')
+        # OCR runs in the background; every selected file becomes a job in the list
+        jobs = [self.job_scheduler.submit(path, lang_code, self._parser_mode(), profile=self.profile_combo.currentText())
+                for path in file_paths]
+        # The first selected file is shown as soon as its job finishes
+        self.active_job_id = jobs[0].id
+        self._show_preview(jobs[0].file_path)
+        self.output_textbox.setText("Processing...")
+
+    def _show_preview(self, file_path):
         if file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
             pixmap = QPixmap(file_path)
             scaled_pixmap = pixmap.scaled(self.image_label.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
             self.image_label.setPixmap(scaled_pixmap)
         else: self.image_label.setText(f"File:\n{file_path.split('/')[-1]}")
-        self.output_textbox.setText("Processing...")
-        QApplication.processEvents()
+
+    def on_job_updated(self, job_id):
+        job = self.job_scheduler.get(job_id)
+        if job is None: return
+        if job.id not in self.job_items:
+            item = QListWidgetItem()
+            item.setData(Qt.ItemDataRole.UserRole, job.id)
+            self.jobs_list.addItem(item)
+            self.job_items[job.id] = item
+        self.job_items[job.id].setText(job.describe())
+        if job.id == self.active_job_id and job.status == RUNNING:
+            self._append_job_pages(job)
+        if job.id == self.active_job_id and job.status in (DONE, FAILED):
+            self.show_job(job.id)
+
+    def _append_job_pages(self, job):
+        # Show pages of the active job as they arrive, while later pages are still being processed
+        new_texts = job.page_texts[self.active_job_pages_shown:]
+        if not new_texts: return
+        self.output_textbox.blockSignals(True) # Appending a page is not an edit; keep the translation
+        if self.active_job_pages_shown == 0:
+            self.output_textbox.clear() # Drop the "Processing..." note
+        cursor = self.output_textbox.textCursor()
+        cursor.movePosition(cursor.MoveOperation.End)
+        for text in new_texts:
+            if not text: continue
+            cursor.insertText("\n\n" + text if not self.output_textbox.document().isEmpty() else text)
+        self.output_textbox.blockSignals(False)
+        self.active_job_pages_shown += len(new_texts)
+
+    def _refresh_running_jobs(self):
+        for job in self.job_scheduler.jobs():
+            if job.status == RUNNING and job.id in self.job_items:
+                self.job_items[job.id].setText(job.describe())
+        self._update_engine_status()
+
+    def _warm_engines(self, *args):
+        # Start loading the selected OCR engine in the job workers so it is ready by the time a file is picked
         lang_code = self.lang_map.get(self.lang_combo.currentText(), 'latin')
-        raw_data = process_file(file_path, lang_code=lang_code)
-        mode = "document" if self.document_radio.isChecked() else "general"
-        formatted_text = parse_layout(raw_data, mode=mode)
-        self.output_textbox.setText(formatted_text)
-        
+        self.engine_futures = self.job_scheduler.warm(lang_code, self.profile_combo.currentText())
+        self.engine_status_label.setText("OCR engines: loading...")
+
+    def _update_engine_status(self):
+        if not self.engine_futures or not all(f.done() for f in self.engine_futures):
+            return
+        failed = any(f.cancelled() or f.exception() is not None for f in self.engine_futures)
+        self.engine_status_label.setText("OCR engines: failed to load" if failed else "OCR engines: ready")
+        self.engine_futures = []
+
+    def _with_selected_job(self, action):
+        item = self.jobs_list.currentItem()
+        if item is not None:
+            action(item.data(Qt.ItemDataRole.UserRole))
+
+    def show_job(self, job_id):
+        # Display a finished job's text and make it the current document
+        job = self.job_scheduler.get(job_id)
+        if job is None or job.status not in (DONE, FAILED): return
+        self.clear_ui()
+        self.active_job_id = job.id
+        self._show_preview(job.file_path)
+        if job.status == FAILED:
+            self.output_textbox.setText(f"Error processing {job.name}: {job.error}")
+            return
+        self.current_ocr_results = job.document
+        self.current_source_lang = job.script_choice.source_lang if job.script_choice is not None else None
+        mode = self._parser_mode()
+        self.output_textbox.setText(job.text if mode == job.parser_mode else parse_layout(job.document, mode=mode))
+
+    def closeEvent(self, event):
+        self.job_scheduler.shutdown()
+        super().closeEvent(event)
+
     def handle_text_change(self):
+        self._discard_translation()
         self.translated_textbox.clear() # Clear translation if original text changes
         
     # All other methods (save, copy, clear, etc.) are the same
@@ -157,7 +381,7 @@ class MainWindow(QMainWindow):
         original_text = self.output_textbox.toPlainText().strip()
         translated_text = self.translated_textbox.toPlainText().strip()
         if not original_text: return None
-        if translated_text and "Translating from" not in translated_text:
+        if translated_text:
             return f"--- ORIGINAL TEXT ---\n{original_text}\n\n--- TRANSLATED TEXT ---\n{translated_text}"
         else: return original_text
 
@@ -173,6 +397,8 @@ class MainWindow(QMainWindow):
         if not content: return
         file_path, _ = QFileDialog.getSaveFileName(self, "Save as PDF", "", "PDF Files (*.pdf)")
         if file_path:
+            # Imported here so fpdf is not loaded at startup
+            from src.utils.exporter import export_to_pdf
             try: export_to_pdf(content, file_path)
             except Exception as e: print(f"Error exporting to PDF: {e}")
 
@@ -181,4 +407,10 @@ class MainWindow(QMainWindow):
 
     def clear_ui(self):
         self.image_label.clear(); self.image_label.setText("Select a file to begin")
-        self.output_textbox.clear(); self.translated_textbox.clear()
\ No newline at end of file
+        self._discard_translation()
+        self.output_textbox.clear(); self.translated_textbox.clear()
+        self.translation_progress.setValue(0)
+        self.current_ocr_results = None
+        self.current_source_lang = None
+        self.active_job_id = None
+        self.active_job_pages_shown = 0
\ No newline at end of file
@@ -0,0 +1,501 @@
+# File: src/jobs.py
+
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import threading
+import time
+
+from src.ocr.results import OcrDocument
+from src.ocr.script_detect import AUTO_LANGUAGE
+
+# Job states, in the order a job normally goes through them.
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Rough peak memory of one job worker: an OCR engine plus a rendered page or two.
+JOB_MEMORY_MB = int(os.environ.get("OCR_JOB_MEMORY_MB", "1500"))
+# Upper bound on concurrent jobs; 0 means "as many as cores and memory allow".
+MAX_JOB_WORKERS = int(os.environ.get("OCR_MAX_JOB_WORKERS", "0"))
+# A PDF job with idle workers to spare is split into parts of at least this many pages.
+MIN_PAGES_PER_PART = 2
+
+
+def _available_memory_mb():
+    """Returns MemAvailable from /proc/meminfo in MB, or None if unknown."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def default_job_workers() -> int:
+    """
+    Picks how many OCR jobs may run at once from the CPU count and free memory.
+
+    Each job runs in its own process with its own OCR engine, so the count is
+    limited both by cores and by how many JOB_MEMORY_MB-sized workers fit in the
+    memory that is currently available.
+    """
+    workers = os.cpu_count() or 1
+    available = _available_memory_mb()
+    if available is not None and JOB_MEMORY_MB:
+        workers = min(workers, int(available // JOB_MEMORY_MB))
+    if MAX_JOB_WORKERS:
+        workers = min(workers, MAX_JOB_WORKERS)
+    return max(workers, 1)
+
+
+class Job:
+    """One file waiting for, or going through, OCR and layout parsing."""
+
+    def __init__(self, job_id: int, file_path: str, lang_code: str, parser_mode: str = "general",
+                 page_range: tuple = None, profile: str = None):
+        self.id = job_id
+        self.file_path = file_path
+        self.lang_code = lang_code
+        self.parser_mode = parser_mode
+        self.page_range = page_range
+        self.profile = profile  # OCR profile; None uses the default
+        self.status = QUEUED
+        self.pages = []  # OcrPage per page, filled in as pages finish
+        self.page_texts = []  # Parsed text per page, in step with `pages`
+        self.document = None  # OcrDocument once done
+        self.text = ""  # Parsed text once done
+        self.error = None
+        self.script_choice = None  # ScriptChoice once done, when the language was detected automatically
+        self.parts = 1  # Page ranges run in parallel by different workers
+        self.slots = []  # Worker slots of the parts still running (see JobScheduler._cancel_flags)
+        self._next_part = 0  # Parts before this one have delivered all of their pages
+        self._parts_done = set()
+        self._held_pages = {}  # part -> [(page, text)] received before an earlier part finished
+        self.record_id = None  # History record, set by the UI when it saves the result
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.file_path)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def describe(self) -> str:
+        """Returns a one-line status for job lists, e.g. 'scan.pdf: done (12.3s)'."""
+        if self.status == RUNNING:
+            pages = f", {len(self.pages)} pages" if self.pages else ""
+            return f"{self.name}: running{pages} ({time.time() - self.started:.0f}s)"
+        if self.status == DONE:
+            detected = f", {self.script_choice.describe()}" if self.script_choice is not None else ""
+            return f"{self.name}: done ({self.finished - self.started:.1f}s{detected})"
+        if self.status == FAILED:
+            return f"{self.name}: failed ({self.error})"
+        return f"{self.name}: {self.status}"
+
+
+# Set in each worker process: where finished pages are sent back to the scheduler,
+# and one flag per worker slot that is raised to stop the job running in that slot.
+_progress_queue = None
+_cancel_flags = None
+
+
+def _init_job_worker(progress_queue, cancel_flags):
+    global _progress_queue, _cancel_flags
+    _progress_queue = progress_queue
+    _cancel_flags = cancel_flags
+
+
+def _warm_worker(lang_code: str, profile: str = None):
+    """Loads an OCR engine in a worker process ahead of its first job."""
+    from src.ocr.engine import OCR_ENGINES
+    OCR_ENGINES.get(lang_code, profile)
+
+
+def _run_job(spec: dict) -> int:
+    """
+    Runs OCR and layout parsing for one file, or one part of its pages. Executes in a worker process.
+
+    Each page is parsed and sent back as a (job id, part, page, text) message as
+    soon as it is ready, followed by a final (job id, part, None, script choice)
+    message once the part is complete. The script choice is None unless the
+    language was detected automatically; the parts of a split job all get the
+    choice made for the whole file. The job's cancel flag is checked between
+    pages; a cancelled job stops without sending its final message.
+
+    Returns:
+        int: The number of pages processed.
+    """
+    from src.file_processor import iter_pages
+    from src.layout_parser.parser import parse_layout
+    from src.ocr.script_detect import choose_language
+
+    choice = spec.get("script_choice")
+    if choice is None and spec["lang_code"] == AUTO_LANGUAGE:
+        choice = choose_language(spec["file_path"], spec["profile"], spec["page_range"])
+    count = 0
+    for page in iter_pages(spec["file_path"], lang_code=spec["lang_code"], page_range=spec["page_range"], workers=1,
+                           profile=spec["profile"], script_choice=choice):
+        if _cancel_flags[spec["slot"]]:
+            return count
+        _progress_queue.put((spec["job_id"], spec["part"], page, parse_layout(page, mode=spec["parser_mode"])))
+        count += 1
+    _progress_queue.put((spec["job_id"], spec["part"], None, choice))
+    return count
+
+
+def _detect_language(spec: dict):
+    """Picks the OCR engine(s) for a whole file before its job is split into parts. Executes in a worker process."""
+    from src.ocr.script_detect import choose_language
+    return choose_language(spec["file_path"], spec["profile"], spec["page_range"])
+
+
+def _split_pages(file_path: str, page_range: tuple, parts: int) -> list:
+    """
+    Splits a PDF's pages into up to `parts` contiguous (first, last) ranges of at least MIN_PAGES_PER_PART pages.
+
+    Returns [page_range] for other files, short documents, or files that cannot be
+    opened (the job then reports the error itself).
+    """
+    if parts <= 1 or not file_path.lower().endswith(".pdf"):
+        return [page_range]
+    try:
+        import fitz  # PyMuPDF
+        with fitz.open(file_path) as doc:
+            page_count = len(doc)
+    except Exception:
+        return [page_range]
+    first, last = page_range or (None, None)
+    first = max(int(first or 1), 1)
+    last = min(int(last or page_count), page_count)
+    parts = min(parts, (last - first + 1) // MIN_PAGES_PER_PART)
+    if parts <= 1:
+        return [page_range]
+    size, extra = divmod(last - first + 1, parts)
+    ranges = []
+    for part in range(parts):
+        end = first + size + (part < extra) - 1
+        ranges.append((first, end))
+        first = end + 1
+    return ranges
+
+
+class JobScheduler:
+    """
+    Runs OCR jobs in a bounded pool of worker processes.
+
+    Jobs wait in the scheduler's own queue and are handed to the pool only when a
+    worker is free, so a job's status is accurate and queued jobs can be cancelled
+    outright. A running job is marked cancelled at once and its worker stops after
+    the page it is on, freeing the worker for the next job.
+
+    A PDF job that starts with no other job waiting is split into page ranges
+    across the idle workers, so a single document still uses every core. Its
+    pages are delivered in page order all the same. When its language is
+    detected automatically, one worker decides it for the whole file first, so
+    every part uses the same engine.
+
+    A worker that dies (e.g. out of memory on a huge page) breaks the whole pool.
+    The jobs running in it fail, and the next job starts a fresh pool.
+
+    Pages stream back from the workers as they finish (see `Job.pages`), so a
+    document can be shown page by page while the rest is still being processed.
+
+    `on_update(job)` is called after every status change and every new page,
+    from whichever thread made the change. GUIs must hand it over to their UI
+    thread (a queue polled with `after` in Tk, a signal in Qt).
+    """
+
+    def __init__(self, on_update=None, max_workers: int = None):
+        self.max_workers = max_workers or default_job_workers()
+        self._on_update = on_update
+        self._executor = None
+        self._progress_queue = None
+        self._listener = None
+        self._jobs = OrderedDict()  # id -> Job, in submission order
+        self._pending = deque()  # Jobs waiting for a free worker
+        self._running = 0  # Busy workers: running job parts and engine warm-ups
+        self._free_slots = []
+        self._cancel_flags = None
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def submit(self, file_path: str, lang_code: str, parser_mode: str = "general", page_range: tuple = None,
+               profile: str = None) -> Job:
+        """
+        Queues a file for OCR.
+
+        Args:
+            file_path (str): Path to an image or PDF file.
+            lang_code (str): OCR language code, or "auto" to detect it.
+            parser_mode (str): Layout parser mode for the result text.
+            page_range (tuple): Optional (first, last) 1-based page numbers for PDFs.
+            profile (str): OCR profile name ('fast', 'balanced', 'accurate'); None uses the default.
+
+        Returns:
+            Job: The queued job; it is updated in place as it progresses.
+        """
+        with self._lock:
+            job = Job(self._next_id, file_path, lang_code, parser_mode, page_range, profile)
+            self._next_id += 1
+            self._jobs[job.id] = job
+            self._pending.append(job)
+        self._notify(job)
+        self._dispatch()
+        return job
+
+    def warm(self, lang_code: str, profile: str = None) -> list:
+        """
+        Starts the worker processes and loads an OCR engine in each, so the first job does not wait for it.
+
+        Warm-ups occupy workers like jobs do, so jobs submitted meanwhile stay queued
+        until a warm-up finishes.
+
+        Returns:
+            list: Futures that finish once the engines are loaded (their exception if loading failed).
+        """
+        failed = []
+        with self._lock:
+            if self._executor is None:
+                self._start_executor()
+            try:
+                futures = [self._executor.submit(_warm_worker, lang_code, profile) for _ in range(self.max_workers)]
+            except BrokenProcessPool as e:
+                failed = self._discard_executor(e)
+                self._start_executor()
+                futures = [self._executor.submit(_warm_worker, lang_code, profile) for _ in range(self.max_workers)]
+            executor = self._executor
+            self._running += len(futures)
+        for job in failed:
+            self._notify(job)
+        for future in futures:
+            future.add_done_callback(lambda f: self._warmed(executor, f))
+        return futures
+
+    def _warmed(self, executor, future):
+        with self._lock:
+            if executor is self._executor:
+                self._running -= 1
+        self._dispatch()
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancels a queued or running job.
+
+        Returns:
+            bool: False if the job does not exist or has already finished.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.is_finished:
+                return False
+            if job in self._pending:
+                self._pending.remove(job)
+            for slot in job.slots:
+                self._cancel_flags[slot] = 1
+            job.status = CANCELLED
+            job.finished = time.time()
+        self._notify(job)
+        return True
+
+    def get(self, job_id: int) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list:
+        """Returns every job, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def forget_finished(self):
+        """Drops finished jobs (and the results they hold) from the list."""
+        with self._lock:
+            for job_id in [job.id for job in self._jobs.values() if job.is_finished]:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        """Cancels queued jobs and stops the worker processes."""
+        with self._lock:
+            self._pending.clear()
+            executor, self._executor = self._executor, None
+            progress_queue, self._progress_queue = self._progress_queue, None
+            if self._cancel_flags is not None:
+                for slot in range(len(self._cancel_flags)):
+                    self._cancel_flags[slot] = 1 # Running jobs stop after their current page
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            progress_queue.put(None) # Stops the listener thread
+
+    def _dispatch(self):
+        """Hands queued jobs to the pool while workers are free."""
+        started = []
+        failed = []
+        with self._lock:
+            while self._pending and self._running < self.max_workers:
+                job = self._pending.popleft()
+                if self._executor is None:
+                    self._start_executor()
+                # Only a job nobody else is waiting for may take several workers
+                idle = self.max_workers - self._running
+                page_ranges = _split_pages(job.file_path, job.page_range, idle if not self._pending else 1)
+                job.status = RUNNING
+                job.started = job.started or time.time()
+                job.slots = []
+                task = _run_job
+                if len(page_ranges) > 1 and job.lang_code == AUTO_LANGUAGE and job.script_choice is None:
+                    # Parts must not each sample their own pages and pick different engines.
+                    # The job is queued again, first in line, once the language is known.
+                    task, page_ranges = _detect_language, [job.page_range]
+                job.parts = len(page_ranges)
+                executor = self._executor
+                try:
+                    for part, page_range in enumerate(page_ranges):
+                        slot = self._free_slots.pop()
+                        self._cancel_flags[slot] = 0
+                        job.slots.append(slot)
+                        self._running += 1
+                        spec = {"job_id": job.id, "part": part, "slot": slot, "file_path": job.file_path,
+                                "lang_code": job.lang_code, "parser_mode": job.parser_mode,
+                                "page_range": page_range, "profile": job.profile,
+                                "script_choice": job.script_choice}
+                        started.append((job, slot, executor, task is _detect_language, executor.submit(task, spec)))
+                except BrokenProcessPool as e:
+                    failed.extend(self._discard_executor(e)) # This job included; the next one gets a new pool
+        notified = set()
+        for job in failed:
+            notified.add(job.id)
+            self._notify(job)
+        for job, slot, executor, detection, future in started:
+            if job.id not in notified:
+                notified.add(job.id)
+                self._notify(job)
+            future.add_done_callback(lambda f, job=job, slot=slot, executor=executor, detection=detection:
+                                     self._finish(job, slot, executor, f, detection))
+
+    def _start_executor(self):
+        """Starts the worker processes and the thread that collects their pages. Caller holds the lock."""
+        # 'spawn' keeps workers from inheriting GUI state through fork.
+        context = multiprocessing.get_context("spawn")
+        self._progress_queue = context.Queue()
+        # One slot per worker; a running job part owns one and is stopped by raising its flag
+        self._cancel_flags = context.RawArray("b", self.max_workers)
+        self._free_slots = list(range(self.max_workers))
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                             initializer=_init_job_worker,
+                                             initargs=(self._progress_queue, self._cancel_flags))
+        self._listener = threading.Thread(target=self._listen, args=(self._progress_queue,),
+                                          name="ocr-job-pages", daemon=True)
+        self._listener.start()
+
+    def _listen(self, progress_queue):
+        """
+        Adds pages to their jobs as workers send them, and completes a job after its last page.
+
+        Pages of a later part are held back until the parts before it have finished,
+        so `Job.pages` is always in page order.
+        """
+        while True:
+            message = progress_queue.get()
+            if message is None:
+                return
+            job_id, part, page, payload = message
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.status != RUNNING:
+                    continue # Cancelled or forgotten; drop its pages
+                if page is not None:
+                    if part != job._next_part:
+                        job._held_pages.setdefault(part, []).append((page, payload))
+                        continue # Shown once the parts before it have finished
+                    job.pages.append(page)
+                    job.page_texts.append(payload)
+                else:
+                    job.script_choice = payload
+                    job._parts_done.add(part)
+                    while job._next_part in job._parts_done:
+                        job._next_part += 1
+                        for held_page, text in job._held_pages.pop(job._next_part, ()):
+                            job.pages.append(held_page)
+                            job.page_texts.append(text)
+                    if job._next_part == job.parts:
+                        job.document = OcrDocument.from_pages(job.pages)
+                        job.text = "\n\n".join(text for text in job.page_texts if text)
+                        job.status = DONE
+                        job.finished = time.time()
+            self._notify(job)
+
+    def _discard_executor(self, error) -> list:
+        """
+        Drops a pool that a dead worker has broken. Caller holds the lock.
+
+        Jobs with parts still running in it fail; the next dispatch starts a new
+        pool with fresh slots, so tasks of the old one no longer count against it.
+
+        Returns:
+            list: The failed jobs, to be notified once the lock is released.
+        """
+        executor, self._executor = self._executor, None
+        progress_queue, self._progress_queue = self._progress_queue, None
+        self._running = 0
+        failed = []
+        for job in self._jobs.values():
+            if job.status == RUNNING and job.slots:
+                job.status = FAILED
+                job.error = f"{type(error).__name__}: {error}"
+                job.finished = time.time()
+                job.slots = []
+                failed.append(job)
+        executor.shutdown(wait=False)
+        progress_queue.put(None) # Stops the old listener thread
+        print(f"OCR job worker pool broke ({error}); starting a new one.")
+        return failed
+
+    def _finish(self, job: Job, slot: int, executor, future, detection: bool = False):
+        """Frees a finished task's worker; fails its job if it raised, or queues it again after language detection."""
+        failed = []
+        with self._lock:
+            current = executor is self._executor # False once a broken pool has been replaced
+            if current:
+                self._running -= 1
+            if slot in job.slots:
+                job.slots.remove(slot)
+                if current:
+                    self._free_slots.append(slot)
+            error = None if future.cancelled() else future.exception()
+            if current and isinstance(error, BrokenProcessPool):
+                failed = self._discard_executor(error)
+            # Successful jobs are completed by the listener once their last page arrives.
+            # A job cancelled while running has already been reported.
+            if job.status == RUNNING and (future.cancelled() or error is not None):
+                job.finished = time.time()
+                for other in job.slots:
+                    self._cancel_flags[other] = 1 # Stop the job's other parts
+                if future.cancelled():
+                    job.status = CANCELLED
+                else:
+                    job.status = FAILED
+                    job.error = f"{type(error).__name__}: {error}"
+                failed.append(job)
+            elif detection and job.status == RUNNING:
+                job.script_choice = future.result()
+                self._pending.appendleft(job)
+        for failed_job in failed:
+            self._notify(failed_job)
+        self._dispatch()
+
+    def _notify(self, job: Job):
+        if self._on_update is not None:
+            try:
+                self._on_update(job)
+            except Exception as e:
+                print(f"Error in job update callback: {e}")
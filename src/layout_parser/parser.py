@@ -1,5 +1,34 @@
 # File: src/layout_parser/parser.py
 
+from itertools import chain
+
+import numpy as np
+
+from src.ocr.results import OcrDocument, OcrPage
+from src.utils import metrics
+
+# Layout thresholds, in units of the median box height on the page.
+LINE_TOLERANCE = 0.5        # Max distance between box centres on the same line
+PARAGRAPH_SPACING = 1.5     # Top-to-top distance between lines that starts a new paragraph
+MIN_GUTTER_WIDTH = 1.0      # Narrowest blank vertical strip treated as a column gutter
+ROW_ALIGN_TOLERANCE = 0.15  # Boxes this close vertically across a gutter sit on the same row
+# When nearly every box of a column of short fields lines up with a box across a gutter,
+# the gutter separates table cells, form fields or right-aligned dates in a resume,
+# and those rows are read straight across. Columns of prose lines stay columns.
+ROW_ALIGNED_SHARE = 0.9
+MIN_ALIGNED_COLUMN_BOXES = 3
+MAX_FIELD_CHARS = 20
+
+
+def _box_arrays(ocr_results):
+    """Returns (quads as an (n, 4, 2) float array, list of texts)."""
+    if isinstance(ocr_results, OcrPage):
+        return ocr_results.quads.astype(np.float64), ocr_results.texts()
+    corners = chain.from_iterable(chain.from_iterable(item[0] for item in ocr_results))
+    quads = np.fromiter(corners, dtype=np.float64, count=len(ocr_results) * 8).reshape(-1, 4, 2)
+    texts = [item[1][0] for item in ocr_results]
+    return quads, texts
+
 def _parse_as_general_text(ocr_results: list) -> str:
     """
     Parses OCR results by sorting text top-to-bottom, then left-to-right.
@@ -7,72 +36,230 @@ def _parse_as_general_text(ocr_results: list) -> str:
     """
     if not ocr_results:
         return ""
-    sorted_results = sorted(ocr_results, key=lambda item: (item[0][0][1], item[0][0][0]))
-    extracted_texts = [item[1][0] for item in sorted_results]
-    return "\n".join(extracted_texts)
+    quads, texts = _box_arrays(ocr_results)
+    order = np.lexsort((quads[:, 0, 0], quads[:, 0, 1]))
+    return "\n".join([texts[i] for i in order])
+
+def _free_intervals(group, x0, x1, by_x, left, right, min_gutter):
+    """
+    Finds the blank horizontal strips at least `min_gutter` wide in every group of boxes at once.
+
+    Sorts the boxes by (group, x0) and takes a running maximum of x1 that restarts
+    in every group; a strip is wherever the next box starts past it. `by_x` orders
+    the boxes by x0, so only a stable sort by the integer group is left to do.
+
+    Returns:
+        tuple: (group, start, end) arrays, one entry per strip, sorted by group and start.
+               Strips touching the page edges (`left`, `right`) are included.
+    """
+    keys = group[by_x]
+    if keys.max() <= np.iinfo(np.uint16).max:
+        keys = keys.astype(np.uint16) # Stable sorts of 16-bit keys are radix sorts, several times faster
+    by_x = by_x[np.argsort(keys, kind="stable")]
+    groups = group[by_x]
+    shift = groups * ((right - left) + 1.0)
+    covered = np.maximum.accumulate((x1[by_x] - left) + shift) - shift + left
+    starts = x0[by_x]
+    first = np.r_[True, groups[1:] != groups[:-1]]
+    last = np.r_[first[1:], True]
+    # Each box may have a strip before it (from the previous box's reach, or the left edge)
+    # and the last box of a group one after it; laid out side by side they stay in order.
+    before = np.r_[left, covered[:-1]]
+    before[first] = left
+    strip_start = np.column_stack((before, covered))
+    strip_end = np.column_stack((starts, np.full(len(starts), right)))
+    keep = (strip_end - strip_start >= min_gutter) & np.column_stack((np.ones(len(starts), dtype=bool), last))
+    return np.column_stack((groups, groups))[keep], strip_start[keep], strip_end[keep]
+
+def _gutter_counts(strips, left, right, group_count):
+    """Number of column gutters (strips from `_free_intervals` clear of the page edges) in each group."""
+    strip_group, strip_start, strip_end = strips
+    interior = (strip_start > left) & (strip_end < right)
+    return np.bincount(strip_group[interior], minlength=group_count)[:group_count]
+
+def _find_bands(x0, x1, y0, y1, left, right, min_gutter):
+    """
+    Splits the page into horizontal bands and works out where each band's columns are.
+
+    Boxes are first cut into bands wherever there is a vertical gap between them.
+    Consecutive bands are then merged as long as merging keeps every column gutter,
+    so a column that runs down the page stays in one band, while a full-width
+    heading (which bridges the gutter) starts a new one.
+
+    Whether two neighbouring bands can merge is decided for all of them at once,
+    and so is each run of mergeable bands' own projection. Only the runs (and the
+    bands of runs whose gutters drift, e.g. on a skewed scan) go through the
+    merge loop, so it runs a handful of times per page rather than once per line.
+
+    Returns:
+        tuple: (band id per box, in top-to-bottom order; list of gutter (start, end)
+               intervals per band)
+    """
+    n = len(x0)
+    by_top = np.argsort(y0, kind="stable")
+    reach = np.maximum.accumulate(y1[by_top])
+    starts_band = np.ones(n, dtype=bool)
+    starts_band[1:] = y0[by_top][1:] > reach[:-1]
+    raw_band = np.empty(n, dtype=np.int64)
+    raw_band[by_top] = np.cumsum(starts_band) - 1
+    band_count = int(raw_band.max()) + 1
+
+    # Neighbouring bands merge when together they keep as many gutters as either has alone.
+    # Every box is counted in the pair with the band above it and in the pair with the band below.
+    by_x = np.argsort(x0, kind="stable")
+    counts = _gutter_counts(_free_intervals(raw_band, x0, x1, by_x, left, right, min_gutter),
+                            left, right, band_count)
+    pair_strips = _free_intervals(np.r_[raw_band, raw_band + 1], np.r_[x0, x0], np.r_[x1, x1],
+                                  np.column_stack((by_x, by_x + n)).ravel(), left, right, min_gutter)
+    pair_counts = _gutter_counts(pair_strips, left, right, band_count + 1)[1:band_count]
+    starts_run = np.r_[True, pair_counts < np.maximum(counts[:-1], counts[1:])]
+    run = np.cumsum(starts_run) - 1
+    # A run whose gutters drift from line to line loses them as a whole; its bands are merged one by one.
+    strips = _free_intervals(run[raw_band], x0, x1, by_x, left, right, min_gutter)
+    drifting = _gutter_counts(strips, left, right, int(run[-1]) + 1) < np.maximum.reduceat(
+        counts, np.flatnonzero(starts_run))
+    unit = np.cumsum(starts_run | drifting[run]) - 1
+    unit_count = int(unit[-1]) + 1
+    if drifting.any():
+        strips = _free_intervals(unit[raw_band], x0, x1, by_x, left, right, min_gutter)
+    strip_group, strip_start, strip_end = strips
+    bounds = np.searchsorted(strip_group, np.arange(unit_count + 1)).tolist()
+    strips = list(zip(strip_start.tolist(), strip_end.tolist()))
+    free = [strips[bounds[u]:bounds[u + 1]] for u in range(unit_count)]
+
+    def interior(intervals):
+        return [(a, b) for a, b in intervals if a > left and b < right]
+
+    def intersect(first_intervals, second_intervals):
+        result = []
+        for a0, a1 in first_intervals:
+            for b0, b1 in second_intervals:
+                start, end = max(a0, b0), min(a1, b1)
+                if end - start >= min_gutter:
+                    result.append((start, end))
+        return result
+
+    merged_id = np.empty(unit_count, dtype=np.int64)
+    gutters = []
+    current = free[0]
+    merged_id[0] = 0
+    for u in range(1, unit_count):
+        combined = intersect(current, free[u])
+        if len(interior(combined)) >= max(len(interior(current)), len(interior(free[u]))):
+            current = combined
+        else:
+            gutters.append(interior(current))
+            current = free[u]
+        merged_id[u] = len(gutters)
+    gutters.append(interior(current))
+    return merged_id[unit[raw_band]], gutters
+
+def _rows_aligned(yc, column, text_lengths, tolerance):
+    """True when a column of short fields sits on rows shared with another column (a table or form)."""
+    order = np.argsort(yc, kind="stable")
+    yc_sorted, column_sorted, lengths_sorted = yc[order], column[order], text_lengths[order]
+    low = np.searchsorted(yc_sorted, yc_sorted - tolerance, side="left")
+    high = np.searchsorted(yc_sorted, yc_sorted + tolerance, side="right")
+    for c in np.unique(column_sorted):
+        in_column = column_sorted == c
+        if in_column.sum() < MIN_ALIGNED_COLUMN_BOXES or np.median(lengths_sorted[in_column]) > MAX_FIELD_CHARS:
+            continue
+        prefix = np.r_[0, np.cumsum(in_column)]
+        others_nearby = (high - low) - (prefix[high] - prefix[low])
+        if (others_nearby[in_column] > 0).mean() >= ROW_ALIGNED_SHARE:
+            return True
+    return False
 
 def _parse_as_document(ocr_results: list) -> str:
     """
     Parses OCR results by grouping text into lines and respecting columns.
     This is best for structured documents like resumes.
+
+    The page is split into bands; within each band, columns are found from the
+    horizontal projection of the boxes and read left to right, each column top
+    to bottom. All steps work on NumPy arrays of box coordinates.
     """
     if not ocr_results:
         return ""
-    sorted_boxes = sorted(ocr_results, key=lambda item: item[0][0][1])
-    
-    try:
-        avg_height = sum([box[0][2][1] - box[0][0][1] for box in sorted_boxes]) / len(sorted_boxes)
-        y_threshold = avg_height * 0.5
-        vertical_spacing_threshold = avg_height * 1.5
-    except ZeroDivisionError:
-        return ""
+    quads, texts = _box_arrays(ocr_results)
+    x0, x1 = quads[:, :, 0].min(axis=1), quads[:, :, 0].max(axis=1)
+    y0, y1 = quads[:, :, 1].min(axis=1), quads[:, :, 1].max(axis=1)
+    xc, yc = (x0 + x1) / 2, (y0 + y1) / 2
 
-    lines = []
-    current_line = []
-    for box in sorted_boxes:
-        if not current_line:
-            current_line.append(box)
-        else:
-            previous_box_y = current_line[-1][0][0][1]
-            current_box_y = box[0][0][1]
-            if abs(current_box_y - previous_box_y) < y_threshold:
-                current_line.append(box)
-            else:
-                lines.append(current_line)
-                current_line = [box]
-    if current_line:
-        lines.append(current_line)
-        
-    for i in range(len(lines)):
-        lines[i] = sorted(lines[i], key=lambda item: item[0][0][0])
-        
-    final_text = ""
-    if not lines:
-        return ""
-    final_text += " ".join([item[1][0] for item in lines[0]])
-    for i in range(1, len(lines)):
-        current_line_y = lines[i][0][0][0][1]
-        previous_line_y = lines[i-1][0][0][0][1]
-        vertical_gap = current_line_y - previous_line_y
-        if vertical_gap > vertical_spacing_threshold:
-            final_text += "\n\n"
-        else:
-            final_text += "\n"
-        final_text += " ".join([item[1][0] for item in lines[i]])
-    return final_text
+    box_height = float(np.median(y1 - y0))
+    if box_height <= 0:
+        box_height = max(float((y1 - y0).max()), 1.0)
+    left, right = float(x0.min()), float(x1.max())
+
+    band, gutters = _find_bands(x0, x1, y0, y1, left, right, MIN_GUTTER_WIDTH * box_height)
+    text_lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+
+    # Column index of every box within its band
+    column = np.zeros(len(texts), dtype=np.int64)
+    for b, band_gutters in enumerate(gutters):
+        if not band_gutters:
+            continue
+        in_band = np.flatnonzero(band == b)
+        midpoints = np.array([(start + end) / 2 for start, end in band_gutters])
+        band_column = np.searchsorted(midpoints, xc[in_band])
+        if not _rows_aligned(yc[in_band], band_column, text_lengths[in_band], ROW_ALIGN_TOLERANCE * box_height):
+            column[in_band] = band_column
+    group = band * (int(column.max()) + 1) + column
+
+    # Lines: within each (band, column) group, boxes whose centres are close vertically
+    order = np.lexsort((yc, group))
+    group_sorted, yc_sorted = group[order], yc[order]
+    new_group = np.r_[True, group_sorted[1:] != group_sorted[:-1]]
+    new_line = new_group | np.r_[True, np.diff(yc_sorted) > LINE_TOLERANCE * box_height]
+    line = np.empty(len(texts), dtype=np.int64)
+    line[order] = np.cumsum(new_line) - 1
+
+    # Reading order: line by line, left to right within a line
+    reading = np.lexsort((x0, line))
+    line_sorted = line[reading]
+    line_starts = np.flatnonzero(np.r_[True, line_sorted[1:] != line_sorted[:-1]])
+    line_tops = np.minimum.reduceat(y0[reading], line_starts)
+    starts_group = new_group[new_line]
+    paragraph_break = starts_group | np.r_[True, np.diff(line_tops) > PARAGRAPH_SPACING * box_height]
+
+    # Boxes are joined by a space within a line, a newline between lines and a blank line between paragraphs
+    separators = np.full(len(texts), " ", dtype=object)
+    separators[line_starts] = np.where(paragraph_break, "\n\n", "\n")
+    parts = [None] * (2 * len(texts))
+    parts[::2] = separators.tolist()
+    parts[1::2] = [texts[i] for i in reading.tolist()]
+    return "".join(parts[1:])
 
 def parse_layout(ocr_results: list, mode: str = "general") -> str:
     """
     Master layout parser function. Invokes a specific parser based on the selected mode.
 
+    Multi-page results are formatted page by page, in page order.
+
     Args:
-        ocr_results (list): The raw list of results from the OCR engine.
+        ocr_results (OcrDocument | list): The results from the OCR engine, as an
+            OcrDocument/OcrPage or the raw nested list.
         mode (str): The parsing mode ('general' or 'document').
 
     Returns:
         str: A formatted string with the parsed text.
     """
-    if mode == "document":
-        return _parse_as_document(ocr_results)
-    else: # Default to general
-        return _parse_as_general_text(ocr_results)
\ No newline at end of file
+    parse_page = _parse_as_document if mode == "document" else _parse_as_general_text # Default to general
+    with metrics.span("layout.parse", mode=mode, boxes=len(ocr_results)):
+        pages = _split_pages(ocr_results)
+        return "\n\n".join(text for text in (parse_page(page) for page in pages) if text)
+
+def _split_pages(ocr_results) -> list:
+    """
+    Groups results by the page number carried as an optional third element.
+    Results without a page number (single images) form one page.
+    """
+    if isinstance(ocr_results, OcrDocument):
+        return list(ocr_results.iter_pages())
+    if isinstance(ocr_results, OcrPage):
+        return [ocr_results]
+    pages = {}
+    for item in ocr_results:
+        page_number = item[2] if len(item) > 2 else 1
+        pages.setdefault(page_number, []).append(item)
+    return [pages[number] for number in sorted(pages)]
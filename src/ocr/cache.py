@@ -0,0 +1,183 @@
+# File: src/ocr/cache.py
+
+import hashlib
+import os
+import sqlite3
+import time
+
+from src.database.connections import StatCounters, ThreadConnections
+from src.database.manager import DB_PATH
+from src.ocr.results import OcrDocument
+
+# The cache lives next to the history database.
+CACHE_DB_PATH = os.path.join(os.path.dirname(DB_PATH), "ocr_cache.db")
+MAX_CACHE_MB = int(os.environ.get("OCR_CACHE_MAX_MB", "512"))
+
+# Page indices per lookup query, well under SQLite's limit on bound parameters.
+MAX_QUERY_PAGES = 500
+
+
+def file_hash(file_path: str) -> str:
+    """Returns the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _create_tables(conn: sqlite3.Connection):
+    """Creates the cache tables; runs for every new connection."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ocr_cache (
+        file_hash TEXT NOT NULL,
+        page_index INTEGER NOT NULL,
+        language TEXT NOT NULL,
+        dpi INTEGER NOT NULL,
+        engine_version TEXT NOT NULL,
+        payload BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        last_access REAL NOT NULL,
+        PRIMARY KEY (file_hash, page_index, language, dpi, engine_version)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_access ON ocr_cache (last_access)")
+    # Detected script/language per document (see src.ocr.script_detect); a row is a few dozen bytes.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS script_choices (
+        file_hash TEXT NOT NULL,
+        engine_version TEXT NOT NULL,
+        choice TEXT NOT NULL,
+        PRIMARY KEY (file_hash, engine_version)
+    )
+    """)
+
+
+# As for the history database, each thread keeps one connection with WAL journaling,
+# so lookups in worker processes do not wait for the cache writer thread.
+_connections = ThreadConnections(_create_tables)
+_stats = StatCounters("ocr_cache", ("hits", "misses", "evictions"))
+
+
+def _connect() -> sqlite3.Connection:
+    """Returns this thread's long-lived connection to the cache, creating the tables on first use."""
+    return _connections.get(CACHE_DB_PATH)
+
+
+def close_connection():
+    """Closes this thread's connection, if it has one."""
+    _connections.close()
+
+
+def get_pages(digest: str, page_indices, language: str, dpi: int, engine_version: str) -> dict:
+    """
+    Looks up cached results for several pages of one file in a single query.
+
+    Args:
+        digest (str): Content hash of the file (see `file_hash`).
+        page_indices (iterable): 0-based page indices to look up.
+        language (str): OCR language code.
+        dpi (int): Render DPI setting (0 for automatic).
+        engine_version (str): Version string of the OCR engine.
+
+    Returns:
+        dict: page index -> OcrDocument holding that page's boxes, for the pages that were cached.
+    """
+    wanted = sorted(set(page_indices))
+    if not wanted:
+        return {}
+    found = {}
+    conn = _connect()
+    with conn:
+        # Only the requested pages' payloads are read, however many pages of the file are cached
+        for start in range(0, len(wanted), MAX_QUERY_PAGES):
+            chunk = wanted[start:start + MAX_QUERY_PAGES]
+            rows = conn.execute(
+                "SELECT page_index, payload FROM ocr_cache "
+                "WHERE file_hash = ? AND language = ? AND dpi = ? AND engine_version = ? "
+                f"AND page_index IN ({','.join('?' * len(chunk))})",
+                (digest, language, dpi, engine_version, *chunk),
+            ).fetchall()
+            found.update((page_index, OcrDocument.from_bytes(payload)) for page_index, payload in rows)
+        if found:
+            conn.executemany(
+                "UPDATE ocr_cache SET last_access = ? "
+                "WHERE file_hash = ? AND page_index = ? AND language = ? AND dpi = ? AND engine_version = ?",
+                [(time.time(), digest, page_index, language, dpi, engine_version) for page_index in found],
+            )
+
+    _stats.count("hits", len(found))
+    _stats.count("misses", len(wanted) - len(found))
+    return found
+
+
+def put_pages(digest: str, pages: dict, language: str, dpi: int, engine_version: str):
+    """
+    Stores results for several pages and evicts least recently used entries over the size cap.
+
+    Args:
+        pages (dict): page index -> OcrPage or OcrDocument with that page's boxes.
+        Other arguments are as for `get_pages`.
+    """
+    if not pages:
+        return
+    now = time.time()
+    rows = []
+    for page_index, results in pages.items():
+        payload = results.to_bytes()
+        rows.append((digest, page_index, language, dpi, engine_version, payload, len(payload), now))
+
+    conn = _connect()
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO ocr_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        _evict_over_budget(conn)
+
+
+def get_script_choice(digest: str, engine_version: str):
+    """Returns the stored script decision for a file (a JSON string), or None."""
+    row = _connect().execute("SELECT choice FROM script_choices WHERE file_hash = ? AND engine_version = ?",
+                             (digest, engine_version)).fetchone()
+    return row[0] if row else None
+
+
+def put_script_choice(digest: str, engine_version: str, choice: str):
+    """Stores the script decision for a file (see `get_script_choice`)."""
+    conn = _connect()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO script_choices VALUES (?, ?, ?)", (digest, engine_version, choice))
+
+
+def _evict_over_budget(conn: sqlite3.Connection):
+    """Deletes the least recently used entries until the cache fits in MAX_CACHE_MB."""
+    if not MAX_CACHE_MB:
+        return
+    budget = MAX_CACHE_MB * 1024 * 1024
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+    if total <= budget:
+        return
+    victims = []
+    for rowid, size in conn.execute("SELECT rowid, size FROM ocr_cache ORDER BY last_access"):
+        if total <= budget:
+            break
+        victims.append((rowid,))
+        total -= size
+    conn.executemany("DELETE FROM ocr_cache WHERE rowid = ?", victims)
+    _stats.count("evictions", len(victims))
+
+
+def clear():
+    """Removes every cached entry."""
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM ocr_cache")
+        conn.execute("DELETE FROM script_choices")
+
+
+def stats() -> dict:
+    """
+    Reports cache effectiveness for this process.
+
+    Returns:
+        dict: 'hits', 'misses' and 'evictions' counters.
+    """
+    return _stats.snapshot()
@@ -1,35 +1,461 @@
 # File: src/ocr/engine.py
 
-from paddleocr import PaddleOCR
+from collections import OrderedDict
+from importlib import metadata
+import copy
+import importlib
+import io
 import os
+import threading
+import time
 
-# Initialize multiple OCR engines for different languages
-OCR_ENGINES = {
-    'en': PaddleOCR(use_angle_cls=True, lang='en'),
-    'ch': PaddleOCR(use_angle_cls=True, lang='ch'),
-    'korean': PaddleOCR(use_angle_cls=True, lang='korean'),
-    'japan': PaddleOCR(use_angle_cls=True, lang='japan'),
-    'latin': PaddleOCR(use_angle_cls=True, lang='latin'),
-    'cyrillic': PaddleOCR(use_angle_cls=True, lang='cyrillic'),
+import numpy as np
+from PIL import Image
+
+from src.ocr.results import OcrPage
+from src.utils import metrics
+
+SUPPORTED_LANGUAGES = ('en', 'ch', 'korean', 'japan', 'latin', 'cyrillic')
+DEFAULT_LANGUAGE = 'latin'
+
+# Identifies the models that produced a result, e.g. for keying cached OCR output.
+try:
+    ENGINE_VERSION = f"paddleocr-{metadata.version('paddleocr')}"
+except metadata.PackageNotFoundError:
+    ENGINE_VERSION = "paddleocr-unknown"
+# Optional "module:function" that builds engines instead of PaddleOCR, called as
+# function(language, profile). Worker processes inherit it from the environment, so a
+# stand-in engine (e.g. the benchmarks' stub) is used across the whole OCR pool.
+ENGINE_FACTORY = os.environ.get("OCR_ENGINE_FACTORY", "")
+if ENGINE_FACTORY:
+    # Keep results of a stand-in engine apart from real ones in the OCR cache.
+    ENGINE_VERSION = f"custom-{ENGINE_FACTORY}"
+
+# Budget for engines kept in memory at once. A value of 0 disables that limit.
+# Both can be overridden from the environment without touching the code.
+MAX_RESIDENT_ENGINES = int(os.environ.get("OCR_MAX_ENGINES", "2"))
+MAX_ENGINE_MEMORY_MB = int(os.environ.get("OCR_MAX_ENGINE_MEMORY_MB", "0"))
+# Text crops the recognizer processes per forward pass. PaddleOCR's default of 6 leaves
+# most of the CPU's vector width idle; `perform_ocr_batch` fills larger batches from many pages.
+REC_BATCH_SIZE = int(os.environ.get("OCR_REC_BATCH_SIZE", "32"))
+# Inference threads per engine (PaddleOCR's default is 10).
+CPU_THREADS = int(os.environ.get("OCR_CPU_THREADS", "0")) or min(os.cpu_count() or 1, 10)
+# Optional directory of quantized (int8) models, laid out as <dir>/<language>/{det,rec,cls}.
+QUANTIZED_MODEL_DIR = os.environ.get("OCR_QUANTIZED_MODEL_DIR", "")
+# With OCR_OFFLINE set, an engine whose models are not on disk is an error instead of a download.
+OFFLINE = os.environ.get("OCR_OFFLINE", "") not in ("", "0")
+
+# Named speed/accuracy trade-offs. Each sets:
+#   det_limit_side_len: the detector shrinks images so their longest side is at most this
+#   use_angle_cls:      whether text is checked for (and turned from) upside down
+#   rec_batch_num:      text crops per recognizer forward pass
+#   cpu_threads:        inference threads per engine
+#   enable_mkldnn:      use oneDNN kernels on x86 CPUs
+#   quantized:          use the int8 models from QUANTIZED_MODEL_DIR, when present
+OCR_PROFILES = {
+    # Clean, upright scans and screenshots.
+    "fast": {"det_limit_side_len": 640, "use_angle_cls": False, "rec_batch_num": 64,
+             "cpu_threads": CPU_THREADS, "enable_mkldnn": True, "quantized": True},
+    # The settings used before profiles existed.
+    "balanced": {"det_limit_side_len": 960, "use_angle_cls": True, "rec_batch_num": REC_BATCH_SIZE,
+                 "cpu_threads": CPU_THREADS, "enable_mkldnn": False, "quantized": False},
+    # Dense or small print, photos, rotated pages.
+    "accurate": {"det_limit_side_len": 1600, "use_angle_cls": True, "rec_batch_num": 8,
+                 "cpu_threads": CPU_THREADS, "enable_mkldnn": False, "quantized": False},
 }
+DEFAULT_PROFILE = os.environ.get("OCR_PROFILE", "balanced")
+if DEFAULT_PROFILE not in OCR_PROFILES:
+    DEFAULT_PROFILE = "balanced"
+
+
+def resolve_profile(profile: str = None) -> str:
+    """Returns a valid profile name; None and unknown names fall back to DEFAULT_PROFILE."""
+    if profile is None:
+        return DEFAULT_PROFILE
+    if profile not in OCR_PROFILES:
+        print(f"Unknown OCR profile '{profile}', using '{DEFAULT_PROFILE}'.")
+        return DEFAULT_PROFILE
+    return profile
+
+
+def engine_version(profile: str = None) -> str:
+    """
+    Identifies the models and settings that produced a result, e.g. for keying cached OCR output.
 
-def perform_ocr(image_path: str, language: str = 'latin') -> list:
+    'balanced' keeps the plain ENGINE_VERSION, so results cached before profiles existed stay valid.
+    """
+    profile = resolve_profile(profile)
+    return ENGINE_VERSION if profile == "balanced" else f"{ENGINE_VERSION}+{profile}"
+
+
+def _quantized_model_dirs(language: str) -> dict:
+    """Returns PaddleOCR model directory arguments for the quantized models of a language, if installed."""
+    if not QUANTIZED_MODEL_DIR:
+        return {}
+    dirs = {}
+    for stage in ("det", "rec", "cls"):
+        path = os.path.join(QUANTIZED_MODEL_DIR, language, stage)
+        if os.path.isdir(path):
+            dirs[f"{stage}_model_dir"] = path
+    if not dirs:
+        print(f"No quantized OCR models for '{language}' in {QUANTIZED_MODEL_DIR}; using the standard models.")
+    return dirs
+
+
+def _missing_model_dirs(language: str, options: dict) -> list:
+    """
+    Returns the model directories PaddleOCR would download before it could build an engine.
+
+    Mirrors where PaddleOCR looks for its det, rec and cls models (it fetches all
+    three, even when the angle classifier is off); directories passed in `options`
+    are checked as they are.
+    """
+    from paddleocr import paddleocr as paddle_module
+
+    version = paddle_module.DEFAULT_OCR_MODEL_VERSION
+    lang, det_lang = paddle_module.parse_lang(language)
+    stages = (("det", det_lang, os.path.join("det", det_lang)),
+              ("rec", lang, os.path.join("rec", lang)),
+              ("cls", "ch", "cls"))
+    missing = []
+    for stage, stage_lang, default_dir in stages:
+        model_dir = options.get(f"{stage}_model_dir")
+        if model_dir is None:
+            url = paddle_module.get_model_config("OCR", version, stage, stage_lang)["url"]
+            model_dir, _ = paddle_module.confirm_model_dir_url(
+                None, os.path.join(paddle_module.BASE_DIR, "whl", default_dir), url)
+        if not all(os.path.exists(os.path.join(model_dir, name))
+                   for name in ("inference.pdmodel", "inference.pdiparams")):
+            missing.append(model_dir)
+    return missing
+
+
+def _build_engine(language: str, profile: str = DEFAULT_PROFILE):
+    """Builds a detector (+ classifier) + recognizer stack for one language with a profile's settings."""
+    # Imported here: loading paddle takes seconds, and only processes that run OCR need it.
+    from paddleocr import PaddleOCR
+
+    settings = OCR_PROFILES[profile]
+    options = {}
+    if settings["quantized"]:
+        options = _quantized_model_dirs(language)
+    if OFFLINE:
+        missing = _missing_model_dirs(language, options)
+        if missing:
+            raise RuntimeError(f"OCR models for '{language}' are not installed and downloads are disabled "
+                               f"(OCR_OFFLINE); missing: {', '.join(missing)}")
+    return PaddleOCR(
+        lang=language,
+        use_angle_cls=settings["use_angle_cls"],
+        det_limit_side_len=settings["det_limit_side_len"],
+        rec_batch_num=settings["rec_batch_num"],
+        cpu_threads=settings["cpu_threads"],
+        enable_mkldnn=settings["enable_mkldnn"],
+        **options,
+    )
+
+
+def _current_rss_mb():
+    """Returns the resident set size of this process in MB, or None if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class EngineRegistry:
+    """
+    Builds OCR engines on first use and keeps the most recently used ones resident.
+
+    Engines are keyed by (language, profile): the same language with two
+    profiles is two engines. They are evicted in least-recently-used order once
+    either the count budget or the (approximate, RSS-based) memory budget is
+    exceeded.
+
+    `factory(language, profile)` builds an engine; tests and benchmarks can pass
+    their own.
+    """
+
+    def __init__(self, factory=_build_engine, max_engines: int = MAX_RESIDENT_ENGINES,
+                 max_memory_mb: int = MAX_ENGINE_MEMORY_MB):
+        self._factory = factory
+        self.max_engines = max_engines
+        self.max_memory_mb = max_memory_mb
+        self._engines = OrderedDict()  # (language, profile) -> engine, least recently used first
+        self._loading = {}  # (language, profile) -> Event set once an in-flight load finishes
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _stats_for(self, key: tuple) -> dict:
+        return self._stats.setdefault(key, {
+            "resident": 0,
+            "loads": 0,
+            "hits": 0,
+            "last_load_seconds": 0.0,
+            "total_load_seconds": 0.0,
+            "memory_mb": 0.0,
+        })
+
+    def _key(self, language: str, profile: str) -> tuple:
+        if language not in SUPPORTED_LANGUAGES:
+            language = DEFAULT_LANGUAGE
+        return language, resolve_profile(profile)
+
+    def get(self, language: str, profile: str = None):
+        """
+        Returns the engine for a language and profile, building it if it is not resident.
+
+        Args:
+            language (str): Language code; unsupported codes fall back to 'latin'.
+            profile (str): OCR profile name (see OCR_PROFILES); defaults to DEFAULT_PROFILE.
+
+        Returns:
+            PaddleOCR: The ready-to-use engine.
+        """
+        key = self._key(language, profile)
+
+        while True:
+            with self._lock:
+                engine = self._engines.get(key)
+                if engine is not None:
+                    self._engines.move_to_end(key)
+                    self._stats_for(key)["hits"] += 1
+                    return engine
+                pending = self._loading.get(key)
+                if pending is None:
+                    pending = threading.Event()
+                    self._loading[key] = pending
+                    break
+            # Another thread is already building this engine; wait and re-check.
+            pending.wait()
+
+        try:
+            rss_before = _current_rss_mb()
+            start = time.perf_counter()
+            engine = self._factory(*key)
+            elapsed = time.perf_counter() - start
+            rss_after = _current_rss_mb()
+        except Exception:
+            with self._lock:
+                del self._loading[key]
+            pending.set()
+            raise
+
+        with self._lock:
+            self._engines[key] = engine
+            stats = self._stats_for(key)
+            stats["resident"] = 1
+            stats["loads"] += 1
+            stats["last_load_seconds"] = elapsed
+            stats["total_load_seconds"] += elapsed
+            if rss_before is not None and rss_after is not None:
+                stats["memory_mb"] = max(rss_after - rss_before, 0.0)
+            self._evict_over_budget(keep=key)
+            resident_count = len(self._engines)
+            del self._loading[key]
+        pending.set()
+
+        print(f"Loaded OCR engine '{key[0]}' ({key[1]}) in {elapsed:.1f}s ({resident_count} resident).")
+        return engine
+
+    def __getitem__(self, language: str):
+        return self.get(language)
+
+    def __contains__(self, key) -> bool:
+        """Accepts a language code (default profile) or a (language, profile) pair."""
+        key = self._key(*key) if isinstance(key, tuple) else self._key(key, None)
+        with self._lock:
+            return key in self._engines
+
+    def _evict_over_budget(self, keep: tuple):
+        """Drops least recently used engines until both budgets are met. Caller holds the lock."""
+        def over_budget():
+            if self.max_engines and len(self._engines) > self.max_engines:
+                return True
+            if self.max_memory_mb:
+                used = sum(self._stats[key]["memory_mb"] for key in self._engines)
+                return used > self.max_memory_mb
+            return False
+
+        while len(self._engines) > 1 and over_budget():
+            oldest = next(iter(self._engines))
+            if oldest == keep:
+                break
+            del self._engines[oldest]
+            self._stats[oldest]["resident"] = 0
+
+    def warm(self, language: str, profile: str = None) -> threading.Thread:
+        """
+        Builds an engine on a background thread so the first OCR call does not wait for it.
+
+        Args:
+            language (str): Language code to load.
+            profile (str): OCR profile name; defaults to DEFAULT_PROFILE.
+
+        Returns:
+            threading.Thread: The started daemon thread.
+        """
+        def _load():
+            try:
+                self.get(language, profile)
+            except Exception as e:
+                print(f"Error warming OCR engine '{language}': {e}")
+
+        thread = threading.Thread(target=_load, name=f"ocr-warm-{language}", daemon=True)
+        thread.start()
+        return thread
+
+    def evict(self, language: str, profile: str = None):
+        """Removes an engine from memory. It is rebuilt on next use."""
+        key = self._key(language, profile)
+        with self._lock:
+            if self._engines.pop(key, None) is not None:
+                self._stats[key]["resident"] = 0
+
+    def stats(self) -> dict:
+        """
+        Reports load time and residency per engine.
+
+        Returns:
+            dict: (language, profile) -> counters ('resident', 'loads', 'hits',
+                  'last_load_seconds', 'total_load_seconds', 'memory_mb').
+        """
+        with self._lock:
+            return {key: dict(values) for key, values in self._stats.items()}
+
+
+def _configured_factory():
+    """Returns the engine factory named by OCR_ENGINE_FACTORY, or the PaddleOCR one."""
+    if not ENGINE_FACTORY:
+        return _build_engine
+    module_name, _, function_name = ENGINE_FACTORY.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+# Engines are built lazily; nothing is loaded until perform_ocr (or warm) asks for it.
+OCR_ENGINES = EngineRegistry(factory=_configured_factory())
+
+
+def perform_ocr(image_path: str, language: str = 'latin', tiling: bool = None, profile: str = None) -> OcrPage:
     """
     Performs OCR on a given image file with language support.
-    
+
     Args:
-        image_path (str): The full path to the image file.
+        image_path (str | bytes | np.ndarray): The full path to the image file, encoded
+            image bytes, or a decoded uint8 image array (BGR or grayscale).
         language (str): Language code ('en', 'ch', 'korean', 'japan', 'latin', 'cyrillic')
-        
+        tiling (bool): Whether to OCR the image in overlapping tiles. By default, images
+            larger than TILING_THRESHOLD_PX on their longest side are tiled.
+        profile (str): OCR profile name ('fast', 'balanced', 'accurate'); defaults to DEFAULT_PROFILE.
+
     Returns:
-        list: A list of the raw detection results.
+        OcrPage: The detected boxes; it iterates like the engine's raw [box, (text, confidence)] list.
     """
-    if not os.path.exists(image_path):
+    if isinstance(image_path, str) and not os.path.exists(image_path):
         print(f"Error: Image path does not exist: {image_path}")
-        return []
-    
+        return OcrPage.empty()
+
+    if tiling is not False:
+        # Imported here: the tiling module builds on this one.
+        from src.ocr import tiling as ocr_tiling
+        if tiling or ocr_tiling.needs_tiling(image_path):
+            return ocr_tiling.perform_tiled_ocr(image_path, language=language, profile=profile)
+
     # Select appropriate OCR engine, default to latin
-    engine = OCR_ENGINES.get(language, OCR_ENGINES['latin'])
-    
-    result = engine.ocr(image_path, cls=True)
-    return result[0] if result and result[0] is not None else []
\ No newline at end of file
+    profile = resolve_profile(profile)
+    engine = OCR_ENGINES.get(language, profile)
+
+    # PaddleOCR detects, classifies and recognizes in this one call; `perform_ocr_batch` times them apart.
+    with metrics.span("ocr.page", language=language, profile=profile) as span:
+        result = engine.ocr(image_path, cls=OCR_PROFILES[profile]["use_angle_cls"])
+        page = OcrPage.from_results(result[0] if result and result[0] is not None else [])
+        span.set(boxes=len(page))
+    metrics.count("ocr.boxes", len(page))
+    return page
+
+
+def _load_bgr(image):
+    """Decodes an image path or bytes into the BGR uint8 array PaddleOCR's stages expect."""
+    if isinstance(image, np.ndarray):
+        if image.ndim == 2:
+            return np.repeat(image[:, :, None], 3, axis=2)
+        return image[:, :, :3] if image.shape[2] == 4 else image
+    source = io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image
+    with Image.open(source) as img:
+        return np.ascontiguousarray(np.asarray(img.convert("RGB"))[:, :, ::-1])
+
+
+def perform_ocr_batch(images: list, language: str = 'latin', profile: str = None) -> list:
+    """
+    OCRs many images (files, pages or regions) together, sharing recognition batches between them.
+
+    Text is detected image by image, but the text crops of all images are pooled
+    and recognized together. The recognizer sorts crops by aspect ratio before
+    padding them to a common width, so a large pool gives it full batches of
+    similar-sized lines instead of a few ragged crops per page. Each result is
+    routed back to the image it came from.
+
+    Images large enough to need tiling (see `perform_ocr`) are OCR'd on their own.
+
+    Args:
+        images (list): Image paths, encoded image bytes or decoded uint8 arrays (BGR or grayscale).
+        language (str): Language code, as for `perform_ocr`.
+        profile (str): OCR profile name, as for `perform_ocr`.
+
+    Returns:
+        list: One OcrPage per input image, in input order (empty for missing or unreadable images).
+    """
+    # PaddleOCR puts its 'tools' package on sys.path when it is imported.
+    from tools.infer.predict_system import sorted_boxes
+    from tools.infer.utility import get_minarea_rect_crop, get_rotate_crop_image
+    from src.ocr import tiling as ocr_tiling
+
+    profile = resolve_profile(profile)
+    engine = OCR_ENGINES.get(language, profile)
+    pages = [OcrPage.empty() for _ in images]
+    crops = []
+    owners = []  # (image index, box) per crop
+    for index, image in enumerate(images):
+        if isinstance(image, str) and not os.path.exists(image):
+            print(f"Error: Image path does not exist: {image}")
+            continue
+        if ocr_tiling.needs_tiling(image):
+            pages[index] = ocr_tiling.perform_tiled_ocr(image, language=language, profile=profile)
+            continue
+        try:
+            img = _load_bgr(image)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read image {image if isinstance(image, str) else index}: {e}")
+            continue
+        # The detector may modify its input; crops are cut from the untouched image.
+        with metrics.span("ocr.detect", language=language, profile=profile):
+            dt_boxes, _ = engine.text_detector(img.copy())
+        if dt_boxes is None or not len(dt_boxes):
+            continue
+        for box in sorted_boxes(dt_boxes):
+            box = copy.deepcopy(box)
+            if engine.args.det_box_type == "quad":
+                crops.append(get_rotate_crop_image(img, box))
+            else:
+                crops.append(get_minarea_rect_crop(img, box))
+            owners.append((index, box))
+
+    if not crops:
+        return pages
+    if OCR_PROFILES[profile]["use_angle_cls"]:
+        with metrics.span("ocr.classify", crops=len(crops)):
+            crops, _, _ = engine.text_classifier(crops)
+    with metrics.span("ocr.recognize", crops=len(crops)):
+        recognized, _ = engine.text_recognizer(crops)
+
+    results = [[] for _ in images]
+    for (index, box), (text, score) in zip(owners, recognized):
+        if score >= engine.drop_score:
+            results[index].append([np.asarray(box).tolist(), (text, score)])
+    for index, boxes in enumerate(results):
+        if boxes:
+            pages[index] = OcrPage.from_results(boxes)
+    metrics.count("ocr.boxes", sum(len(boxes) for boxes in results))
+    return pages
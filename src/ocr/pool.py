@@ -0,0 +1,105 @@
+# File: src/ocr/pool.py
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+import multiprocessing
+import os
+import threading
+
+from src.ocr.engine import OCR_ENGINES, resolve_profile
+
+# Worker pools shared by PDF page OCR and tiled image OCR, one per language and
+# profile. They are kept alive between documents so each worker's engine stays
+# warm. Every worker holds an engine, so idle pools beyond this many are stopped,
+# least recently used first; a pool that is in use is never stopped.
+MAX_POOLS = int(os.environ.get("OCR_MAX_POOLS", "2"))
+
+
+class _SharedPool:
+    __slots__ = ("executor", "workers", "users")
+
+    def __init__(self, executor: ProcessPoolExecutor, workers: int):
+        self.executor = executor
+        self.workers = workers
+        self.users = 0  # Callers holding the pool (see `get_pool` and `release_pool`)
+
+
+_pools = OrderedDict()  # (lang_code, profile) -> _SharedPool, least recently used first
+_lock = threading.Lock()
+
+
+def get_pool(lang_code: str, workers: int, profile: str = None) -> ProcessPoolExecutor:
+    """
+    Returns the OCR worker pool for a language and profile, starting it if needed.
+
+    Each call holds the pool until it is handed back with `release_pool`, so other
+    callers (another thread, tiled OCR in another language) never stop it while
+    its work is running. An idle pool of a different size is replaced; a busy one
+    is shared as it is.
+    """
+    profile = resolve_profile(profile)
+    key = (lang_code, profile)
+    with _lock:
+        shared = _pools.get(key)
+        if shared is not None and shared.workers != workers and not shared.users:
+            shared.executor.shutdown(wait=False)
+            del _pools[key]
+            shared = None
+        if shared is None:
+            # 'spawn' keeps workers from inheriting GUI and engine state through fork.
+            context = multiprocessing.get_context("spawn")
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(lang_code, profile),
+            )
+            shared = _pools[key] = _SharedPool(executor, workers)
+        _pools.move_to_end(key)
+        shared.users += 1
+        _stop_idle_pools()
+        return shared.executor
+
+
+def release_pool(executor: ProcessPoolExecutor):
+    """Hands back a pool from `get_pool` once no more work will be submitted to it."""
+    with _lock:
+        for shared in _pools.values():
+            if shared.executor is executor:
+                shared.users -= 1
+                break
+        _stop_idle_pools()
+
+
+def _stop_idle_pools():
+    """Stops the least recently used idle pools while more than MAX_POOLS run. Caller holds the lock."""
+    for key in list(_pools):
+        if len(_pools) <= MAX_POOLS:
+            break
+        shared = _pools[key]
+        if not shared.users:
+            shared.executor.shutdown(wait=False)
+            del _pools[key]
+
+
+def shutdown_pool():
+    """Stops every OCR worker pool, dropping queued work. Used at exit."""
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for shared in pools:
+        shared.executor.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_pool)
+
+
+def in_worker() -> bool:
+    """True inside a pool worker process, where work must not fan out into a second pool."""
+    return multiprocessing.parent_process() is not None
+
+
+def _init_worker(lang_code: str, profile: str):
+    """Loads the OCR engine once when a worker process starts."""
+    OCR_ENGINES.get(lang_code, profile)
@@ -0,0 +1,143 @@
+# File: src/ocr/profile_report.py
+
+"""
+Measures OCR throughput and accuracy of each profile on your own sample images.
+
+Usage:
+    python -m src.ocr.profile_report samples/ --lang latin
+
+Ground truth is optional: for `scan.png`, put the expected text in `scan.txt`
+next to it. Accuracy is then reported as 1 - character error rate, comparing
+texts with whitespace collapsed. Prints a Markdown table.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from src.ocr.engine import OCR_ENGINES, OCR_PROFILES, perform_ocr
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance between two strings, one row of the DP table at a time."""
+    if not a or not b:
+        return len(a) + len(b)
+    b_codes = np.frombuffer(b.encode("utf-32-le"), dtype=np.uint32)
+    columns = np.arange(len(b) + 1)
+    previous = columns.copy()
+    for i, char in enumerate(a, start=1):
+        substitution = previous[:-1] + (b_codes != ord(char))
+        current = np.empty_like(previous)
+        current[0] = i
+        current[1:] = np.minimum(previous[1:] + 1, substitution)
+        # Insertions run along the row: current[j] = min over k <= j of current[k] + (j - k)
+        current = np.minimum.accumulate(current - columns) + columns
+        previous = current
+    return int(previous[-1])
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def collect_samples(paths: list) -> list:
+    """Returns (image path, expected text or None) for the given files and directories."""
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images.extend(os.path.join(path, name) for name in sorted(os.listdir(path)))
+        else:
+            images.append(path)
+    samples = []
+    for image in images:
+        if not image.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        truth_path = os.path.splitext(image)[0] + ".txt"
+        truth = None
+        if os.path.exists(truth_path):
+            with open(truth_path, encoding="utf-8") as f:
+                truth = _normalize(f.read())
+        samples.append((image, truth))
+    return samples
+
+
+def measure_profile(samples: list, language: str, profile: str, repeat: int = 1) -> dict:
+    """
+    OCRs every sample with one profile.
+
+    The engine is loaded before timing starts; its load time is reported separately.
+
+    Returns:
+        dict: 'profile', 'images', 'load_seconds', 'seconds', 'images_per_second' and,
+              when there is ground truth, 'char_accuracy'.
+    """
+    start = time.perf_counter()
+    OCR_ENGINES.get(language, profile)
+    load_seconds = time.perf_counter() - start
+
+    errors = 0
+    reference_chars = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        texts = [" ".join(perform_ocr(image, language=language, profile=profile).texts()) for image, _ in samples]
+    seconds = (time.perf_counter() - start) / repeat
+    for (_, truth), text in zip(samples, texts):
+        if truth is not None:
+            errors += edit_distance(_normalize(text), truth)
+            reference_chars += len(truth)
+
+    result = {
+        "profile": profile,
+        "images": len(samples),
+        "load_seconds": load_seconds,
+        "seconds": seconds,
+        "images_per_second": len(samples) / seconds if seconds > 0 else 0.0,
+    }
+    if reference_chars:
+        result["char_accuracy"] = max(0.0, 1 - errors / reference_chars)
+    return result
+
+
+def format_table(results: list) -> str:
+    lines = ["| Profile | Images | Engine load (s) | OCR time (s) | Images/s | Char accuracy |",
+             "| :------ | -----: | --------------: | -----------: | -------: | ------------: |"]
+    for r in results:
+        accuracy = f"{r['char_accuracy']:.2%}" if "char_accuracy" in r else "n/a"
+        lines.append(f"| {r['profile']} | {r['images']} | {r['load_seconds']:.1f} | {r['seconds']:.2f} | "
+                     f"{r['images_per_second']:.2f} | {accuracy} |")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.ocr.profile_report",
+                                     description="Compare OCR profiles on sample images.")
+    parser.add_argument("inputs", nargs="+", help="Image files or directories.")
+    parser.add_argument("--lang", default="latin", help="OCR language (default: latin).")
+    parser.add_argument("--profiles", default=",".join(OCR_PROFILES),
+                        help="Comma-separated profiles to compare (default: all).")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed passes over the samples per profile.")
+    args = parser.parse_args(argv)
+
+    samples = collect_samples(args.inputs)
+    if not samples:
+        print("No sample images found.", file=sys.stderr)
+        return 2
+    results = []
+    for profile in args.profiles.split(","):
+        if profile not in OCR_PROFILES:
+            print(f"Unknown profile: {profile}", file=sys.stderr)
+            return 2
+        results.append(measure_profile(samples, args.lang, profile, max(args.repeat, 1)))
+        # Keep earlier profiles' engines from skewing memory and timings
+        OCR_ENGINES.evict(args.lang, profile)
+    print(format_table(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# File: src/ocr/raster.py
+
+import fitz  # PyMuPDF
+import numpy as np
+
+DEFAULT_DPI = 200
+MIN_DPI = 120
+MAX_DPI = 400
+# Recognition models work best when a text line is roughly this many pixels tall.
+TARGET_TEXT_HEIGHT_PX = 32
+# Keep full renders within what the detector handles without heavy downsampling.
+MAX_RENDER_SIDE_PX = 4000
+
+
+def choose_dpi(page, clip=None) -> int:
+    """
+    Picks a render DPI for a page (or a region of it).
+
+    Uses the median font size of the text layer when there is one, otherwise the
+    native resolution of the largest embedded image (a scanned page), and finally
+    caps the result so the longest side stays under MAX_RENDER_SIDE_PX.
+
+    Args:
+        page (fitz.Page): The page to render.
+        clip (fitz.Rect): Optional region of the page.
+
+    Returns:
+        int: The DPI to render at.
+    """
+    area = fitz.Rect(clip) if clip is not None else page.rect
+
+    sizes = [
+        span["size"]
+        for block in page.get_text("dict", clip=area)["blocks"] if block["type"] == 0
+        for line in block["lines"]
+        for span in line["spans"] if span["text"].strip()
+    ]
+    if sizes:
+        dpi = TARGET_TEXT_HEIGHT_PX * 72 / max(float(np.median(sizes)), 1.0)
+    else:
+        dpi = _native_image_dpi(page, area) or DEFAULT_DPI
+
+    dpi = min(max(dpi, MIN_DPI), MAX_DPI)
+    longest_side_pt = max(area.width, area.height, 1.0)
+    dpi = min(dpi, MAX_RENDER_SIDE_PX * 72 / longest_side_pt)
+    return max(int(dpi), 72)
+
+
+def _native_image_dpi(page, area):
+    """Returns the resolution of the largest image overlapping `area`, or None."""
+    best_dpi, best_area = None, 0.0
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"]) & area
+        if bbox.is_empty or bbox.get_area() <= best_area:
+            continue
+        full = fitz.Rect(info["bbox"])
+        if full.width > 0 and info.get("width"):
+            best_dpi = info["width"] * 72 / full.width
+            best_area = bbox.get_area()
+    return best_dpi
+
+
+def pixmap_to_array(pix) -> np.ndarray:
+    """
+    Views a pixmap's samples as a NumPy array without copying.
+
+    The array shares memory with the pixmap, so the pixmap must outlive it.
+
+    Returns:
+        np.ndarray: (height, width) for single-channel pixmaps, else (height, width, n).
+    """
+    buffer = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    shape = (pix.height, pix.width, pix.n)
+    if pix.stride == pix.width * pix.n:
+        array = buffer.reshape(shape)
+    else:
+        # Padded rows: still a view, just not contiguous.
+        array = np.lib.stride_tricks.as_strided(buffer, shape=shape, strides=(pix.stride, pix.n, 1))
+    return array[:, :, 0] if pix.n == 1 else array
+
+
+class PageRasterizer:
+    """
+    Renders PDF pages into arrays that can be handed straight to the OCR engine.
+
+    Pages are rendered in grayscale, viewed without copying, and expanded into a
+    three-channel buffer that is reused from page to page (it only grows when a
+    larger page comes along). An array returned by `render` stays valid until
+    the next call.
+    """
+
+    def __init__(self):
+        self._buffer = np.empty(0, dtype=np.uint8)
+
+    def render(self, page, clip=None, dpi: int = None):
+        """
+        Renders a page or page region.
+
+        Args:
+            page (fitz.Page): The page to render.
+            clip (fitz.Rect): Optional region of the page.
+            dpi (int): Render resolution; chosen with `choose_dpi` when omitted.
+
+        Returns:
+            tuple: (BGR uint8 array of shape (height, width, 3), dpi used)
+        """
+        dpi = dpi or choose_dpi(page, clip)
+        pix = page.get_pixmap(dpi=dpi, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+        gray = pixmap_to_array(pix)
+
+        height, width = gray.shape
+        needed = height * width * 3
+        if self._buffer.size < needed:
+            self._buffer = np.empty(needed, dtype=np.uint8)
+        bgr = self._buffer[:needed].reshape(height, width, 3)
+        np.copyto(bgr, gray[:, :, None])
+        return bgr, dpi
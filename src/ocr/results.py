@@ -0,0 +1,268 @@
+# File: src/ocr/results.py
+
+import struct
+import zlib
+
+import numpy as np
+
+# Binary layout of serialized results (before zlib compression):
+#   header:  magic "OCRR", format version (uint16), box count n (uint32)
+#   quads:   n * 8 float32  (x, y for the four corners of each box)
+#   scores:  n float32
+#   pages:   n uint32       (0 when the box carries no page number)
+#   offsets: n + 1 uint32   (version 1: byte offsets, version 2: character offsets)
+#   text:    UTF-8 bytes of all texts concatenated
+_MAGIC = b"OCRR"
+_FORMAT_VERSION = 2
+_HEADER = struct.Struct("<4sHI")
+
+
+class OcrPage:
+    """
+    OCR boxes of one page (or one image), stored in flat arrays.
+
+    All quads live in one float32 array of shape (n, 4, 2), confidences in one
+    float32 array, and all texts in a single string addressed by offsets. Pages
+    taken from an OcrDocument are views that share the document's storage.
+
+    For existing callers the page still behaves like the engine's nested list:
+    iterating or indexing yields [box, (text, confidence)], plus the page number
+    as a third element when the page has one.
+    """
+
+    __slots__ = ("quads", "scores", "text", "offsets", "page_number")
+
+    def __init__(self, quads, scores, text: str, offsets, page_number: int = 0):
+        self.quads = quads
+        self.scores = scores
+        self.text = text
+        self.offsets = offsets
+        self.page_number = page_number
+
+    @classmethod
+    def empty(cls, page_number: int = 0) -> "OcrPage":
+        return cls(np.empty((0, 4, 2), dtype=np.float32), np.empty(0, dtype=np.float32), "",
+                   np.zeros(1, dtype=np.int64), page_number)
+
+    @classmethod
+    def from_results(cls, ocr_results, page_number: int = 0) -> "OcrPage":
+        """
+        Builds a page from nested-list results ([box, (text, confidence), ...]).
+
+        Args:
+            ocr_results (list): Boxes in the shape returned by PaddleOCR.
+            page_number (int): 1-based page number, or 0 for none.
+        """
+        if isinstance(ocr_results, OcrPage):
+            return ocr_results
+        count = len(ocr_results)
+        if not count:
+            return cls.empty(page_number)
+        quads = np.asarray([item[0] for item in ocr_results], dtype=np.float32).reshape(count, 4, 2)
+        scores = np.fromiter((item[1][1] for item in ocr_results), dtype=np.float32, count=count)
+        texts = [item[1][0] for item in ocr_results]
+        return cls(quads, scores, "".join(texts), _offsets_for(texts), page_number)
+
+    @classmethod
+    def concat(cls, pages: list, page_number: int = 0) -> "OcrPage":
+        """Joins several sets of boxes (e.g. text-layer blocks and OCR'd regions) into one page."""
+        pages = [page for page in pages if len(page)]
+        if not pages:
+            return cls.empty(page_number)
+        texts = [page.text[page.offsets[0]:page.offsets[-1]] for page in pages]
+        lengths = np.concatenate([np.diff(page.offsets) for page in pages])
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(np.concatenate([page.quads for page in pages]), np.concatenate([page.scores for page in pages]),
+                   "".join(texts), offsets, page_number)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def text_at(self, index: int) -> str:
+        return self.text[self.offsets[index]:self.offsets[index + 1]]
+
+    def texts(self) -> list:
+        """Returns every box's text, in box order."""
+        bounds = self.offsets.tolist()
+        text = self.text
+        return [text[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+    def __getitem__(self, index: int) -> list:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("OCR box index out of range")
+        item = [self.quads[index].tolist(), (self.text_at(index), float(self.scores[index]))]
+        if self.page_number:
+            item.append(self.page_number)
+        return item
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def to_list(self) -> list:
+        """Returns the boxes in the engine's nested-list shape."""
+        quads = self.quads.tolist()
+        scores = self.scores.tolist()
+        texts = self.texts()
+        if self.page_number:
+            return [[quads[i], (texts[i], scores[i]), self.page_number] for i in range(len(texts))]
+        return [[quads[i], (texts[i], scores[i])] for i in range(len(texts))]
+
+    def transformed(self, scale: float, dx: float = 0.0, dy: float = 0.0, page_number: int = None) -> "OcrPage":
+        """Returns a copy with every corner mapped to (x * scale + dx, y * scale + dy)."""
+        quads = self.quads * np.float32(scale) + np.array([dx, dy], dtype=np.float32)
+        return OcrPage(quads, self.scores, self.text, self.offsets,
+                       self.page_number if page_number is None else page_number)
+
+    def to_bytes(self) -> bytes:
+        """Serializes the page; restore it with `OcrDocument.from_bytes`."""
+        return OcrDocument.from_pages([self]).to_bytes()
+
+
+class OcrDocument:
+    """
+    OCR boxes of a whole document, with every page's boxes in shared flat arrays.
+
+    Boxes are stored in page order; `pages` holds each box's page number (0 for
+    a single image). `page(number)` and iteration over `iter_pages()` return
+    OcrPage views without copying. Iterating the document itself yields the
+    nested-list shape used before, [box, (text, confidence), page_number].
+    """
+
+    __slots__ = ("quads", "scores", "pages", "text", "offsets")
+
+    def __init__(self, quads, scores, pages, text: str, offsets):
+        self.quads = quads
+        self.scores = scores
+        self.pages = pages
+        self.text = text
+        self.offsets = offsets
+
+    @classmethod
+    def from_pages(cls, pages: list) -> "OcrDocument":
+        """Builds a document from OcrPage objects (or nested lists), ordered by page number."""
+        pages = sorted((OcrPage.from_results(page) for page in pages), key=lambda page: page.page_number)
+        merged = OcrPage.concat(pages)
+        page_numbers = np.concatenate(
+            [np.full(len(page), page.page_number, dtype=np.uint32) for page in pages]
+        ) if pages else np.empty(0, dtype=np.uint32)
+        return cls(merged.quads, merged.scores, page_numbers, merged.text, merged.offsets)
+
+    @classmethod
+    def from_results(cls, ocr_results) -> "OcrDocument":
+        """Builds a document from nested-list results whose optional third element is the page number."""
+        if isinstance(ocr_results, OcrDocument):
+            return ocr_results
+        if isinstance(ocr_results, OcrPage):
+            return cls.from_pages([ocr_results])
+        by_page = {}
+        for item in ocr_results:
+            by_page.setdefault(item[2] if len(item) > 2 else 0, []).append(item[:2])
+        return cls.from_pages([OcrPage.from_results(by_page[number], number) for number in sorted(by_page)])
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def page_numbers(self) -> list:
+        """Returns the distinct page numbers, in order."""
+        return np.unique(self.pages).tolist()
+
+    def page(self, page_number: int) -> OcrPage:
+        """Returns the boxes of one page as a view into the document's arrays."""
+        start = int(np.searchsorted(self.pages, page_number, side="left"))
+        end = int(np.searchsorted(self.pages, page_number, side="right"))
+        return OcrPage(self.quads[start:end], self.scores[start:end], self.text,
+                       self.offsets[start:end + 1], page_number)
+
+    def iter_pages(self):
+        """Yields an OcrPage view per page, in page order."""
+        for page_number in self.page_numbers():
+            yield self.page(page_number)
+
+    def __iter__(self):
+        for page in self.iter_pages():
+            yield from page.to_list()
+
+    def __getitem__(self, index: int) -> list:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("OCR box index out of range")
+        page_number = int(self.pages[index])
+        return OcrPage(self.quads[index:index + 1], self.scores[index:index + 1], self.text,
+                       self.offsets[index:index + 2], page_number)[0]
+
+    def to_list(self) -> list:
+        return list(self)
+
+    def to_bytes(self) -> bytes:
+        """Serializes the document to a compact, zlib-compressed byte string."""
+        count = len(self)
+        text = self.text[self.offsets[0]:self.offsets[-1]] if count else ""
+        offsets = (self.offsets - self.offsets[0]).astype(np.uint32)
+        payload = b"".join([
+            _HEADER.pack(_MAGIC, _FORMAT_VERSION, count),
+            np.ascontiguousarray(self.quads, dtype=np.float32).tobytes(),
+            np.ascontiguousarray(self.scores, dtype=np.float32).tobytes(),
+            np.ascontiguousarray(self.pages, dtype=np.uint32).tobytes(),
+            offsets.tobytes(),
+            text.encode("utf-8"),
+        ])
+        return zlib.compress(payload, 6)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "OcrDocument":
+        """Restores a document serialized with `to_bytes` (or by the older `pack_results`)."""
+        payload = zlib.decompress(blob)
+        magic, version, count = _HEADER.unpack_from(payload)
+        if magic != _MAGIC or version not in (1, _FORMAT_VERSION):
+            raise ValueError("Unrecognized OCR result format.")
+
+        position = _HEADER.size
+        quads = np.frombuffer(payload, dtype=np.float32, count=count * 8, offset=position).reshape(count, 4, 2)
+        position += quads.nbytes
+        scores = np.frombuffer(payload, dtype=np.float32, count=count, offset=position)
+        position += scores.nbytes
+        pages = np.frombuffer(payload, dtype=np.uint32, count=count, offset=position)
+        position += pages.nbytes
+        offsets = np.frombuffer(payload, dtype=np.uint32, count=count + 1, offset=position).astype(np.int64)
+        position += (count + 1) * 4
+        raw_text = payload[position:]
+
+        if version == 1:
+            # Version 1 stored byte offsets; convert them to character offsets.
+            texts = [raw_text[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(count)]
+            return cls(quads, scores, pages, "".join(texts), _offsets_for(texts))
+        return cls(quads, scores, pages, raw_text.decode("utf-8"), offsets)
+
+
+def _offsets_for(texts: list) -> np.ndarray:
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)), out=offsets[1:])
+    return offsets
+
+
+def pack_results(ocr_results) -> bytes:
+    """
+    Serializes OCR results to a compact, compressed byte string.
+
+    Args:
+        ocr_results (OcrDocument | OcrPage | list): Boxes as an OcrDocument/OcrPage, or as
+            nested lists [box, (text, confidence)] / [box, (text, confidence), page_number].
+
+    Returns:
+        bytes: The packed results.
+    """
+    return OcrDocument.from_results(ocr_results).to_bytes()
+
+
+def unpack_results(blob: bytes) -> OcrDocument:
+    """
+    Restores OCR results packed by `pack_results`.
+
+    Returns:
+        OcrDocument: The results; iterate it for the engine's nested-list shape.
+    """
+    return OcrDocument.from_bytes(blob)
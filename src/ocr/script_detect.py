@@ -0,0 +1,368 @@
+# File: src/ocr/script_detect.py
+
+"""
+Picks the OCR engine and translation source language for a document automatically.
+
+The cheapest evidence comes first:
+
+1. A PDF's text layer: the Unicode scripts of its characters say which engine
+   fits (Han -> 'ch', kana -> 'japan', Hangul -> 'korean', Cyrillic ->
+   'cyrillic', Latin -> 'latin'), and for Latin text, common function words say
+   which language it is. No OCR runs at all.
+2. Otherwise, a probe: the first page is downsampled to PROBE_MAX_SIDE and OCR'd
+   with the most likely engine. If that reading is not confident, the engine for
+   the script it read gets one more try, so a probe loads at most two engines.
+   The script of what it read decides.
+
+Decisions are cached per document (by content hash, in the OCR cache database),
+so a file is only probed once.
+
+A document whose text layer mixes scripts that no single engine reads (e.g.
+Chinese and Russian) gets several engines. Its scanned pages and embedded image
+regions are then probed with those engines only and OCR'd one by one with the
+engine that fits each (`route_image`), instead of OCR'ing every page with one
+engine and redoing the pages it got wrong. Documents in one script are never
+routed.
+"""
+
+from collections import OrderedDict
+import json
+import re
+import threading
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from src.ocr import cache as ocr_cache
+from src.ocr.engine import engine_version, perform_ocr
+from src.ocr.tiling import open_image
+from src.utils import metrics
+
+# Pass as the language code to have it detected.
+AUTO_LANGUAGE = "auto"
+
+# Which engine reads each script, and the translator's code for its language.
+SCRIPT_ENGINES = {"latin": "latin", "cyrillic": "cyrillic", "han": "ch", "kana": "japan", "hangul": "korean"}
+SCRIPT_SOURCES = {"cyrillic": "ru", "han": "zh", "kana": "ja", "hangul": "ko"}
+# Latin text without telling function words is assumed to be English.
+DEFAULT_LATIN_SOURCE = "en"
+# Engines tried by the probe, after the previous decision.
+PROBE_LANGUAGES = ("latin", "ch", "japan", "korean", "cyrillic")
+# Engines one probe may load. Only a couple stay resident (see OCR_MAX_ENGINES), so
+# trying more would evict and reload them.
+MAX_PROBE_CANDIDATES = 2
+
+# Longest side, in pixels, of the image the probe OCRs.
+PROBE_MAX_SIDE = 960
+# Of a larger image, the probe reads a band across its inked middle this tall relative to its width.
+PROBE_BAND_RATIO = 0.5
+# Gray level below which a pixel counts as ink.
+INK_LEVEL = 128
+# Mean recognition confidence at which the probe accepts an engine's reading.
+PROBE_MIN_CONFIDENCE = 0.8
+# Fewer letters than this say nothing reliable about the script.
+MIN_SCRIPT_CHARS = 20
+# A script with at least this share of a document's letters needs an engine that reads it.
+MIXED_MIN_SHARE = 0.15
+# Japanese mixes kanji with kana; this share of kana among Han and kana characters means Japanese.
+KANA_MIN_SHARE = 0.1
+# Text-layer pages sampled, and characters of text examined.
+SAMPLE_PAGES = 5
+SAMPLE_CHARS = 20000
+# Decisions kept in memory, on top of the ones in the cache database.
+MAX_REMEMBERED = 256
+
+_SCRIPT_PATTERNS = {
+    "latin": re.compile(r"[A-Za-z\u00C0-\u024F\u1E00-\u1EFF]"),
+    "cyrillic": re.compile(r"[\u0400-\u052F]"),
+    "han": re.compile(r"[\u3400-\u4DBF\u4E00-\u9FFF\uF900-\uFAFF]"),
+    "kana": re.compile(r"[\u3040-\u30FF\u31F0-\u31FF\uFF66-\uFF9D]"),
+    "hangul": re.compile(r"[\u1100-\u11FF\u3130-\u318F\uAC00-\uD7AF]"),
+}
+
+# Frequent short words of the Latin-script languages the translator is used with.
+_FUNCTION_WORDS = {
+    "en": set("the and of to in is that for it with as was on are be this by not have from".split()),
+    "es": set("el la los las de del que y en se por para con una es al lo como pero su".split()),
+    "fr": set("le la les de des et est que une dans pour qui pas sur au du avec il ce".split()),
+    "de": set("der die und das ist nicht ein eine den zu mit von sich auf für dem des im".split()),
+    "it": set("il di che e la per un una non sono del della gli le con è nel alla".split()),
+    "pt": set("o de que e do da em um para com não uma os no se na por dos é".split()),
+}
+_WORD = re.compile(r"[^\W\d_]+")
+
+_remembered = OrderedDict()  # (file hash, engine version) -> ScriptChoice
+_remembered_lock = threading.Lock()
+_last_language = None  # The previous decision in this process, probed first next time
+
+
+class ScriptChoice:
+    """The OCR engine(s) and translation source language chosen for a document."""
+
+    def __init__(self, languages, source_lang: str, method: str, confidence: float = 1.0):
+        self.languages = tuple(languages)  # OCR engines, main one first; several for mixed-script documents
+        self.source_lang = source_lang  # Translator code, e.g. 'ru'
+        self.method = method  # 'text layer' or 'probe'
+        self.confidence = confidence
+
+    @property
+    def lang_code(self) -> str:
+        return self.languages[0]
+
+    @property
+    def mixed(self) -> bool:
+        return len(self.languages) > 1
+
+    def describe(self) -> str:
+        """E.g. 'cyrillic/ru (text layer)'."""
+        return f"{'+'.join(self.languages)}/{self.source_lang} ({self.method})"
+
+    def to_dict(self) -> dict:
+        return {"languages": list(self.languages), "source_lang": self.source_lang, "method": self.method,
+                "confidence": self.confidence}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ScriptChoice":
+        return cls(data["languages"], data["source_lang"], data["method"], data.get("confidence", 1.0))
+
+
+def script_counts(text: str) -> dict:
+    """
+    Counts the letters of each script in a text (digits, punctuation and other scripts are ignored).
+
+    Japanese text is counted as 'kana' throughout, kanji included.
+    """
+    text = text[:SAMPLE_CHARS]
+    counts = {script: len(pattern.findall(text)) for script, pattern in _SCRIPT_PATTERNS.items()}
+    if counts["kana"] and counts["kana"] >= (counts["han"] + counts["kana"]) * KANA_MIN_SHARE:
+        counts["kana"] += counts["han"]
+        counts["han"] = 0
+    return counts
+
+
+def guess_latin_language(text: str):
+    """Returns the translator code of a Latin-script text from its function words, or None if unclear."""
+    words = [word.lower() for word in _WORD.findall(text[:SAMPLE_CHARS])]
+    scores = {code: sum(word in vocabulary for word in words) for code, vocabulary in _FUNCTION_WORDS.items()}
+    code, score = max(scores.items(), key=lambda item: item[1])
+    return code if score >= 3 else None
+
+
+def _source_for(script: str, text: str) -> str:
+    if script == "latin":
+        return guess_latin_language(text) or DEFAULT_LATIN_SOURCE
+    return SCRIPT_SOURCES[script]
+
+
+def choose_for_text(text: str, method: str = "text layer"):
+    """
+    Picks engines and a source language from the characters of a text.
+
+    Every non-Latin engine also reads Latin letters, so Latin only needs an engine
+    of its own when no other script is present.
+
+    Returns:
+        ScriptChoice | None: None if the text has too few letters to tell.
+    """
+    counts = script_counts(text)
+    total = sum(counts.values())
+    if total < MIN_SCRIPT_CHARS:
+        return None
+    present = [script for script, n in sorted(counts.items(), key=lambda item: item[1], reverse=True)
+               if n >= total * MIXED_MIN_SHARE]
+    scripts = [script for script in present if script != "latin"] or ["latin"]
+    confidence = sum(counts[script] for script in present) / total
+    return ScriptChoice([SCRIPT_ENGINES[script] for script in scripts], _source_for(scripts[0], text), method,
+                        round(confidence, 3))
+
+
+def _downsample(image: np.ndarray, max_side: int = PROBE_MAX_SIDE) -> np.ndarray:
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return image
+    size = (max(int(width * scale), 1), max(int(height * scale), 1))
+    return np.asarray(Image.fromarray(np.ascontiguousarray(image)).resize(size, Image.BILINEAR))
+
+
+def _probe_sample(image: np.ndarray) -> np.ndarray:
+    """Returns what the probe OCRs: a small image as it is, else a band across its inked middle, downsampled."""
+    height, width = image.shape[:2]
+    if max(height, width) <= PROBE_MAX_SIDE:
+        return image
+    band = max(int(width * PROBE_BAND_RATIO), 1)
+    if height > band:
+        step = max(height // PROBE_MAX_SIDE, 1)
+        rows = image[::step, ::step]
+        if rows.ndim == 3:
+            rows = rows.mean(axis=2)
+        inked = np.flatnonzero((rows < INK_LEVEL).any(axis=1)) * step
+        middle = (inked[0] + inked[-1]) // 2 if len(inked) else height // 2
+        top = min(max(middle - band // 2, 0), height - band)
+        image = image[top:top + band]
+    return _downsample(image)
+
+
+def probe_image(image: np.ndarray, candidates=None, profile: str = None, only_candidates: bool = False) -> tuple:
+    """
+    OCRs a downsampled sample of an image with at most MAX_PROBE_CANDIDATES engines.
+
+    The first candidate reads it first. Unless that reading is confident, the
+    engine for the script it read (or else the next candidate) gets one more try.
+
+    Args:
+        image (np.ndarray): Decoded uint8 image (BGR or grayscale).
+        candidates (tuple): Engine language codes, most likely first; defaults to `probe_order()`.
+        profile (str): OCR profile for the probe's engines (the same engines then OCR the document).
+        only_candidates (bool): Choose among `candidates` only; a script none of them is made
+            for keeps the engine that read it.
+
+    Returns:
+        tuple: (ScriptChoice, OcrPage or None). The page is the probe's own result when the
+               image was small enough to be probed whole, at full size, with the chosen engine.
+    """
+    global _last_language
+    candidates = tuple(candidates or probe_order())
+    sample = _probe_sample(image)
+    whole = sample is image
+    best = None  # (confidence, choice, page)
+    tried = []
+    language = candidates[0]
+    while language is not None:
+        tried.append(language)
+        with metrics.span("script.probe", language=language) as span:
+            page = perform_ocr(sample, language=language, tiling=False, profile=profile)
+            span.set(boxes=len(page))
+        if not len(page):
+            if best is None:
+                # No text found; another engine's detector will not find any either.
+                return ScriptChoice([language], None, "probe", 0.0), page if whole else None
+            break
+        texts = page.texts()
+        lengths = np.array([len(text) for text in texts], dtype=np.float64)
+        confidence = float(np.dot(page.scores, lengths) / max(lengths.sum(), 1.0))
+        text = " ".join(texts)
+        counts = script_counts(text)
+        script = max(counts, key=counts.get)
+        letters = sum(counts.values())
+        if letters:
+            engine = SCRIPT_ENGINES[script]
+            if only_candidates and engine not in candidates:
+                engine = language
+            choice = ScriptChoice([engine], _source_for(script, text), "probe", round(confidence, 3))
+        else:
+            choice = ScriptChoice([language], None, "probe", round(confidence, 3))
+        if best is None or confidence > best[0]:
+            best = (confidence, choice, page if whole and choice.lang_code == language else None)
+        if confidence >= PROBE_MIN_CONFIDENCE or letters < MIN_SCRIPT_CHARS or len(tried) >= MAX_PROBE_CANDIDATES:
+            break  # Confident, too little text to be worth loading another engine for, or out of tries
+        following = [code for code in (choice.lang_code,) + candidates if code not in tried]
+        language = following[0] if following else None
+    metrics.count("script.probes", 1)
+    if best[1].source_lang is not None:
+        _last_language = best[1].lang_code
+    return best[1], best[2]
+
+
+def route_image(image: np.ndarray, candidates, profile: str = None):
+    """
+    OCRs an image (a page or a region of one) with whichever candidate engine fits its script.
+
+    The probe's own result is kept when it read the whole image with that engine;
+    otherwise the image is OCR'd once more with the chosen engine.
+
+    Returns:
+        OcrPage: The image's boxes.
+    """
+    if len(candidates) == 1:
+        return perform_ocr(image, language=candidates[0], profile=profile)
+    choice, page = probe_image(image, candidates, profile, only_candidates=True)
+    metrics.count("script.routed", 1, language=choice.lang_code)
+    if page is not None:
+        return page
+    return perform_ocr(image, language=choice.lang_code, profile=profile)
+
+
+def probe_order(first: str = None) -> tuple:
+    """The probe's candidate engines: `first` (or the previous decision), then the next most likely one."""
+    first = first or _last_language
+    return tuple(dict.fromkeys(([first] if first else []) + list(PROBE_LANGUAGES)))[:MAX_PROBE_CANDIDATES]
+
+
+def _pdf_sample(file_path: str, page_range: tuple = None) -> tuple:
+    """Returns (text of the first few text-layer pages, downsampled grayscale image of the first page)."""
+    with fitz.open(file_path) as doc:
+        first = max(int(page_range[0] or 1), 1) - 1 if page_range else 0
+        first = min(first, max(len(doc) - 1, 0))
+        if not len(doc):
+            return "", None
+        texts = []
+        for page_index in range(first, min(first + SAMPLE_PAGES, len(doc))):
+            texts.append(doc[page_index].get_text())
+            if sum(len(text) for text in texts) >= SAMPLE_CHARS:
+                break
+        page = doc[first]
+        zoom = PROBE_MAX_SIDE / max(page.rect.width, page.rect.height)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY)
+        image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width].copy()
+    return "\n".join(texts), image
+
+
+def _image_sample(file_path: str) -> np.ndarray:
+    with open_image(file_path) as img:
+        img.draft("L", (PROBE_MAX_SIDE, PROBE_MAX_SIDE))  # JPEGs decode straight at a reduced size
+        img = img.convert("L")
+        img.thumbnail((PROBE_MAX_SIDE, PROBE_MAX_SIDE))
+        return np.asarray(img)
+
+
+def choose_language(file_path: str, profile: str = None, page_range: tuple = None, digest: str = None,
+                    use_cache: bool = True) -> ScriptChoice:
+    """
+    Picks the OCR engine(s) and translation source language for a file.
+
+    Args:
+        file_path (str): Path to an image or PDF file.
+        profile (str): OCR profile used for probing.
+        page_range (tuple): Optional (first, last) 1-based page numbers; PDFs are sampled from `first`.
+        digest (str): The file's content hash, if the caller already has it.
+        use_cache (bool): Whether to read and write the cached decision.
+
+    Returns:
+        ScriptChoice: The decision; 'latin' when nothing could be read.
+    """
+    digest = digest or ocr_cache.file_hash(file_path)
+    version = engine_version(profile)
+    with _remembered_lock:
+        choice = _remembered.get((digest, version))
+    if choice is not None:
+        metrics.count("script.cached", 1)
+        return choice
+    stored = ocr_cache.get_script_choice(digest, version) if use_cache else None
+    if stored:
+        metrics.count("script.cached", 1)
+        choice = ScriptChoice.from_dict(json.loads(stored))
+    else:
+        with metrics.span("script.detect", file=file_path) as span:
+            if file_path.lower().endswith(".pdf"):
+                text, image = _pdf_sample(file_path, page_range)
+                choice = choose_for_text(text)
+            else:
+                image = _image_sample(file_path)
+            if choice is None and image is not None:
+                choice, _ = probe_image(image, probe_order(), profile)
+            if choice is None or choice.source_lang is None:
+                choice = ScriptChoice(["latin"] if choice is None else choice.languages, DEFAULT_LATIN_SOURCE,
+                                      "default" if choice is None else choice.method,
+                                      0.0 if choice is None else choice.confidence)
+            span.set(languages="+".join(choice.languages), method=choice.method)
+        print(f"Detected script for {file_path}: {choice.describe()}.")
+        if use_cache:
+            ocr_cache.put_script_choice(digest, version, json.dumps(choice.to_dict()))
+
+    with _remembered_lock:
+        _remembered[(digest, version)] = choice
+        while len(_remembered) > MAX_REMEMBERED:
+            _remembered.popitem(last=False)
+    return choice
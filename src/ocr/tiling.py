@@ -0,0 +1,303 @@
+# File: src/ocr/tiling.py
+
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import contextmanager
+import io
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+from src.ocr.engine import perform_ocr
+from src.ocr.pool import get_pool, in_worker, release_pool
+from src.ocr.results import OcrPage
+from src.utils import metrics
+
+# PaddleOCR shrinks anything larger than its detector limit (960 px on the long side by
+# default) before finding text, so tiles of that size reach the detector at full resolution.
+TILE_SIZE_PX = int(os.environ.get("OCR_TILE_SIZE", "960"))
+# Overlap between neighbouring tiles. It must be taller than any text line, so that every
+# line lies whole in at least one tile.
+TILE_OVERLAP_PX = int(os.environ.get("OCR_TILE_OVERLAP", "160"))
+# Images whose longest side exceeds this are OCR'd in tiles by default.
+TILING_THRESHOLD_PX = int(os.environ.get("OCR_TILING_THRESHOLD", "4096"))
+# A box this close to a tile edge that borders another tile was probably cut by the tile.
+EDGE_MARGIN_PX = 2
+# Boxes across a seam that share this much of the smaller box (or, for long lines, of the
+# overlap strip they both cross) are the same text.
+SEAM_OVERLAP_SHARE = 0.3
+
+# Large scans are legitimate input here; `open_image` keeps a decompression-bomb guard, but
+# well above 600-DPI A3 and large engineering drawings.
+MAX_IMAGE_PIXELS = 1_000_000_000
+_pixel_limit_lock = threading.Lock()
+
+
+@contextmanager
+def open_image(source):
+    """
+    Opens an image like `Image.open`, allowing up to `MAX_IMAGE_PIXELS` pixels.
+
+    Pillow checks its process-wide `Image.MAX_IMAGE_PIXELS` while opening, so that limit
+    is lifted only for the `Image.open` call and restored right after; the size is
+    checked against the larger of the two limits here instead.
+
+    Raises:
+        Image.DecompressionBombError: For an image above the limit.
+    """
+    with _pixel_limit_lock:
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            img = Image.open(source)
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+    with img:
+        if limit is not None and img.width * img.height > max(limit, MAX_IMAGE_PIXELS):
+            raise Image.DecompressionBombError(
+                f"Image size ({img.width * img.height} pixels) exceeds the limit of "
+                f"{max(limit, MAX_IMAGE_PIXELS)} pixels.")
+        yield img
+
+
+def image_size(image) -> tuple:
+    """
+    Returns (width, height) of an image path, encoded image bytes or an array.
+
+    Only the header of a file is read, so this is cheap even for very large scans.
+    """
+    if isinstance(image, np.ndarray):
+        return image.shape[1], image.shape[0]
+    source = io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image
+    with open_image(source) as img:
+        return img.size
+
+
+def needs_tiling(image, threshold: int = TILING_THRESHOLD_PX) -> bool:
+    """True when an image is too large to OCR in one piece without losing small text."""
+    try:
+        return max(image_size(image)) > threshold
+    except (OSError, ValueError):
+        return False
+
+
+def tile_origins(length: int, tile: int, overlap: int) -> list:
+    """Start offsets of overlapping tiles covering `length` pixels; the last tile ends flush."""
+    if length <= tile:
+        return [0]
+    step = max(tile - overlap, 1)
+    origins = list(range(0, length - tile, step))
+    origins.append(length - tile)
+    return origins
+
+
+def _core_bounds(origins: list, tile: int) -> tuple:
+    """
+    Splits each overlap down the middle: a box belongs to the tile whose core holds its centre.
+
+    Returns:
+        tuple: (low, high) arrays of core bounds per tile; outer tiles extend to infinity.
+    """
+    starts = np.asarray(origins, dtype=np.float64)
+    middles = (starts[1:] + starts[:-1] + tile) / 2
+    low = np.r_[-np.inf, middles]
+    high = np.r_[middles, np.inf]
+    return low, high
+
+
+def _load_gray(image) -> np.ndarray:
+    """Decodes an image path or bytes into an 8-bit grayscale array; arrays pass through."""
+    if isinstance(image, np.ndarray):
+        return image
+    source = io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image
+    with open_image(source) as img:
+        return np.asarray(img.convert("L"))
+
+
+def _ocr_tile(task: tuple) -> tuple:
+    """OCRs one tile. Runs inside a worker process; boxes stay in tile coordinates."""
+    tile_index, tile, lang_code, profile = task
+    return tile_index, perform_ocr(tile, language=lang_code, tiling=False, profile=profile)
+
+
+def perform_tiled_ocr(image, language: str = 'latin', tile_size: int = TILE_SIZE_PX,
+                      overlap: int = TILE_OVERLAP_PX, workers: int = None, profile: str = None) -> OcrPage:
+    """
+    OCRs a very large image in overlapping tiles and merges the boxes back together.
+
+    Tiles are OCR'd in the shared worker pool, with only a few tiles in flight at a
+    time, so the detector's working memory is bounded by the tile size rather than
+    the image size. The image itself is held once, as 8-bit grayscale, while its
+    tiles are cut. Boxes found twice in an overlap are merged (see `merge_tiles`).
+
+    Args:
+        image (str | bytes | np.ndarray): Image path, encoded image bytes or a uint8 array.
+        language (str): OCR language code.
+        tile_size (int): Tile side in pixels.
+        overlap (int): Overlap between neighbouring tiles in pixels; larger than the tallest text line.
+        workers (int): Processes to spread tiles over; defaults to the CPU count.
+        profile (str): OCR profile name; defaults to DEFAULT_PROFILE.
+
+    Returns:
+        OcrPage: The boxes in the coordinates of the full image.
+    """
+    if isinstance(image, str) and not os.path.exists(image):
+        print(f"Error: Image path does not exist: {image}")
+        return OcrPage.empty()
+
+    pixels = _load_gray(image)
+    height, width = pixels.shape[:2]
+    xs = tile_origins(width, tile_size, overlap)
+    ys = tile_origins(height, tile_size, overlap)
+    tiles = [(x, y) for y in ys for x in xs]
+
+    def make_task(index):
+        x, y = tiles[index]
+        # A contiguous copy of just this tile is what gets pickled to the worker.
+        return index, np.ascontiguousarray(pixels[y:y + tile_size, x:x + tile_size]), language, profile
+
+    workers = workers or os.cpu_count() or 1
+    with metrics.span("ocr.tiled", width=width, height=height, tiles=len(tiles)):
+        tile_pages = [None] * len(tiles)
+        if workers <= 1 or len(tiles) <= 1 or in_worker():
+            for index in range(len(tiles)):
+                tile_pages[index] = _ocr_tile(make_task(index))[1]
+        else:
+            pool = get_pool(language, workers, profile)
+            try:
+                in_flight = set()
+                for index in range(len(tiles)):
+                    in_flight.add(pool.submit(_ocr_tile, make_task(index)))
+                    if len(in_flight) >= workers * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            tile_index, page = future.result()
+                            tile_pages[tile_index] = page
+                for future in in_flight:
+                    tile_index, page = future.result()
+                    tile_pages[tile_index] = page
+            finally:
+                release_pool(pool)
+
+        return merge_tiles(tile_pages, tiles, xs, ys, tile_size, overlap, width, height)
+
+
+def merge_tiles(tile_pages: list, tiles: list, xs: list, ys: list, tile_size: int, overlap: int,
+                width: int, height: int) -> OcrPage:
+    """
+    Maps tile boxes to image coordinates and removes the duplicates from overlaps.
+
+    Each box is kept only by the tile whose core (the tile minus half of each
+    overlap) contains the box's centre, which drops exact repeats. Text cut by a
+    tile edge can still appear as a fragment in one tile and whole, or as another
+    fragment, in its neighbour; such overlapping boxes on the same line are fused
+    into one box, keeping the uncut text or joining the fragments.
+
+    Args:
+        tile_pages (list): OcrPage per tile, in tile coordinates.
+        tiles (list): (x, y) origin per tile, in the same order.
+        xs, ys (list): Distinct tile origins along each axis.
+        tile_size (int): Tile side in pixels.
+        overlap (int): Overlap between neighbouring tiles in pixels.
+        width, height (int): Size of the full image.
+
+    Returns:
+        OcrPage: The merged boxes.
+    """
+    placed = [page.transformed(1.0, x, y) for page, (x, y) in zip(tile_pages, tiles)]
+    page = OcrPage.concat(placed)
+    if not len(page):
+        return page
+    tile_of_box = np.repeat(np.arange(len(tiles)), [len(p) for p in placed])
+
+    x_low, x_high = _core_bounds(xs, tile_size)
+    y_low, y_high = _core_bounds(ys, tile_size)
+    column = np.searchsorted(xs, [x for x, _ in tiles])
+    row = np.searchsorted(ys, [y for _, y in tiles])
+    column, row = column[tile_of_box], row[tile_of_box]
+
+    quads = page.quads
+    x0, x1 = quads[:, :, 0].min(axis=1), quads[:, :, 0].max(axis=1)
+    y0, y1 = quads[:, :, 1].min(axis=1), quads[:, :, 1].max(axis=1)
+    xc, yc = (x0 + x1) / 2, (y0 + y1) / 2
+    keep = (xc >= x_low[column]) & (xc < x_high[column]) & (yc >= y_low[row]) & (yc < y_high[row])
+
+    # Boxes touching a tile edge that borders another tile may have been cut short.
+    tile_x = np.asarray(xs)[column]
+    tile_y = np.asarray(ys)[row]
+    cut_x = (((x0 <= tile_x + EDGE_MARGIN_PX) & (tile_x > 0)) |
+             ((x1 >= tile_x + tile_size - EDGE_MARGIN_PX) & (tile_x + tile_size < width)))
+    cut_y = (((y0 <= tile_y + EDGE_MARGIN_PX) & (tile_y > 0)) |
+             ((y1 >= tile_y + tile_size - EDGE_MARGIN_PX) & (tile_y + tile_size < height)))
+
+    kept = np.flatnonzero(keep)
+    cut = kept[(cut_x | cut_y)[kept]]
+    texts = page.texts()
+    scores = page.scores
+    if not len(cut):
+        return OcrPage.from_results([[quads[i], (texts[i], scores[i])] for i in kept])
+
+    # Pairs of (cut box, any kept box) from different tiles that cover the same text
+    ix0 = np.maximum(x0[cut][:, None], x0[kept][None, :])
+    ix1 = np.minimum(x1[cut][:, None], x1[kept][None, :])
+    iy0 = np.maximum(y0[cut][:, None], y0[kept][None, :])
+    iy1 = np.minimum(y1[cut][:, None], y1[kept][None, :])
+    overlap_w = np.clip(ix1 - ix0, 0, None)
+    overlap_h = np.clip(iy1 - iy0, 0, None)
+    area = (x1 - x0) * (y1 - y0)
+    line_height = np.minimum((y1 - y0)[cut][:, None], (y1 - y0)[kept][None, :])
+    smaller = np.minimum(np.minimum(area[cut][:, None], area[kept][None, :]), overlap * line_height)
+    same_text = ((overlap_w * overlap_h >= SEAM_OVERLAP_SHARE * np.maximum(smaller, 1e-6)) &
+                 (overlap_h >= 0.5 * line_height) &
+                 (tile_of_box[cut][:, None] != tile_of_box[kept][None, :]))
+    rows, cols = np.nonzero(same_text)
+    if not len(rows):
+        return OcrPage.from_results([[quads[i], (texts[i], scores[i])] for i in kept])
+
+    # Union the matched boxes into groups, then fuse each group left to right.
+    parent = {int(i): int(i) for i in kept}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in zip(cut[rows].tolist(), kept[cols].tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups = {}
+    for i in kept.tolist():
+        groups.setdefault(find(i), []).append(i)
+
+    merged = []
+    for members in groups.values():
+        if len(members) == 1:
+            i = members[0]
+            merged.append([quads[i], (texts[i], scores[i])])
+            continue
+        members.sort(key=lambda i: x0[i])
+        # A box cut across its height reads as garbage; use uncut boxes when there are any.
+        whole_height = [i for i in members if not cut_y[i]] or members
+        text = texts[whole_height[0]]
+        for i in whole_height[1:]:
+            text = _join_fragments(text, texts[i])
+        box = [[x0[members].min(), y0[members].min()], [x1[members].max(), y0[members].min()],
+               [x1[members].max(), y1[members].max()], [x0[members].min(), y1[members].max()]]
+        merged.append([box, (text, float(scores[whole_height].min()))])
+    return OcrPage.from_results(merged)
+
+
+def _join_fragments(left: str, right: str) -> str:
+    """Joins two readings of neighbouring text, dropping the part both tiles saw."""
+    if right in left:
+        return left
+    if left in right:
+        return right
+    for size in range(min(len(left), len(right)) - 1, 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left} {right}"
@@ -0,0 +1,713 @@
+# File: src/service.py
+
+"""
+Local HTTP service for OCR, layout parsing and translation, for other tools on the same machine.
+
+Usage:
+    python -m src.service --port 8765 --lang latin --translate-from es
+
+Endpoints:
+    POST /ocr        Body: an image or PDF file. Streams one JSON line per page as soon as it is ready,
+                     {"page": 1, "text": ..., "boxes": 42}, plus "translation" when translating and
+                     "results" (the raw boxes) with boxes=1, then {"done": true, "pages": N, "seconds": S}.
+                     Optional query parameters: lang, profile, mode, pages (e.g. 2-5), translate_from,
+                     target, boxes=1, cache=0, filename. lang=auto and translate_from=auto detect
+                     the script of each file.
+    POST /parse      {"results": [[quad, [text, score]], ...], "mode": "document"} -> {"text": ...}
+    POST /translate  {"text": ..., "source": "es", "target": "en"} -> {"translation": ...}
+    GET  /health     Engine state, busy workers and queue depth.
+    GET  /metrics    Stage timings in Prometheus format (with --metrics).
+
+    curl --data-binary @scan.pdf "http://127.0.0.1:8765/ocr?lang=latin&translate_from=es"
+
+Accepted requests wait in a bounded queue; when it is full, new ones are turned
+away with 503 and Retry-After instead of piling up. OCR and translation run in a
+pool of worker processes whose engines are loaded at startup, and small images
+queued by different requests are OCR'd together, sharing recognition batches.
+
+The service only listens on 127.0.0.1 and never downloads models (OCR_OFFLINE is
+set): a request that needs an OCR or translation model that is not installed
+fails with an error naming it. Install the models beforehand, e.g. by running
+the app once.
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import functools
+from http import HTTPStatus
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from src.utils import metrics
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Requests accepted but not yet started. Beyond this, requests are refused with 503.
+QUEUE_SIZE = int(os.environ.get("OCR_SERVICE_QUEUE_SIZE", "32"))
+# How long a small image waits for others to share its engine call, and how many may share one.
+BATCH_WINDOW_MS = int(os.environ.get("OCR_SERVICE_BATCH_WINDOW_MS", "20"))
+MAX_BATCH_IMAGES = int(os.environ.get("OCR_SERVICE_MAX_BATCH", "8"))
+MAX_BODY_MB = int(os.environ.get("OCR_SERVICE_MAX_BODY_MB", "200"))
+RETRY_AFTER_SECONDS = 2
+MAX_HEADER_LINES = 100
+
+PARSER_MODES = ("general", "document")
+# Leading bytes of the supported file types, for uploads that come without a file name.
+_SIGNATURES = ((b"%PDF", ".pdf"), (b"\x89PNG", ".png"), (b"\xff\xd8", ".jpg"), (b"BM", ".bmp"))
+_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.pdf')
+
+_page_queue = None
+
+
+def _init_worker(page_queue, lang_code: str, profile: str, translate_from: str, target_lang: str):
+    """Keeps the queue pages are sent back on, and loads this worker's engines before the first request."""
+    global _page_queue
+    _page_queue = page_queue
+    from src.ocr.engine import OCR_ENGINES
+    try:
+        OCR_ENGINES.get(lang_code, profile) # 'auto' loads the 'latin' engine, the first one probed
+    except RuntimeError as e:
+        # Models that are not installed fail each request that needs them, not the whole pool.
+        print(f"Error loading OCR engine '{lang_code}': {e}")
+    if translate_from and translate_from != "auto":
+        from src.translator.engine import translate_text
+        translate_text("", translate_from, target_lang)
+
+
+def _warm_worker() -> int:
+    """Does nothing; one per worker makes the pool start every process (and load its engines) at once."""
+    return os.getpid()
+
+
+def _drain_metrics():
+    return metrics.drain() if metrics.enabled() else None
+
+
+def _page_record(page, spec: dict) -> dict:
+    """Parses (and translates) one OCR'd page into the JSON record sent to the client."""
+    from src.layout_parser.parser import parse_layout
+
+    text = parse_layout(page, mode=spec["mode"])
+    record = {"page": page.page_number or 1, "text": text, "boxes": len(page)}
+    if spec["translate_from"]:
+        from src.translator.engine import translate_text
+        source_lang = spec["translate_from"]
+        if source_lang == "auto":
+            from src.ocr.script_detect import choose_language
+            source_lang = choose_language(spec["file"], spec["profile"], spec["pages"],
+                                          use_cache=spec["use_cache"]).source_lang
+        if source_lang == spec["target"]:
+            record["translation"] = text # Detected as already in the target language
+        else:
+            record["translation"] = translate_text(text, source_lang, spec["target"]) if text.strip() else ""
+    if spec["boxes"]:
+        record["results"] = page.to_list()
+    return record
+
+
+def _send(request_id: int, record):
+    """Sends a record to the service; None marks the request's last one."""
+    _page_queue.put((request_id, record))
+
+
+def _run_document(spec: dict):
+    """
+    OCRs, parses and translates one file, sending each page as soon as it is ready. Executes in a worker process.
+
+    Returns:
+        dict | None: This worker's metrics since its last task, if metrics are enabled.
+    """
+    from src.file_processor import iter_pages
+
+    try:
+        for page in iter_pages(spec["file"], lang_code=spec["lang"], page_range=spec["pages"],
+                               use_cache=spec["use_cache"], workers=1, profile=spec["profile"]):
+            _send(spec["id"], _page_record(page, spec))
+    except Exception as e:
+        _send(spec["id"], {"error": f"{type(e).__name__}: {e}"})
+    _send(spec["id"], None)
+    return _drain_metrics()
+
+
+def _run_image_batch(specs: list):
+    """
+    OCRs small images from several requests together, in shared recognition batches. Executes in a worker process.
+
+    All specs share a language, profile and cache setting (see `_Request.batch_key`).
+    """
+    from src.file_processor import process_file, process_images
+
+    first = specs[0]
+    documents = [None] * len(specs)
+    if len(specs) > 1:
+        try:
+            documents = process_images([spec["file"] for spec in specs], lang_code=first["lang"],
+                                       use_cache=first["use_cache"], profile=first["profile"])
+        except Exception as e:
+            # Fall back to one image at a time, so one bad file only fails its own request.
+            print(f"Batched OCR failed ({type(e).__name__}: {e}); processing images one by one.")
+    for spec, document in zip(specs, documents):
+        try:
+            if document is None:
+                document = process_file(spec["file"], lang_code=spec["lang"], use_cache=spec["use_cache"],
+                                        workers=1, profile=spec["profile"])
+            for page in document.iter_pages():
+                _send(spec["id"], _page_record(page, spec))
+        except Exception as e:
+            _send(spec["id"], {"error": f"{type(e).__name__}: {e}"})
+        _send(spec["id"], None)
+    metrics.observe("service.batch_images", len(specs))
+    return _drain_metrics()
+
+
+def _run_translation(spec: dict):
+    """Translates a block of text. Executes in a worker process."""
+    from src.translator.engine import translate_text
+
+    try:
+        _send(spec["id"], {"translation": translate_text(spec["text"], spec["source"], spec["target"],
+                                                         use_memory=spec["use_memory"])})
+    except Exception as e:
+        _send(spec["id"], {"error": f"{type(e).__name__}: {e}"})
+    _send(spec["id"], None)
+    return _drain_metrics()
+
+
+_TASKS = {"document": _run_document, "images": _run_image_batch, "translate": _run_translation}
+
+
+class _Request:
+    """An accepted request: the task to run for it and the records streamed back, ending with None."""
+
+    def __init__(self, request_id: int, task: str, spec: dict, file_path: str = None, batchable: bool = False):
+        self.id = request_id
+        self.task = task
+        self.spec = dict(spec, id=request_id)
+        self.file_path = file_path  # Uploaded file, removed once the request is finished
+        self.batchable = batchable
+        self.records = asyncio.Queue()
+        self.accepted = time.perf_counter()
+        self.abandoned = False  # The client went away; skipped if it has not started yet
+
+    @property
+    def batch_key(self) -> tuple:
+        return self.spec["lang"], self.spec["profile"], self.spec["use_cache"]
+
+
+class OcrService:
+    """
+    Queues requests and runs them in a pool of worker processes with warm engines.
+
+    A dispatcher takes requests off the queue whenever a worker is free, so the
+    queue (not the pool) holds the backlog and its size bounds it. A small image
+    is sent together with the small images queued behind it for the same
+    language and profile, up to `max_batch`; if none are queued, it waits up to
+    `batch_window_ms` for more. Other requests run one per task.
+
+    Workers send each finished page back through a process queue, and a listener
+    thread hands it to the request's asyncio queue, as `JobScheduler` does for
+    the GUI. If a worker process dies, the requests running in the pool fail and
+    the pool is replaced (and warmed up again); /health reports "restarting"
+    until the new workers are ready.
+    """
+
+    def __init__(self, workers: int, lang_code: str, profile: str = None, mode: str = "general",
+                 translate_from: str = None, target_lang: str = "en", queue_size: int = QUEUE_SIZE,
+                 batch_window_ms: int = BATCH_WINDOW_MS, max_batch: int = MAX_BATCH_IMAGES):
+        self.workers = max(workers, 1)
+        self.lang_code = lang_code
+        self.profile = profile
+        self.mode = mode
+        self.translate_from = translate_from
+        self.target_lang = target_lang
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max(max_batch, 1)
+        self.queue = asyncio.Queue(maxsize=max(queue_size, 1))
+        self.engine_status = "loading"
+        self.busy = 0
+        self._ids = itertools.count(1)
+        self._requests = {}  # id -> _Request, until its last record
+        self._tasks = set()
+        self._loop = None
+        self._pool = None
+        self._page_queue = None
+        self._slots = None
+        self._dispatcher = None
+
+    def start(self):
+        """Starts the worker processes, loads their engines and begins taking requests off the queue."""
+        self._loop = asyncio.get_running_loop()
+        self._start_pool()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def _start_pool(self):
+        """Starts a pool of worker processes, each with its engines and a fresh page queue, and warms it up."""
+        # 'spawn' so workers start clean and build their own engines.
+        context = multiprocessing.get_context("spawn")
+        # A worker that dies while sending a page can leave a queue locked, so each pool gets its own.
+        self._page_queue = context.Queue()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                                         initargs=(self._page_queue, self.lang_code, self.profile,
+                                                   self.translate_from, self.target_lang))
+        threading.Thread(target=self._listen, args=(self._page_queue,), name="service-pages", daemon=True).start()
+        warm = [asyncio.wrap_future(self._pool.submit(_warm_worker)) for _ in range(self.workers)]
+        self._spawn(self._watch_warm_up(self._pool, warm))
+
+    def _restart_pool(self, error: BaseException):
+        """Replaces a pool that lost a worker process; a broken pool fails every task submitted to it."""
+        print(f"Service worker pool broke ({error}); starting a new one.")
+        metrics.count("service.pool_restarts")
+        self.engine_status = f"restarting: {type(error).__name__}: {error}"
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._page_queue.put(None)  # Stops the old listener thread
+        self._start_pool()
+
+    async def close(self):
+        """Stops taking requests and shuts the workers down."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._page_queue.put(None)  # Stops the listener thread
+
+    def status(self) -> dict:
+        return {"engines": self.engine_status, "workers": self.workers, "busy_workers": self.busy,
+                "queued": self.queue.qsize(), "queue_size": self.queue.maxsize}
+
+    def ocr_spec(self, query: dict) -> dict:
+        """
+        Builds an OCR task spec from query parameters, defaulting to the service's settings.
+
+        Raises:
+            ValueError: For an unknown language, profile or parser mode.
+        """
+        from src.ocr.engine import OCR_PROFILES, SUPPORTED_LANGUAGES
+        from src.utils.helpers import parse_page_range
+
+        spec = {
+            "lang": query.get("lang") or self.lang_code,
+            "profile": query.get("profile") or self.profile,
+            "mode": query.get("mode") or self.mode,
+            "pages": parse_page_range(query.get("pages", "")),
+            "translate_from": query.get("translate_from", self.translate_from) or None,
+            "target": query.get("target") or self.target_lang,
+            "boxes": query.get("boxes") == "1",
+            "use_cache": query.get("cache") != "0",
+        }
+        if spec["lang"] not in SUPPORTED_LANGUAGES and spec["lang"] != "auto":
+            raise ValueError(f"Unsupported language '{spec['lang']}'; use one of {', '.join(SUPPORTED_LANGUAGES)} "
+                             "or auto.")
+        if spec["profile"] is not None and spec["profile"] not in OCR_PROFILES:
+            raise ValueError(f"Unknown OCR profile '{spec['profile']}'; use one of {', '.join(OCR_PROFILES)}.")
+        if spec["mode"] not in PARSER_MODES:
+            raise ValueError(f"Unknown parser mode '{spec['mode']}'; use one of {', '.join(PARSER_MODES)}.")
+        return spec
+
+    def submit(self, task: str, spec: dict, file_path: str = None, batchable: bool = False) -> _Request:
+        """
+        Queues a request; its records arrive on `request.records`.
+
+        Raises:
+            asyncio.QueueFull: When the queue is full. An uploaded file is removed.
+        """
+        request = _Request(next(self._ids), task, spec, file_path, batchable)
+        try:
+            self.queue.put_nowait(request)
+        except asyncio.QueueFull:
+            metrics.count("service.rejected", task=task)
+            self._remove_upload(request)
+            raise
+        metrics.count("service.requests", task=task)
+        self._requests[request.id] = request
+        return request
+
+    async def _dispatch(self):
+        carried = None  # A request taken off the queue while collecting a batch it does not belong to
+        while True:
+            await self._slots.acquire()
+            request = carried or await self.queue.get()
+            carried = None
+            if request.abandoned:
+                self._slots.release()
+                self._finish(request)
+                continue
+            if not request.batchable:
+                self._spawn(self._run(request.task, request.spec, [request]))
+                continue
+            batch = [request]
+            deadline = self._loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    if self.queue.empty():
+                        following = await asyncio.wait_for(self.queue.get(), max(deadline - self._loop.time(), 0))
+                    else:
+                        following = self.queue.get_nowait()
+                except asyncio.TimeoutError:
+                    break
+                if following.abandoned:
+                    self._finish(following)
+                elif following.batchable and following.batch_key == request.batch_key:
+                    batch.append(following)
+                else:
+                    carried = following
+                    break
+            self._spawn(self._run("images", [r.spec for r in batch], batch))
+
+    async def _run(self, task: str, spec, requests: list):
+        """Runs one task in the pool; holds a worker slot until it is done."""
+        self.busy += 1
+        pool = self._pool
+        try:
+            metrics.merge(await self._loop.run_in_executor(pool, _TASKS[task], spec))
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and pool is self._pool:
+                self._restart_pool(e)  # Only once for all the tasks that were running in it
+            # The worker process died or the pool is shutting down; its requests will get no more records.
+            print(f"Service task failed: {type(e).__name__}: {e}")
+            for request in requests:
+                self._deliver(request.id, {"error": f"{type(e).__name__}: {e}"})
+                self._deliver(request.id, None)
+        finally:
+            self.busy -= 1
+            self._slots.release()
+
+    async def _watch_warm_up(self, pool, futures: list):
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        if pool is not self._pool:
+            return  # Replaced while warming up; the new pool reports for itself
+        failures = [result for result in results if isinstance(result, BaseException)]
+        if failures:
+            self.engine_status = f"failed: {type(failures[0]).__name__}: {failures[0]}"
+            print(f"Error loading OCR engines: {failures[0]}")
+        else:
+            self.engine_status = "ready"
+            print(f"OCR engines ready in {self.workers} worker(s).")
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _listen(self, page_queue):
+        """Passes records from the workers to the event loop. Runs in its own thread, one per pool."""
+        while True:
+            message = page_queue.get()
+            if message is None:
+                return
+            self._loop.call_soon_threadsafe(self._deliver, *message)
+
+    def _deliver(self, request_id: int, record):
+        request = self._requests.get(request_id)
+        if request is None:
+            return  # Already finished, e.g. failed along with its worker
+        if record is None:
+            self._finish(request)
+        else:
+            request.records.put_nowait(record)
+
+    def _finish(self, request: _Request):
+        self._requests.pop(request.id, None)
+        request.records.put_nowait(None)
+        self._remove_upload(request)
+
+    @staticmethod
+    def _remove_upload(request: _Request):
+        if request.file_path:
+            try:
+                os.remove(request.file_path)
+            except OSError:
+                pass
+
+
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _response_head(status: int, content_type: str, headers: dict = None) -> bytes:
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Content-Type: {content_type}", "Connection: close"]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _write_json(writer, status: int, payload: dict, headers: dict = None):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write(_response_head(status, "application/json", dict(headers or {}, **{"Content-Length": len(body)})))
+    writer.write(body)
+    await writer.drain()
+
+
+async def _write_chunk(writer, record: dict):
+    data = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    writer.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+    await writer.drain()
+
+
+async def _read_request(reader, writer) -> tuple:
+    """
+    Reads one HTTP/1.1 request.
+
+    Returns:
+        tuple: (method, path, query dict, body bytes), or None if the client sent nothing.
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise _HttpError(400, "Malformed request line.")
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise _HttpError(431, "Too many header lines.")
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise _HttpError(411, "Send the body with a Content-Length.")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise _HttpError(400, "Invalid Content-Length.")
+    if length > MAX_BODY_MB * 1024 * 1024:
+        raise _HttpError(413, f"Request body is larger than {MAX_BODY_MB} MB.")
+    if length and headers.get("expect", "").lower() == "100-continue":
+        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        await writer.drain()
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    query = {name: values[-1] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+    return method.upper(), url.path, query, body
+
+
+def _json_body(body: bytes) -> dict:
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError as e:
+        raise _HttpError(400, f"Invalid JSON: {e}")
+    if not isinstance(payload, dict):
+        raise _HttpError(400, "Expected a JSON object.")
+    return payload
+
+
+def _file_suffix(body: bytes, file_name: str):
+    """Returns the extension to store an upload under, from its name or its leading bytes; None if unsupported."""
+    extension = os.path.splitext(file_name.lower())[1]
+    if extension in _EXTENSIONS:
+        return extension
+    return next((suffix for signature, suffix in _SIGNATURES if body.startswith(signature)), None)
+
+
+def _save_upload(body: bytes, suffix: str, directory: str) -> tuple:
+    """Writes an upload to a temporary file. Returns (path, whether it is an image small enough to batch)."""
+    from src.ocr.tiling import needs_tiling
+
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(body)
+    # Large images are OCR'd in tiles on their own; batching them would only hold up the small ones.
+    return path, suffix != ".pdf" and not needs_tiling(path)
+
+
+async def _handle_ocr(service: OcrService, upload_dir: str, query: dict, body: bytes, writer):
+    if not body:
+        raise _HttpError(400, "Send the image or PDF file as the request body.")
+    suffix = _file_suffix(body, query.get("filename", ""))
+    if suffix is None:
+        raise _HttpError(415, f"Unsupported file type; send one of {', '.join(_EXTENSIONS)}.")
+    try:
+        spec = service.ocr_spec(query)
+    except ValueError as e:
+        raise _HttpError(400, str(e))
+    loop = asyncio.get_running_loop()
+    path, batchable = await loop.run_in_executor(None, _save_upload, body, suffix, upload_dir)
+    request = _submit(service, "images" if batchable else "document", dict(spec, file=path), path, batchable)
+
+    writer.write(_response_head(200, "application/x-ndjson", {"Transfer-Encoding": "chunked"}))
+    pages = 0
+    error = None
+    try:
+        while True:
+            record = await request.records.get()
+            if record is None:
+                break
+            if "error" in record:
+                error = record["error"]
+                continue
+            pages += 1
+            await _write_chunk(writer, record)
+        summary = {"done": True, "pages": pages, "seconds": round(time.perf_counter() - request.accepted, 3)}
+        if error:
+            summary["error"] = error
+        await _write_chunk(writer, summary)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+    except ConnectionError:
+        request.abandoned = True
+
+
+async def _handle_translate(service: OcrService, body: bytes, writer):
+    payload = _json_body(body)
+    text, source = payload.get("text"), payload.get("source") or service.translate_from
+    if not isinstance(text, str) or not source:
+        raise _HttpError(400, 'Expected {"text": ..., "source": ..., "target": ...}.')
+    spec = {"text": text, "source": source, "target": payload.get("target") or service.target_lang,
+            "use_memory": payload.get("use_memory", True) is not False}
+    request = _submit(service, "translate", spec)
+    result = {}
+    while True:
+        record = await request.records.get()
+        if record is None:
+            break
+        result.update(record)
+    await _write_json(writer, 500 if "error" in result else 200, result)
+
+
+async def _handle_parse(body: bytes, writer):
+    from src.layout_parser.parser import parse_layout
+
+    payload = _json_body(body)
+    results, mode = payload.get("results"), payload.get("mode", "general")
+    if not isinstance(results, list) or mode not in PARSER_MODES:
+        raise _HttpError(400, 'Expected {"results": [[quad, [text, score]], ...], "mode": "general" | "document"}.')
+    loop = asyncio.get_running_loop()
+    try:
+        text = await loop.run_in_executor(None, parse_layout, results, mode)
+    except (TypeError, ValueError, IndexError) as e:
+        raise _HttpError(400, f"Malformed OCR results: {e}")
+    await _write_json(writer, 200, {"text": text})
+
+
+def _submit(service: OcrService, task: str, spec: dict, file_path: str = None, batchable: bool = False) -> _Request:
+    try:
+        return service.submit(task, spec, file_path, batchable)
+    except asyncio.QueueFull:
+        raise _HttpError(503, "The service is busy; try again shortly.", {"Retry-After": RETRY_AFTER_SECONDS})
+
+
+async def _handle_connection(service: OcrService, upload_dir: str, reader, writer):
+    """Serves one request per connection."""
+    try:
+        request = await _read_request(reader, writer)
+        if request is None:
+            return
+        method, path, query, body = request
+        if method == "GET" and path == "/health":
+            await _write_json(writer, 200, service.status())
+        elif method == "GET" and path == "/metrics":
+            data = metrics.render_prometheus().encode("utf-8")
+            writer.write(_response_head(200, "text/plain; version=0.0.4; charset=utf-8",
+                                        {"Content-Length": len(data)}))
+            writer.write(data)
+            await writer.drain()
+        elif method == "POST" and path == "/ocr":
+            await _handle_ocr(service, upload_dir, query, body, writer)
+        elif method == "POST" and path == "/translate":
+            await _handle_translate(service, body, writer)
+        elif method == "POST" and path == "/parse":
+            await _handle_parse(body, writer)
+        elif path in ("/health", "/metrics", "/ocr", "/translate", "/parse"):
+            raise _HttpError(405, f"{method} is not allowed on {path}.")
+        else:
+            raise _HttpError(404, f"No such endpoint: {path}")
+    except _HttpError as e:
+        try:
+            await _write_json(writer, e.status, {"error": str(e)}, e.headers)
+        except ConnectionError:
+            pass
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        pass  # The client went away or sent something unreadable
+    except Exception as e:
+        print(f"Error handling request: {type(e).__name__}: {e}")
+    finally:
+        writer.close()
+
+
+async def serve(args):
+    """Runs the service until interrupted (Ctrl+C or SIGTERM)."""
+    service = OcrService(args.workers, args.lang, profile=args.ocr_profile, mode=args.mode,
+                         translate_from=args.translate_from, target_lang=args.target, queue_size=args.queue_size,
+                         batch_window_ms=args.batch_window_ms, max_batch=args.max_batch)
+    service.start()
+    with tempfile.TemporaryDirectory(prefix="ocr-service-") as upload_dir:
+        server = await asyncio.start_server(functools.partial(_handle_connection, service, upload_dir),
+                                            HOST, args.port)
+        print(f"OCR service listening on http://{HOST}:{args.port} with {service.workers} worker(s).")
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, stop.set)
+            except NotImplementedError:
+                pass  # Windows: Ctrl+C still ends asyncio.run with KeyboardInterrupt
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            await service.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.service",
+        description="Local HTTP service for OCR, layout parsing and translation. Listens on 127.0.0.1 only.",
+    )
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT}).")
+    parser.add_argument("-j", "--workers", type=int, default=0,
+                        help="Worker processes, each with its own engines (default: as many as cores and memory allow).")
+    parser.add_argument("--lang", default="latin",
+                        help="Default OCR language, loaded at startup: en, ch, korean, japan, latin, cyrillic, "
+                             "or auto to detect it per file (default: latin).")
+    parser.add_argument("--ocr-profile", choices=("fast", "balanced", "accurate"), default=None,
+                        help="Default OCR speed/accuracy profile (default: balanced, or OCR_PROFILE).")
+    parser.add_argument("--mode", choices=PARSER_MODES, default="general", help="Default layout parser mode.")
+    parser.add_argument("--translate-from", metavar="CODE",
+                        help="Translate OCR results from this language by default, and load its model at startup.")
+    parser.add_argument("--target", default="en", help="Default translation target language code (default: en).")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help=f"Requests that may wait for a worker before new ones get 503 (default: {QUEUE_SIZE}).")
+    parser.add_argument("--batch-window-ms", type=int, default=BATCH_WINDOW_MS,
+                        help=f"How long a small image waits for others to OCR it with (default: {BATCH_WINDOW_MS}).")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_IMAGES,
+                        help=f"Most images OCR'd together in one engine call (default: {MAX_BATCH_IMAGES}).")
+    parser.add_argument("--metrics", action="store_true", help="Record stage timings, served at /metrics.")
+    parser.add_argument("--metrics-log", metavar="PATH",
+                        help="Append one JSON line per timed stage to PATH ('-' for stderr). Implies --metrics.")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.workers:
+        from src.jobs import default_job_workers
+        args.workers = default_job_workers()
+    # Set before the workers start, so they inherit them.
+    os.environ.setdefault("OCR_OFFLINE", "1")
+    if args.metrics or args.metrics_log:
+        metrics.enable(log_path=args.metrics_log)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    print("OCR service stopped.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,63 @@
 # File: src/translator/engine.py
 
-import argostranslate.package
-import argostranslate.translate
+from src.translator import memory as translation_memory
+from src.utils import metrics
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+import multiprocessing
 import os
 import threading
 
 # Use a lock to prevent race conditions during the one-time model download
 package_lock = threading.Lock()
 
+# Loaded translation objects, one per (source, target) pair. Reads need no lock;
+# only building a missing entry (which may download a model) takes package_lock.
+_translations = {}
+# Version of the installed model behind each cached pair, for keying the translation memory.
+_model_versions = {}
+
+# With OCR_OFFLINE set, a missing model is an error instead of a download (e.g. in the local service).
+OFFLINE = os.environ.get("OCR_OFFLINE", "") not in ("", "0")
+
+# Lines are sent to the model in batches of roughly this many characters.
+BATCH_CHARS = 2000
+# Documents with fewer lines than this are translated in-process; a worker pool
+# only pays off once there is enough text to spread across cores.
+MIN_PARALLEL_SEGMENTS = 64
+
+# Translation worker pool, kept alive between documents and rebuilt when the
+# language pair or size changes.
+_pool = None
+_pool_key = None
+
+
 def _get_translation(from_code, to_code):
-    """Checks for installed language models and downloads them if necessary."""
+    """Returns the cached translation for a language pair, downloading its model if necessary."""
+    translation = _translations.get((from_code, to_code))
+    if translation is not None:
+        return translation
+
     with package_lock:
+        translation = _translations.get((from_code, to_code))
+        if translation is not None:
+            return translation
+
+        # Imported on first use: Argos pulls in its whole model runtime, which slows app start.
+        import argostranslate.package
+        import argostranslate.translate
+
         available_packages = argostranslate.package.get_installed_packages()
 
         # Check if the required translation package is already installed
         found_translation = any(
-            p for p in available_packages 
+            p for p in available_packages
             if p.from_code == from_code and p.to_code == to_code
         )
 
+        if not found_translation and OFFLINE:
+            raise RuntimeError(f"Translation model {from_code} -> {to_code} is not installed "
+                               "and downloads are disabled (OCR_OFFLINE).")
         if not found_translation:
             print(f"Downloading translation model: {from_code} -> {to_code}...")
             argostranslate.package.update_package_index()
@@ -31,25 +70,250 @@ def _get_translation(from_code, to_code):
             )
             package_to_install.install()
             print("Download complete.")
+            available_packages = [package_to_install]
+
+        package = next(p for p in available_packages if p.from_code == from_code and p.to_code == to_code)
+        _model_versions[(from_code, to_code)] = (
+            f"argos-{from_code}-{to_code}-{getattr(package, 'package_version', None) or 'unknown'}"
+        )
+        translation = argostranslate.translate.get_translation_from_codes(from_code, to_code)
+        _translations[(from_code, to_code)] = translation
+    return translation
+
+
+def model_version(source_lang: str, target_lang: str) -> str:
+    """Returns the version string of the model for a language pair, loading it if needed."""
+    _get_translation(source_lang, target_lang)
+    return _model_versions[(source_lang, target_lang)]
+
+
+def _batches(segments: list, batch_chars: int = BATCH_CHARS) -> list:
+    """Groups consecutive segments into batches of about `batch_chars` characters."""
+    batches, current, size = [], [], 0
+    for segment in segments:
+        if current and size + len(segment) > batch_chars:
+            batches.append(current)
+            current, size = [], 0
+        current.append(segment)
+        size += len(segment) + 1
+    if current:
+        batches.append(current)
+    return batches
 
-    return argostranslate.translate.get_translation_from_codes(from_code, to_code)
 
+def _translate_batch(task: tuple) -> list:
+    """
+    Translates a batch of single-line segments with one `translate` call.
+
+    Argos splits its input at newlines and translates each paragraph on its own,
+    so batching saves the per-call overhead, not model work, and splitting the
+    output at newlines gives one result per segment.
+    """
+    segments, source_lang, target_lang = task
+    return _translate_lines(_get_translation(source_lang, target_lang), segments)
+
+
+def _translate_lines(translation, segments: list) -> list:
+    """Translates newline-joined segments; when the line count comes back wrong, retries each half on its own."""
+    translated = translation.translate("\n".join(segments)).split("\n")
+    if len(translated) == len(segments):
+        return translated
+    if len(segments) == 1:
+        return ["\n".join(translated)]  # A segment the model split into lines is still one result
+    # The model merged or split a line; halving narrows it down to the segment that caused it.
+    middle = len(segments) // 2
+    return _translate_lines(translation, segments[:middle]) + _translate_lines(translation, segments[middle:])
+
+
+def _translate_missing(segments: list, source_lang: str, target_lang: str, workers: int = None) -> dict:
+    """Sends distinct segments to the model, in batches and across the pool when worthwhile."""
+    tasks = [(batch, source_lang, target_lang) for batch in _batches(segments)]
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(segments) >= MIN_PARALLEL_SEGMENTS else 1
+    chars = sum(len(segment) for segment in segments)
+    with metrics.span("translate.model", segments=len(segments), chars=chars, batches=len(tasks)):
+        if workers <= 1 or len(tasks) <= 1 or multiprocessing.parent_process() is not None:
+            results = map(_translate_batch, tasks)
+        else:
+            results = _get_pool(source_lang, target_lang, workers).map(_translate_batch, tasks)
+        translated = dict(zip(segments, (text for batch in results for text in batch)))
+    metrics.count("translate.chars", chars, pair=f"{source_lang}-{target_lang}")
+    metrics.count("translate.segments", len(segments), pair=f"{source_lang}-{target_lang}")
+    return translated
 
-def translate_text(text_to_translate: str, source_lang: str, target_lang: str) -> str:
+
+def translate_segments(segments: list, source_lang: str, target_lang: str, workers: int = None,
+                       use_memory: bool = True) -> list:
+    """
+    Translates a list of single-line segments (sentences, lines or paragraphs).
+
+    Segments are compared in normalized form: each distinct segment is translated
+    once per call, and segments stored in the translation memory by earlier runs
+    are not sent to the model at all. The rest are grouped into batches; long
+    inputs are spread across a pool of worker processes, each with its own copy
+    of the model.
+
+    Args:
+        segments (list): Texts to translate. Must not contain newlines.
+        source_lang (str): The source language code.
+        target_lang (str): The target language code.
+        workers (int): Worker processes; defaults to the CPU count for long inputs. 1 runs in-process.
+        use_memory (bool): Whether to read and write the translation memory.
+
+    Returns:
+        list: The translations, in input order.
+    """
+    if not segments:
+        return []
+    normalized = [translation_memory.normalize_segment(segment) for segment in segments]
+    distinct = list(dict.fromkeys(normalized))
+    version = model_version(source_lang, target_lang)
+    known = translation_memory.lookup(distinct, source_lang, target_lang, version) if use_memory else {}
+    missing = [segment for segment in distinct if segment not in known]
+
+    if missing:
+        fresh = _translate_missing(missing, source_lang, target_lang, workers)
+        if use_memory:
+            translation_memory.store(fresh, source_lang, target_lang, version)
+        known.update(fresh)
+
+    translation_memory.record_run(
+        segments=len(segments),
+        repeats=len(segments) - len(distinct),
+        hits=len(distinct) - len(missing),
+        misses=len(missing),
+    )
+    return [known[segment] for segment in normalized]
+
+
+def _get_pool(source_lang: str, target_lang: str, workers: int) -> ProcessPoolExecutor:
+    """Returns the shared translation pool, rebuilding it if the language pair or size changed."""
+    global _pool, _pool_key
+    if _pool is not None and _pool_key == (source_lang, target_lang, workers):
+        return _pool
+    shutdown_pool()
+    # 'spawn' keeps workers from inheriting GUI state through fork.
+    context = multiprocessing.get_context("spawn")
+    _pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(source_lang, target_lang),
+    )
+    _pool_key = (source_lang, target_lang, workers)
+    return _pool
+
+
+def shutdown_pool():
+    """Stops the translation worker pool, if one is running."""
+    global _pool, _pool_key
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+    _pool_key = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _init_worker(source_lang: str, target_lang: str):
+    """Loads the model once per worker, limited to one thread so workers do not oversubscribe cores."""
+    import argostranslate.settings
+    argostranslate.settings.intra_threads = 1
+    _get_translation(source_lang, target_lang)
+
+
+def translate_text(text_to_translate: str, source_lang: str, target_lang: str, workers: int = None,
+                   use_memory: bool = True) -> str:
     """
     Translates a block of text from a source language to a target language.
 
+    The text is translated line by line (blank lines are kept), in batches and,
+    for long documents, across worker processes. Repeated lines and lines found
+    in the translation memory are not re-translated.
+
     Args:
         text_to_translate (str): The text to be translated.
         source_lang (str): The source language code (e.g., 'es' for Spanish).
         target_lang (str): The target language code (e.g., 'en' for English).
+        workers (int): Worker processes; see `translate_segments`.
+        use_memory (bool): Whether to read and write the translation memory.
 
     Returns:
         str: The translated text.
     """
     try:
-        translation = _get_translation(source_lang, target_lang)
-        return translation.translate(text_to_translate)
+        with metrics.span("translate.text", pair=f"{source_lang}-{target_lang}", chars=len(text_to_translate)):
+            # Loads (or downloads) the model up front, so errors surface here even for empty input.
+            _get_translation(source_lang, target_lang)
+            lines = text_to_translate.split("\n")
+            positions = [i for i, line in enumerate(lines) if line.strip()]
+            translated = translate_segments([lines[i].strip() for i in positions], source_lang, target_lang,
+                                            workers=workers, use_memory=use_memory)
+            for i, text in zip(positions, translated):
+                lines[i] = text
+            return "\n".join(lines)
     except Exception as e:
         print(f"Error during translation: {e}")
-        return f"Error: Could not translate from '{source_lang}' to '{target_lang}'. Model may not be available."
\ No newline at end of file
+        return f"Error: Could not translate from '{source_lang}' to '{target_lang}'. Model may not be available."
+
+
+def translate_stream(text_to_translate: str, source_lang: str, target_lang: str, cancel_event=None,
+                     use_memory: bool = True):
+    """
+    Translates text paragraph by paragraph, yielding each one as soon as it is done.
+
+    Paragraphs are separated by blank lines. The whole document is looked up in
+    the translation memory first, so remembered paragraphs come back at once;
+    the rest are translated in order, in-process, which keeps the wait for the
+    first paragraph short. Joining the yielded texts with blank lines gives the
+    same result as `translate_text`.
+
+    Args:
+        text_to_translate (str): The text to be translated.
+        source_lang (str): The source language code.
+        target_lang (str): The target language code.
+        cancel_event (threading.Event): Optional; once set, no further paragraphs are translated.
+        use_memory (bool): Whether to read and write the translation memory.
+
+    Yields:
+        tuple: (paragraph number, paragraph count, translated paragraph text)
+
+    Raises:
+        Exception: Whatever the model raises; unlike `translate_text`, errors are not turned into text.
+    """
+    version = model_version(source_lang, target_lang)
+    paragraphs = text_to_translate.split("\n\n")
+    normalized_lines = [translation_memory.normalize_segment(line)
+                        for line in text_to_translate.split("\n") if line.strip()]
+    distinct = list(dict.fromkeys(normalized_lines))
+    known = translation_memory.lookup(distinct, source_lang, target_lang, version) if use_memory else {}
+    hits = len(known)
+    counts = {"segments": 0, "new": 0}
+
+    try:
+        for number, paragraph in enumerate(paragraphs, start=1):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            lines = paragraph.split("\n")
+            positions = [i for i, line in enumerate(lines) if line.strip()]
+            normalized = [translation_memory.normalize_segment(lines[i]) for i in positions]
+            missing = [segment for segment in dict.fromkeys(normalized) if segment not in known]
+            if missing:
+                fresh = _translate_missing(missing, source_lang, target_lang, workers=1)
+                if use_memory:
+                    translation_memory.store(fresh, source_lang, target_lang, version)
+                known.update(fresh)
+                counts["new"] += len(missing)
+            counts["segments"] += len(normalized)
+            for i, segment in zip(positions, normalized):
+                lines[i] = known[segment]
+            yield number, len(paragraphs), "\n".join(lines)
+    finally:
+        # Counts cover the paragraphs translated before a cancel, if any.
+        translation_memory.record_run(
+            segments=counts["segments"],
+            repeats=max(counts["segments"] - counts["new"] - hits, 0),
+            hits=min(hits, counts["segments"] - counts["new"]),
+            misses=counts["new"],
+        )
@@ -0,0 +1,139 @@
+# File: src/translator/memory.py
+
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+
+from src.database.connections import StatCounters, ThreadConnections
+from src.database.manager import DB_PATH
+
+# The translation memory lives next to the history database.
+MEMORY_DB_PATH = os.path.join(os.path.dirname(DB_PATH), "translation_memory.db")
+
+_stats = StatCounters("translation_memory", ("segments", "repeats", "hits", "misses"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_segment(text: str) -> str:
+    """Canonical form of a segment for lookups: NFC, whitespace collapsed, trimmed."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def _create_table(conn: sqlite3.Connection):
+    """Creates the memory table; runs for every new connection."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS translation_memory (
+        source_lang TEXT NOT NULL,
+        target_lang TEXT NOT NULL,
+        model_version TEXT NOT NULL,
+        segment TEXT NOT NULL,
+        translation TEXT NOT NULL,
+        uses INTEGER NOT NULL DEFAULT 1,
+        last_used REAL NOT NULL,
+        PRIMARY KEY (source_lang, target_lang, model_version, segment)
+    )
+    """)
+
+
+_connections = ThreadConnections(_create_table)
+
+
+def _connect() -> sqlite3.Connection:
+    """Returns this thread's long-lived connection (WAL journaling), creating the table on first use."""
+    return _connections.get(MEMORY_DB_PATH)
+
+
+def close_connection():
+    """Closes this thread's connection, if it has one."""
+    _connections.close()
+
+
+def lookup(segments: list, source_lang: str, target_lang: str, model_version: str) -> dict:
+    """
+    Finds stored translations for normalized segments.
+
+    Args:
+        segments (list): Distinct normalized segments (see `normalize_segment`).
+        source_lang (str): The source language code.
+        target_lang (str): The target language code.
+        model_version (str): Version of the translation model.
+
+    Returns:
+        dict: segment -> translation, for the segments that were found.
+    """
+    if not segments:
+        return {}
+    found = {}
+    conn = _connect()
+    with conn:
+        # Stay well under SQLite's limit on bound parameters.
+        for start in range(0, len(segments), 500):
+            chunk = segments[start:start + 500]
+            rows = conn.execute(
+                "SELECT segment, translation FROM translation_memory "
+                "WHERE source_lang = ? AND target_lang = ? AND model_version = ? "
+                f"AND segment IN ({','.join('?' * len(chunk))})",
+                (source_lang, target_lang, model_version, *chunk),
+            ).fetchall()
+            found.update(rows)
+        if found:
+            conn.executemany(
+                "UPDATE translation_memory SET uses = uses + 1, last_used = ? "
+                "WHERE source_lang = ? AND target_lang = ? AND model_version = ? AND segment = ?",
+                [(time.time(), source_lang, target_lang, model_version, segment) for segment in found],
+            )
+    return found
+
+
+def store(translations: dict, source_lang: str, target_lang: str, model_version: str):
+    """
+    Saves new translations.
+
+    Args:
+        translations (dict): normalized segment -> translation.
+        Other arguments are as for `lookup`.
+    """
+    if not translations:
+        return
+    now = time.time()
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO translation_memory "
+            "(source_lang, target_lang, model_version, segment, translation, uses, last_used) "
+            "VALUES (?, ?, ?, ?, ?, 1, ?)",
+            [(source_lang, target_lang, model_version, segment, translation, now)
+             for segment, translation in translations.items()],
+        )
+
+
+def record_run(segments: int, repeats: int, hits: int, misses: int):
+    """Adds one run's counts to the process totals and prints the run's reuse rate."""
+    _stats.count("segments", segments)
+    _stats.count("repeats", repeats)
+    _stats.count("hits", hits)
+    _stats.count("misses", misses)
+    if segments:
+        reused = (repeats + hits) / segments
+        print(f"Translation memory: {segments} segments, {repeats} repeated in document, "
+              f"{hits} from memory, {misses} new ({reused:.0%} not re-translated).")
+
+
+def clear():
+    """Removes every stored translation."""
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM translation_memory")
+
+
+def stats() -> dict:
+    """
+    Reports translation memory effectiveness for this process.
+
+    Returns:
+        dict: 'segments', 'repeats' (duplicates within a document), 'hits' and 'misses' counters.
+    """
+    return _stats.snapshot()
@@ -0,0 +1,25 @@
+# File: src/utils/helpers.py
+
+def parse_page_range(text: str):
+    """
+    Parses a user-entered page range such as "10-20", "7" or "15-".
+
+    Args:
+        text (str): The range as typed by the user. Empty means all pages.
+
+    Returns:
+        tuple | None: A 1-based inclusive (first, last) tuple, with None for an
+                      open end, or None for all pages.
+    """
+    text = (text or "").strip()
+    if not text:
+        return None
+    try:
+        if "-" in text:
+            first, last = (part.strip() for part in text.split("-", 1))
+            return (int(first) if first else None, int(last) if last else None)
+        page = int(text)
+        return (page, page)
+    except ValueError:
+        print(f"Invalid page range: {text}")
+        return None
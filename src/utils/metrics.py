@@ -0,0 +1,358 @@
+# File: src/utils/metrics.py
+
+"""
+Timing spans and counters for the OCR pipeline, with structured logs and a Prometheus exporter.
+
+Instrumented code calls:
+
+    with metrics.span("pdf.render", page=3):
+        ...
+    metrics.count("ocr_cache.hits", 5)
+    metrics.observe("ocr.boxes_per_page", len(page))
+
+Metrics are off by default. Then `span` returns a shared no-op object and
+`count`/`observe` return at once, so the calls can stay in hot paths. Turn them
+on with OCR_METRICS=1 (or `enable()`). With OCR_METRICS_LOG=<path> (or "-" for
+stderr), every finished span is also written as one JSON line.
+
+Both settings live in the environment, so worker processes started afterwards
+(the OCR pool, batch workers) record too. Each process keeps its own totals;
+`drain` and `merge` carry a worker's totals back to the parent, and every
+process appends its span lines to the same log.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# Upper bounds (seconds) of the span duration histogram buckets.
+SPAN_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = "ocr_"
+
+_enabled = os.environ.get("OCR_METRICS", "") not in ("", "0")
+_log_path = os.environ.get("OCR_METRICS_LOG", "")
+if _log_path:
+    _enabled = True
+_log_file = None
+_lock = threading.Lock()
+
+_spans = {}  # name -> [count, total seconds, per-bucket counts]
+_counters = {}  # (name, labels) -> total
+_values = {}  # name -> [count, sum, max]
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(log_path: str = None):
+    """
+    Starts recording, here and in worker processes started from now on.
+
+    Args:
+        log_path (str): Optional file to append one JSON line per span to; "-" writes to stderr.
+    """
+    global _enabled, _log_path, _log_file
+    _enabled = True
+    os.environ["OCR_METRICS"] = "1"
+    if log_path:
+        _log_path = log_path
+        _log_file = None
+        os.environ["OCR_METRICS_LOG"] = log_path
+
+
+def disable():
+    """Stops recording in this process. Totals so far are kept."""
+    global _enabled
+    _enabled = False
+    os.environ.pop("OCR_METRICS", None)
+    os.environ.pop("OCR_METRICS_LOG", None)
+
+
+class _NoopSpan:
+    """Returned by `span` while metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """Times a block; its duration goes to the span histogram and, if enabled, the log."""
+
+    __slots__ = ("name", "fields", "start")
+
+    def __init__(self, name: str, fields: dict):
+        self.name = name
+        self.fields = fields
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _record_span(self.name, seconds)
+        if _log_path:
+            event = {"ts": round(time.time(), 6), "span": self.name, "seconds": round(seconds, 6),
+                     "pid": os.getpid(), "thread": threading.current_thread().name}
+            event.update(self.fields)
+            if exc_type is not None:
+                event["error"] = exc_type.__name__
+            _write_log(event)
+        return False
+
+    def set(self, **fields):
+        """Adds fields to the span's log line, e.g. results only known at the end of the block."""
+        self.fields.update(fields)
+
+
+def span(name: str, **fields):
+    """
+    Returns a context manager that times a block as the stage `name`.
+
+    Keyword arguments become fields of the span's log line (they are not labels,
+    so they may vary freely, e.g. a page number).
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, fields)
+
+
+def timed(name: str):
+    """Decorator form of `span` for plain (non-generator) functions."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name: str, amount: float = 1, **labels):
+    """Adds to a counter. Labels should take few distinct values (e.g. a language, not a file name)."""
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name: str, value: float):
+    """Records one value of a quantity, e.g. boxes per page; exported as count, sum and max."""
+    if not _enabled:
+        return
+    with _lock:
+        stats = _values.get(name)
+        if stats is None:
+            _values[name] = [1, value, value]
+        else:
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = max(stats[2], value)
+
+
+def _record_span(name: str, seconds: float):
+    with _lock:
+        stats = _spans.get(name)
+        if stats is None:
+            stats = _spans[name] = [0, 0.0, [0] * len(SPAN_BUCKETS)]
+        stats[0] += 1
+        stats[1] += seconds
+        for i, bound in enumerate(SPAN_BUCKETS):
+            if seconds <= bound:
+                stats[2][i] += 1
+                break
+
+
+def _write_log(event: dict):
+    global _log_file
+    line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        try:
+            if _log_path == "-":
+                sys.stderr.write(line)
+                return
+            if _log_file is None:
+                # Line buffered and appending, so lines from several processes do not interleave.
+                _log_file = open(_log_path, "a", encoding="utf-8", buffering=1)
+            _log_file.write(line)
+        except OSError as e:
+            print(f"Error writing metrics log: {e}")
+
+
+def _copy() -> dict:
+    """Totals as plain (picklable) data. Caller holds the lock."""
+    return {
+        "spans": {name: [s[0], s[1], list(s[2])] for name, s in _spans.items()},
+        "counters": [[name, list(labels), total] for (name, labels), total in _counters.items()],
+        "values": {name: list(v) for name, v in _values.items()},
+    }
+
+
+def snapshot() -> dict:
+    """Returns a copy of this process's totals."""
+    with _lock:
+        return _copy()
+
+
+def drain() -> dict:
+    """Returns this process's totals and resets them, e.g. to send a worker's share to the parent."""
+    with _lock:
+        data = _copy()
+        _spans.clear()
+        _counters.clear()
+        _values.clear()
+    return data
+
+
+def merge(data: dict):
+    """Adds totals from `drain`/`snapshot` (e.g. of a worker process) into this process's."""
+    if not data:
+        return
+    with _lock:
+        for name, (n, total, buckets) in data.get("spans", {}).items():
+            stats = _spans.setdefault(name, [0, 0.0, [0] * len(SPAN_BUCKETS)])
+            stats[0] += n
+            stats[1] += total
+            stats[2] = [a + b for a, b in zip(stats[2], buckets)]
+        for name, labels, total in data.get("counters", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            _counters[key] = _counters.get(key, 0) + total
+        for name, (n, total, largest) in data.get("values", {}).items():
+            stats = _values.get(name)
+            if stats is None:
+                _values[name] = [n, total, largest]
+            else:
+                stats[0] += n
+                stats[1] += total
+                stats[2] = max(stats[2], largest)
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _values.clear()
+
+
+def format_summary() -> str:
+    """Formats time per stage (most time first) and the counters as plain text, for a terminal."""
+    data = snapshot()
+    lines = [f"{'Stage':<24} {'Calls':>8} {'Total (s)':>10} {'Mean (ms)':>10}"]
+    for name, (n, total, _) in sorted(data["spans"].items(), key=lambda item: item[1][1], reverse=True):
+        lines.append(f"{name:<24} {n:>8} {total:>10.2f} {total / n * 1000:>10.1f}")
+    for name, labels, total in sorted(data["counters"], key=lambda item: (item[0], item[1])):
+        label = ",".join(f"{key}={value}" for key, value in labels)
+        lines.append(f"{name}{'{' + label + '}' if label else ''}: {total:g}")
+    for name, (n, total, largest) in sorted(data["values"].items()):
+        lines.append(f"{name}: mean {total / n:.1f}, max {largest:g} ({n} samples)")
+    return "\n".join(lines)
+
+
+def _metric_name(name: str) -> str:
+    name = re.sub(r"[^a-zA-Z0-9_]", "_", name)
+    return name if name.startswith(METRIC_PREFIX) else METRIC_PREFIX + name
+
+
+def _label_text(labels) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def render_prometheus() -> str:
+    """
+    Formats the totals in the Prometheus text exposition format.
+
+    Spans form one histogram, `ocr_stage_duration_seconds{stage="..."}`; counters
+    become `ocr_<name>_total` and observed values `ocr_<name>` summaries (count and
+    sum) plus `ocr_<name>_max`.
+    """
+    data = snapshot()
+    lines = []
+    if data["spans"]:
+        family = METRIC_PREFIX + "stage_duration_seconds"
+        lines.append(f"# HELP {family} Time spent per pipeline stage.")
+        lines.append(f"# TYPE {family} histogram")
+        for name, (n, total, buckets) in sorted(data["spans"].items()):
+            cumulative = 0
+            for bound, bucket_count in zip(SPAN_BUCKETS, buckets):
+                cumulative += bucket_count
+                lines.append(f'{family}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{family}_bucket{{stage="{name}",le="+Inf"}} {n}')
+            lines.append(f'{family}_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'{family}_count{{stage="{name}"}} {n}')
+    families = {}
+    for name, labels, total in data["counters"]:
+        families.setdefault(name, []).append((labels, total))
+    for name, series in sorted(families.items()):
+        family = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {family} counter")
+        for labels, total in series:
+            lines.append(f"{family}{_label_text(labels)} {total:g}")
+    for name, (n, total, largest) in sorted(data["values"].items()):
+        family = _metric_name(name)
+        lines.append(f"# TYPE {family} summary")
+        lines.append(f"{family}_sum {total:g}")
+        lines.append(f"{family}_count {n}")
+        lines.append(f"# TYPE {family}_max gauge")
+        lines.append(f"{family}_max {largest:g}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str):
+    """Writes the totals to a file, e.g. for node_exporter's textfile collector. The file is replaced atomically."""
+    partial = path + ".partial"
+    with open(partial, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(partial, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would drown out everything else on stderr
+
+
+def serve_prometheus(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serves the totals at http://host:port/metrics from a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call `shutdown()` to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
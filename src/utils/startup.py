@@ -0,0 +1,82 @@
+# File: src/utils/startup.py
+
+import builtins
+import importlib
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Modules the GUI process needs sooner or later (translation, PDF export) but not to show the window.
+DEFERRED_MODULES = ("argostranslate.translate", "fpdf", "fitz")
+
+
+def preload_modules(names: tuple = DEFERRED_MODULES):
+    """Imports modules ahead of first use. Meant for a background thread once the window is up."""
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"Could not preload {name}: {e}")
+
+
+class StartupProfiler:
+    """
+    Times the phases of application start and the imports within them.
+
+    When disabled, `phase` and `report` do nothing, so the calls can stay in the
+    startup path. When enabled, every first-time import is timed and its own
+    time (excluding the modules it imports in turn) is charged to its top-level
+    package.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.start_time = time.perf_counter()
+        self.phases = []  # (name, seconds)
+        self.import_seconds = defaultdict(float)  # top-level package -> own import time
+        self._nested = []  # time spent in nested imports, per active import
+        self._original_import = builtins.__import__
+        if enabled:
+            builtins.__import__ = self._timed_import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._nested.pop()
+            self.import_seconds[name.partition(".")[0]] += elapsed - nested
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times a block of startup work."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report(self, label: str = "Window interactive", top: int = 15):
+        """Stops timing imports and prints the breakdown, ending with the time since start."""
+        if not self.enabled:
+            return
+        builtins.__import__ = self._original_import
+        total = time.perf_counter() - self.start_time
+        print("Startup profile:")
+        for name, seconds in self.phases:
+            print(f"  {name:<28} {seconds * 1000:8.1f} ms")
+        print(f"  {label:<28} {total * 1000:8.1f} ms after start")
+        print(f"Slowest imports (own time, by package; run with python -X importtime for detail):")
+        slowest = sorted(self.import_seconds.items(), key=lambda item: item[1], reverse=True)[:top]
+        for package, seconds in slowest:
+            print(f"  {package:<28} {seconds * 1000:8.1f} ms")
@@ -0,0 +1,65 @@
+# File: tests/test_history_storage.py
+
+import os
+import tempfile
+import unittest
+
+from src.database import manager
+
+LONG_TEXT = "Legacy record text that is long enough to be compressed. " * 20
+
+
+class LegacyRowUpdateTest(unittest.TestCase):
+    """Rows saved before compression must stay convertible after they are edited."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._old_path = manager.DB_PATH
+        manager.DB_PATH = os.path.join(self._tmp.name, "history.db")
+        manager.setup_database()
+        conn = manager.get_connection()
+        with conn:
+            self.record_id = conn.execute(
+                "INSERT INTO history (timestamp, profile_name, original_text, translated_text, storage_format) "
+                "VALUES ('2020-01-01 00:00:00', 'default', ?, '', 0)", (LONG_TEXT,)
+            ).lastrowid
+
+    def tearDown(self):
+        # The writer thread reconnects by itself once DB_PATH changes
+        manager.flush_writes()
+        manager.close_connection()
+        manager.DB_PATH = self._old_path
+        self._tmp.cleanup()
+
+    def _stored(self):
+        return manager.get_connection().execute(
+            "SELECT storage_format, original_text, translated_text FROM history WHERE id = ?", (self.record_id,)
+        ).fetchone()
+
+    def test_update_translation_then_compress(self):
+        manager.update_record_translation(self.record_id, "Translated " + LONG_TEXT).result()
+        self.assertEqual(self._stored()[0], manager.STORAGE_FORMAT)
+        self.assertEqual(manager.compress_stored_records(), 0)
+        record = manager.get_record(self.record_id)
+        self.assertEqual(record[3], LONG_TEXT)
+        self.assertEqual(record[4], "Translated " + LONG_TEXT)
+        self.assertEqual([row[0] for row in manager.search_records("Translated")], [self.record_id])
+
+    def test_update_text_then_compress(self):
+        manager.update_record_text(self.record_id, "Reparsed " + LONG_TEXT, "document").result()
+        self.assertEqual(self._stored()[0], manager.STORAGE_FORMAT)
+        self.assertEqual(manager.compress_stored_records(), 0)
+        self.assertEqual(manager.get_record(self.record_id)[3], "Reparsed " + LONG_TEXT)
+        self.assertEqual([row[0] for row in manager.search_records("Reparsed")], [self.record_id])
+
+    def test_compress_skips_values_already_encoded(self):
+        conn = manager.get_connection()
+        with conn:
+            conn.execute("UPDATE history SET original_text = ? WHERE id = ?",
+                         (manager.encode_text(LONG_TEXT), self.record_id))
+        self.assertEqual(manager.compress_stored_records(), 1)
+        self.assertEqual(manager.get_record(self.record_id)[3], LONG_TEXT)
+
+
+if __name__ == "__main__":
+    unittest.main()